@@ -4,27 +4,109 @@ Enhanced PowerPoint XML Parser for Anatomical Shapes
 Extracts precise path data for curved/irregular shapes and specific anatomical names
 """
 
-import xml.etree.ElementTree as ET
-import json
 import os
 from pathlib import Path
 import argparse
 
+try:
+    from . import profiling
+    from .etag_manifest import update_etag_manifest
+    from .label_index import LabelIndex, LabelReader
+    from .manifest import SlideManifest, add_force_argument, code_version, write_if_changed, write_json
+    from .navigation_graph import resolve_link
+    from .parallel import add_jobs_argument, map_slides
+    from .profiling import add_profile_arguments, log, profiled
+    from .overlay_registration import register_slide, registered_regions
+    from .path_geometry import PathGeometry
+    from .region_codec import encode_regions, read_regions
+    from .region_index import build_hit_indexes, hit_index_dict
+    from .region_lod import DEFAULT_REFERENCE_WIDTH, build_levels, parse_tolerances
+    from .slide_document import as_slide_deck
+    from .xml_backend import NS, Query
+except ImportError:
+    import profiling
+    from etag_manifest import update_etag_manifest
+    from label_index import LabelIndex, LabelReader
+    from manifest import SlideManifest, add_force_argument, code_version, write_if_changed, write_json
+    from navigation_graph import resolve_link
+    from parallel import add_jobs_argument, map_slides
+    from profiling import add_profile_arguments, log, profiled
+    from overlay_registration import register_slide, registered_regions
+    from path_geometry import PathGeometry
+    from region_codec import encode_regions, read_regions
+    from region_index import build_hit_indexes, hit_index_dict
+    from region_lod import DEFAULT_REFERENCE_WIDTH, build_levels, parse_tolerances
+    from slide_document import as_slide_deck
+    from xml_backend import NS, Query
+
+OUTPUT_FORMATS = ('json', 'binary', 'both')
+# sibling modules whose code shapes the output, for the manifest's code version
+_HELPER_MODULES = ("path_geometry.py", "region_codec.py", "region_lod.py", "region_index.py",
+                   "overlay_registration.py", "bony_pelvis_rotation.py", "media_store.py", "label_index.py",
+                   "extract_text_labels.py", "navigation_graph.py", "etag_manifest.py")
+# element lookups, compiled once (as XPath objects when lxml is available)
+_SP_PR, _XFRM, _OFF, _EXT = Query('.//p:spPr'), Query('.//a:xfrm'), Query('.//a:off'), Query('.//a:ext')
+_CUST_GEOM, _PATH_LST, _PATH = Query('.//a:custGeom'), Query('.//a:pathLst'), Query('.//a:path')
+_SOLID_FILL, _SRGB_CLR, _HLINK_CLICK = Query('.//a:solidFill'), Query('.//a:srgbClr'), Query('.//a:hlinkClick')
+_SP_TAG = '{%s}sp' % NS['p']
+
+# Map colors to general anatomical regions
+_COLOR_ANATOMY = {
+    'C133AD': 'Ischium',
+    'FF00E6': 'Ischium',
+    '2F8E29': 'Pubis_and_Obturator_foramen',
+    '008000': 'Pubis_and_Obturator_foramen'
+}
+
+
+def _pubis_rule(words):
+    if 'obturator' in words and 'foramen' in words:
+        return 'Pubis_with_Obturator_foramen'
+    if 'pubis' in words and 'obturator' not in words:
+        return 'Pubis'
+    return None
+
+
+def _pubis_name(label):
+    """
+    Specific name for a green region from the label naming it, or None.
+    Whole words decide first; failing that, the keywords may appear inside
+    run-together words ('ObturatorForamen', 'superiorpubis'), as they could
+    before labels were tokenized.
+    """
+    return _pubis_rule(label.tokens) or _pubis_rule(label.lower)
+
+
+def _bounds(geometries):
+    """Slide-space (x0, y0, x1, y1) around every path of a region, or None"""
+    boxes = [box for box in (geometry.bounds() for geometry in geometries) if box]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
 
 class AnatomicalShapeParser:
     """Parser for extracting precise anatomical shape data with path coordinates"""
     
-    def __init__(self, ppt_dir, output_dir):
-        self.xml_files_folder = Path(f"{ppt_dir}/ppt/slides")
+    def __init__(self, ppt_dir, output_dir, output_format='json', quantum=1,
+                 lod_tolerances=(), lod_reference_width=DEFAULT_REFERENCE_WIDTH, hit_index=False,
+                 register=False):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+        self.deck = as_slide_deck(ppt_dir)
+        self.output_format = output_format
+        self.quantum = quantum
+        self.lod_tolerances = tuple(sorted(lod_tolerances, reverse=True))
+        self.lod_reference_width = lod_reference_width
+        self.hit_index = hit_index
+        self.register = register
+        self.xml_files_folder = Path(self.deck.slides_dir)
         self.output_folder = Path(output_dir)
         self.output_folder.mkdir(parents=True, exist_ok=True)
         
         # XML namespaces
-        self.namespaces = {
-            'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-            'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
-            'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-        }
+        self.namespaces = NS
         
         # Color mapping for anatomical regions
         self.color_map = {
@@ -38,73 +120,114 @@ class AnatomicalShapeParser:
     
     def parse_slide(self, slide_number):
         """Parse a specific slide and extract anatomical shape data"""
-        slide_file = self.xml_files_folder / f"slide{slide_number}.xml"
-        if not slide_file.exists():
-            print(f"Slide {slide_number} not found")
+        if not self.deck.has_slide(slide_number):
+            log.warning(f"Slide {slide_number} not found")
             return None
         
+        with profiling.stage("slide", slide=slide_number):
+            return self._parse_slide(slide_number)
+    
+    def _parse_slide(self, slide_number):
         try:
-            tree = ET.parse(slide_file)
-            root = tree.getroot()
-            
             # Extract colored anatomical regions
             colored_regions = []
-            text_labels = self._extract_text_labels(root)
+            rels = self.deck.slide_rels(slide_number)
+            
+            # Find all shapes with custom geometry (freeform shapes), streamed so
+            # only one shape's subtree is held at a time however large the slide;
+            # the same pass collects the text labels and leader lines that name them
+            labels = LabelReader()
+            with profiling.stage("shape_scan"):
+                for shape in self.deck.iter_shapes(slide_number, kinds=("sp", "cxnSp")):
+                    labels.add(shape)
+                    if shape.tag != _SP_TAG:
+                        continue
+                    region_data = self._extract_shape_region(shape.element, rels, shape.shape_id)
+                    if region_data:
+                        colored_regions.append(region_data)
             
-            # Find all shapes with custom geometry (freeform shapes)
-            for shape in root.findall('.//p:sp', self.namespaces):
-                region_data = self._extract_shape_region(shape, text_labels)
-                if region_data:
-                    colored_regions.append(region_data)
+            # Name the regions once every label on the slide is known
+            label_index = self._index_text_labels(labels)
+            for region_data, geometries in colored_regions:
+                region_data['anatomical_name'] = self._determine_anatomical_name(
+                    geometries, label_index, region_data['color'])
+            colored_regions = [region_data for region_data, _ in colored_regions]
+            profiling.count("regions", len(colored_regions))
             
             if colored_regions:
                 slide_data = {
                     'slide_number': slide_number,
-                    'image_dimensions': self._get_slide_dimensions(root),
+                    'image_dimensions': self._get_slide_dimensions(),
                     'colored_regions': colored_regions
                 }
                 
-                # Save to file
-                output_file = self.output_folder / f"slide{slide_number}_precise_paths.json"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(slide_data, f, indent=2, ensure_ascii=False)
+                # Save to file(s) (left untouched when the content is identical)
+                for name in self._output_names(slide_number):
+                    self._write_output(name, slide_data)
+                
+                # Simplified level-of-detail copies, coarsest first
+                levels = build_levels(slide_data, self.lod_tolerances, self.lod_reference_width)
+                for level in levels:
+                    for name in self._output_names(slide_number, level['lod']['level']):
+                        self._write_output(name, level)
                 
-                print(f"✓ Created precise annotations: {output_file}")
+                # Point-in-region index for click hit testing
+                if self.hit_index:
+                    index_file = self.output_folder / f"slide{slide_number}_hit_index.json"
+                    index_data = hit_index_dict(build_hit_indexes(slide_data))
+                    if write_json(index_file, index_data, indent=None):
+                        log.info(f"✓ Created hit index: {index_file}")
+                
+                # Regions mapped into each picture's pixel space from the picture frames
+                if self.register:
+                    registered = registered_regions(slide_data, register_slide(self.deck, slide_number))
+                    self._write_output(f"slide{slide_number}_image_regions.json", registered)
                 return slide_data
             
         except Exception as e:
-            print(f"Error parsing slide {slide_number}: {e}")
+            log.error(f"Error parsing slide {slide_number}: {e}")
             
         return None
     
-    def _extract_shape_region(self, shape, text_labels):
-        """Extract region data from a colored shape"""
+    def _write_output(self, name, data):
+        """Write slide data as JSON or binary by file name, leaving identical files untouched"""
+        output_file = self.output_folder / name
+        if name.endswith('.json'):
+            changed = write_json(output_file, data, indent=2)
+        else:
+            with profiling.stage("serialize"):
+                content = encode_regions(data, self.quantum)
+            changed = write_if_changed(output_file, content)
+        if changed:
+            log.info(f"✓ Created precise annotations: {output_file}")
+        else:
+            log.info(f"✓ Precise annotations unchanged: {output_file}")
+    
+    def _extract_shape_region(self, shape, rels, shape_id=None):
+        """
+        Extract region data from a colored shape, with its parsed paths; the
+        anatomical name is filled in after the pass over the slide
+        """
         # Get shape color
         color_hex = self._get_shape_color(shape)
         if not color_hex or color_hex not in self.color_map:
             return None
         
         # Get shape ID and name
-        shape_id = "unknown"
-        nv_sp_pr = shape.find('.//p:nvSpPr', self.namespaces)
-        if nv_sp_pr is not None:
-            c_nv_pr = nv_sp_pr.find('.//p:cNvPr', self.namespaces)
-            if c_nv_pr is not None:
-                shape_id = c_nv_pr.get('id', 'unknown')
+        if shape_id is None:
+            shape_id = 'unknown'
         
         # Get precise path data
-        path_data = self._extract_path_data(shape)
-        if not path_data:
+        geometries = self._extract_path_geometry(shape)
+        if not geometries:
             return None
-        
-        # Get anatomical name based on nearby text labels and color
-        anatomical_name = self._determine_anatomical_name(shape, text_labels, color_hex)
+        path_data = [geometry.to_dict() for geometry in geometries]
         
         # Get hyperlink if present
-        hyperlink_target = self._get_hyperlink_target(shape)
+        hyperlink_target = self._get_hyperlink_target(shape, rels)
         
         region = {
-            'anatomical_name': anatomical_name,
+            'anatomical_name': None,
             'color': color_hex,
             'color_name': self.color_map[color_hex],
             'shape_id': shape_id,
@@ -114,113 +237,44 @@ class AnatomicalShapeParser:
         if hyperlink_target:
             region['hyperlink_target'] = hyperlink_target
         
-        return region
+        return region, geometries
+    
+    def _extract_path_geometry(self, shape):
+        """Custom geometry paths as PathGeometry arrays, already scaled to slide coordinates"""
+        with profiling.stage("path_parse"):
+            geometries = self._parse_path_geometry(shape)
+        profiling.count("points", sum(geometry.point_count() for geometry in geometries))
+        return geometries
     
-    def _extract_path_data(self, shape):
-        """Extract precise path coordinates from custom geometry"""
-        sp_pr = shape.find('.//p:spPr', self.namespaces)
+    def _parse_path_geometry(self, shape):
+        sp_pr = _SP_PR.first(shape)
         if sp_pr is None:
-            return None
+            return []
         
         # Get transform information for coordinate scaling
         transform = self._get_transform(sp_pr)
         
         # Look for custom geometry
-        cust_geom = sp_pr.find('.//a:custGeom', self.namespaces)
-        if cust_geom is not None:
-            path_lst = cust_geom.find('.//a:pathLst', self.namespaces)
-            if path_lst is not None:
-                paths = []
-                for path in path_lst.findall('.//a:path', self.namespaces):
-                    path_commands = []
-                    
-                    # Get path dimensions
-                    path_w = int(path.get('w', 0))
-                    path_h = int(path.get('h', 0))
-                    
-                    # Extract all path commands
-                    for child in path:
-                        cmd = self._parse_path_command(child, transform, path_w, path_h)
-                        if cmd:
-                            path_commands.append(cmd)
-                    
-                    if path_commands:
-                        paths.append({
-                            'path_width': path_w,
-                            'path_height': path_h,
-                            'commands': path_commands
-                        })
-                
-                return paths if paths else None
-        
-        return None
-    
-    def _parse_path_command(self, element, transform, path_w, path_h):
-        """Parse individual path commands (moveTo, lnTo, etc.)"""
-        tag = element.tag.split('}')[-1]  # Remove namespace
-        
-        if tag == 'moveTo':
-            pt = element.find('.//a:pt', self.namespaces)
-            if pt is not None:
-                return {
-                    'type': 'moveTo',
-                    'x': self._scale_coordinate(int(pt.get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y': self._scale_coordinate(int(pt.get('y', 0)), transform['y'], transform['height'], path_h)
-                }
-        
-        elif tag == 'lnTo':
-            pt = element.find('.//a:pt', self.namespaces)
-            if pt is not None:
-                return {
-                    'type': 'lineTo',
-                    'x': self._scale_coordinate(int(pt.get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y': self._scale_coordinate(int(pt.get('y', 0)), transform['y'], transform['height'], path_h)
-                }
-        
-        elif tag == 'cubicBezTo':
-            pts = element.findall('.//a:pt', self.namespaces)
-            if len(pts) >= 3:
-                return {
-                    'type': 'cubicBezTo',
-                    'x1': self._scale_coordinate(int(pts[0].get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y1': self._scale_coordinate(int(pts[0].get('y', 0)), transform['y'], transform['height'], path_h),
-                    'x2': self._scale_coordinate(int(pts[1].get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y2': self._scale_coordinate(int(pts[1].get('y', 0)), transform['y'], transform['height'], path_h),
-                    'x': self._scale_coordinate(int(pts[2].get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y': self._scale_coordinate(int(pts[2].get('y', 0)), transform['y'], transform['height'], path_h)
-                }
-        
-        elif tag == 'quadBezTo':
-            pts = element.findall('.//a:pt', self.namespaces)
-            if len(pts) >= 2:
-                return {
-                    'type': 'quadBezTo',
-                    'x1': self._scale_coordinate(int(pts[0].get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y1': self._scale_coordinate(int(pts[0].get('y', 0)), transform['y'], transform['height'], path_h),
-                    'x': self._scale_coordinate(int(pts[1].get('x', 0)), transform['x'], transform['width'], path_w),
-                    'y': self._scale_coordinate(int(pts[1].get('y', 0)), transform['y'], transform['height'], path_h)
-                }
-        
-        elif tag == 'close':
-            return {'type': 'close'}
-        
-        return None
-    
-    def _scale_coordinate(self, path_coord, transform_offset, transform_size, path_size):
-        """Scale path coordinates to actual slide coordinates"""
-        if path_size == 0:
-            return transform_offset
-        
-        # Scale from path coordinate system to slide coordinate system
-        ratio = path_coord / path_size
-        return int(transform_offset + (ratio * transform_size))
+        cust_geom = _CUST_GEOM.first(sp_pr)
+        if cust_geom is None:
+            return []
+        path_lst = _PATH_LST.first(cust_geom)
+        if path_lst is None:
+            return []
+        
+        geometries = []
+        for path in _PATH.all(path_lst):
+            geometry = PathGeometry.from_element(path)
+            if len(geometry):
+                geometries.append(geometry.to_slide(transform))
+        return geometries
     
     def _get_transform(self, sp_pr):
         """Get transform information (position and size)"""
-        xfrm = sp_pr.find('.//a:xfrm', self.namespaces)
+        xfrm = _XFRM.first(sp_pr)
         if xfrm is not None:
-            off = xfrm.find('.//a:off', self.namespaces)
-            ext = xfrm.find('.//a:ext', self.namespaces)
+            off = _OFF.first(xfrm)
+            ext = _EXT.first(xfrm)
             
             if off is not None and ext is not None:
                 return {
@@ -234,93 +288,47 @@ class AnatomicalShapeParser:
     
     def _get_shape_color(self, shape):
         """Extract color from shape"""
-        sp_pr = shape.find('.//p:spPr', self.namespaces)
+        sp_pr = _SP_PR.first(shape)
         if sp_pr is not None:
             # Look for solid fill
-            solid_fill = sp_pr.find('.//a:solidFill', self.namespaces)
+            solid_fill = _SOLID_FILL.first(sp_pr)
             if solid_fill is not None:
                 # Check for sRGB color
-                srgb_clr = solid_fill.find('.//a:srgbClr', self.namespaces)
+                srgb_clr = _SRGB_CLR.first(solid_fill)
                 if srgb_clr is not None:
                     return srgb_clr.get('val', '').upper()
         
         return None
     
-    def _extract_text_labels(self, root):
-        """Extract all text labels from the slide for anatomical identification"""
-        text_labels = {}
-        
-        for shape in root.findall('.//p:sp', self.namespaces):
-            # Get shape ID
-            shape_id = "unknown"
-            nv_sp_pr = shape.find('.//p:nvSpPr', self.namespaces)
-            if nv_sp_pr is not None:
-                c_nv_pr = nv_sp_pr.find('.//p:cNvPr', self.namespaces)
-                if c_nv_pr is not None:
-                    shape_id = c_nv_pr.get('id', 'unknown')
-            
-            # Extract text content
-            text_content = []
-            for text_elem in shape.findall('.//a:t', self.namespaces):
-                if text_elem.text:
-                    text_content.append(text_elem.text.strip())
-            
-            if text_content:
-                text_labels[shape_id] = ' '.join(text_content)
-        
-        return text_labels
+    def _index_text_labels(self, labels):
+        """Spatial index of the collected text labels that can name a region (see label_index.py)"""
+        with profiling.stage("label_trace"):
+            return LabelIndex([label for label in labels.labels() if _pubis_name(label)])
     
-    def _determine_anatomical_name(self, shape, text_labels, color_hex):
+    def _determine_anatomical_name(self, geometries, label_index, color_hex):
         """Determine specific anatomical name based on context"""
-        # Get shape ID
-        shape_id = "unknown"
-        nv_sp_pr = shape.find('.//p:nvSpPr', self.namespaces)
-        if nv_sp_pr is not None:
-            c_nv_pr = nv_sp_pr.find('.//p:cNvPr', self.namespaces)
-            if c_nv_pr is not None:
-                shape_id = c_nv_pr.get('id', 'unknown')
-        
-        # Map colors to general anatomical regions
-        color_anatomy_map = {
-            'C133AD': 'Ischium',
-            'FF00E6': 'Ischium', 
-            '2F8E29': 'Pubis_and_Obturator_foramen',
-            '008000': 'Pubis_and_Obturator_foramen'
-        }
-        
         # Get base anatomical name from color
-        base_name = color_anatomy_map.get(color_hex, 'Unknown_region')
+        base_name = _COLOR_ANATOMY.get(color_hex, 'Unknown_region')
         
         # For green regions, determine if it's specifically Pubis or Obturator foramen
-        # based on nearby text labels or position
-        if 'Pubis' in base_name:
-            # Look for nearby text that might specify the exact region
-            for text_id, text in text_labels.items():
-                text_lower = text.lower()
-                if 'obturator' in text_lower and 'foramen' in text_lower:
-                    # This green region might include the obturator foramen
-                    return 'Pubis_with_Obturator_foramen'
-                elif 'pubis' in text_lower and 'obturator' not in text_lower:
-                    return 'Pubis'
+        # from the label whose leader line points into the region, else the one on or nearest it
+        if 'Pubis' in base_name and len(label_index):
+            bounds = _bounds(geometries)
+            label = label_index.label_for(bounds) if bounds else None
+            if label is not None:
+                return _pubis_name(label)
         
         return base_name
     
-    def _get_hyperlink_target(self, shape):
-        """Get hyperlink target slide if present"""
-        hlnk_click = shape.find('.//a:hlinkClick', self.namespaces)
+    def _get_hyperlink_target(self, shape, rels):
+        """Get hyperlink target slide if present, resolved through the slide's relationships"""
+        hlnk_click = _HLINK_CLICK.first(shape)
         if hlnk_click is not None:
-            r_id = hlnk_click.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id')
-            if r_id:
-                # Extract slide number from rId (would need relationship file to resolve properly)
-                # For now, extract number from rId format
-                import re
-                match = re.search(r'rId(\d+)', r_id)
-                if match:
-                    return int(match.group(1))
+            return resolve_link(hlnk_click, rels)
         
         return None
     
-    def _get_slide_dimensions(self, root):
+    def _get_slide_dimensions(self):
         """Get slide dimensions for proper scaling"""
         # PowerPoint slide dimensions are typically in the presentation
         # For now, use standard dimensions
@@ -329,15 +337,46 @@ class AnatomicalShapeParser:
             'height': 6858000   # Standard PowerPoint slide height in EMUs
         }
     
-    def parse_all_slides(self):
-        """Parse all available slides"""
+    def parse_all_slides(self, jobs=1, force=False):
+        """
+        Parse all available slides, optionally across a pool of worker processes.
+        Slides whose inputs match the manifest are not re-parsed unless force is set.
+        """
         results = {}
         
-        for slide_file in sorted(self.xml_files_folder.glob("slide*.xml")):
-            slide_number = int(slide_file.stem.replace('slide', ''))
-            result = self.parse_slide(slide_number)
+        manifest = SlideManifest(self.output_folder, "colored_regions", code_version(__file__, *_HELPER_MODULES),
+                                 options={'color_map': self.color_map, 'format': self.output_format,
+                                          'quantum': self.quantum, 'lod': list(self.lod_tolerances),
+                                          'lod_reference_width': self.lod_reference_width,
+                                          'hit_index': self.hit_index, 'register': self.register},
+                                 enabled=not force)
+        slide_numbers = self.deck.slide_numbers()
+        fingerprints = {n: manifest.fingerprint(self.deck, n) for n in slide_numbers}
+        changed = [n for n in slide_numbers
+                   if not manifest.is_unchanged(n, fingerprints[n], self.output_folder)]
+        
+        outputs = dict(zip(changed, map_slides(_parse_slide_task, changed, self, jobs=jobs,
+                                               setup=AnatomicalShapeParser,
+                                               setup_args=(self.deck.portable_source(), self.output_folder,
+                                                           self.output_format, self.quantum,
+                                                           self.lod_tolerances, self.lod_reference_width,
+                                                           self.hit_index, self.register))))
+        for slide_number in slide_numbers:
+            if slide_number in outputs:
+                result = outputs[slide_number]
+                manifest.record(slide_number, fingerprints[slide_number],
+                                self._all_output_names(slide_number) if result else [])
+            else:
+                result = self._load_slide_output(manifest, slide_number)
             if result:
                 results[slide_number] = result
+        removed = manifest.remove_stale(self.output_folder, slide_numbers)
+        manifest.save()
+        if removed:
+            log.info(f"✓ Removed {len(removed)} outputs of slides that no longer produce them")
+        
+        if changed != slide_numbers:
+            log.info(f"✓ Skipped {len(slide_numbers) - len(changed)} unchanged slides")
         
         # Create summary file
         summary = {
@@ -353,37 +392,96 @@ class AnatomicalShapeParser:
             }
         
         summary_file = self.output_folder / "extraction_summary.json"
-        with open(summary_file, 'w', encoding='utf-8') as f:
-            json.dump(summary, f, indent=2, ensure_ascii=False)
+        write_json(summary_file, summary, indent=2)
         
-        print(f"✓ Created extraction summary: {summary_file}")
+        # Content hashes of every output, for serving with strong ETags; skipped slides keep theirs
+        update_etag_manifest(self.output_folder,
+                             [name for n in changed for name in manifest.outputs(n)] + [summary_file.name],
+                             unchanged=[name for n in slide_numbers if n not in outputs
+                                        for name in manifest.outputs(n)])
+        
+        log.info(f"✓ Created extraction summary: {summary_file}")
         return results
+    
+    def _load_slide_output(self, manifest, slide_number):
+        """Previously written slide data for a slide the manifest says is unchanged"""
+        for name in manifest.outputs(slide_number):
+            return read_regions(self.output_folder / name)
+        return None
+    
+    def _output_names(self, slide_number, level=None):
+        """Files for a slide (or one of its LOD levels) in the configured output format"""
+        stem = f"slide{slide_number}_precise_paths" + (f"_lod{level}" if level is not None else "")
+        names = []
+        if self.output_format in ('json', 'both'):
+            names.append(f"{stem}.json")
+        if self.output_format in ('binary', 'both'):
+            names.append(f"{stem}.bin")
+        return names
+    
+    def _all_output_names(self, slide_number):
+        """Every file parse_slide writes for a slide; the full-detail file comes first"""
+        names = self._output_names(slide_number)
+        for level in range(len(self.lod_tolerances)):
+            names += self._output_names(slide_number, level)
+        if self.hit_index:
+            names.append(f"slide{slide_number}_hit_index.json")
+        if self.register:
+            names.append(f"slide{slide_number}_image_regions.json")
+        return names
+
+
+def _parse_slide_task(parser, slide_number):
+    """Worker entry point: parse and write one slide"""
+    return parser.parse_slide(slide_number)
 
 
 def main():
     """Main execution function"""
     parser = argparse.ArgumentParser(description="Extract anatomical shapes from PowerPoint slides.")
-    parser.add_argument("ppt_dir", help="Path to the folder containing the PowerPoint data.")
+    parser.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
     parser.add_argument("output_dir", help="Path to the output directory.")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="json",
+                        help="Write slide paths as JSON, the compact binary format (.bin), or both (default: json).")
+    parser.add_argument("--quantum", type=int, default=1,
+                        help="Coordinate quantization step in EMUs for binary output (default: 1, lossless).")
+    parser.add_argument("--lod", type=parse_tolerances, default=(),
+                        help="Comma-separated pixel tolerances (e.g. 8,2,0.5) to also write simplified "
+                             "slide{N}_precise_paths_lod{K} files, level 0 coarsest.")
+    parser.add_argument("--lod-reference-width", type=int, default=DEFAULT_REFERENCE_WIDTH,
+                        help="Pixel width the slide is assumed to render at for --lod (default: 1920).")
+    parser.add_argument("--hit-index", action="store_true",
+                        help="Also write slide{N}_hit_index.json for point-in-region lookups (see region_index.py).")
+    parser.add_argument("--register", action="store_true",
+                        help="Also write slide{N}_image_regions.json with regions mapped into each slide image's "
+                             "pixel space from the picture frames (see overlay_registration.py).")
+    add_jobs_argument(parser)
+    add_force_argument(parser)
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
-    parser_instance = AnatomicalShapeParser(args.ppt_dir, args.output_dir)
-    
-    print("Starting enhanced anatomical shape extraction...")
-    print("=" * 60)
-    
-    # Parse all slides
-    results = parser_instance.parse_all_slides()
-    
-    print("=" * 60)
-    print(f"✓ Extraction complete! Processed {len(results)} slides")
-    print(f"✓ Enhanced annotations saved to: {parser_instance.output_folder}")
-    print("\nKey improvements:")
-    print("• Precise curved/irregular shape boundaries (not rectangles)")
-    print("• Specific anatomical names for each region") 
-    print("• Path coordinates for exact overlay")
-    print("• Proper coordinate scaling")
+    with profiled(args, "colored_regions"):
+        parser_instance = AnatomicalShapeParser(args.ppt_dir, args.output_dir,
+                                                output_format=args.format, quantum=args.quantum,
+                                                lod_tolerances=args.lod,
+                                                lod_reference_width=args.lod_reference_width,
+                                                hit_index=args.hit_index, register=args.register)
+        
+        log.info("Starting enhanced anatomical shape extraction...")
+        log.info("=" * 60)
+        
+        # Parse all slides
+        results = parser_instance.parse_all_slides(jobs=args.jobs, force=args.force)
+        
+        log.info("=" * 60)
+        log.info(f"✓ Extraction complete! Processed {len(results)} slides")
+        log.info(f"✓ Enhanced annotations saved to: {parser_instance.output_folder}")
+        log.info("\nKey improvements:")
+        log.info("• Precise curved/irregular shape boundaries (not rectangles)")
+        log.info("• Specific anatomical names for each region")
+        log.info("• Path coordinates for exact overlay")
+        log.info("• Proper coordinate scaling")
 
 
 if __name__ == "__main__":
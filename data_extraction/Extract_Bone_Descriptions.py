@@ -1,56 +1,76 @@
-import xml.etree.ElementTree as ET
-import json
 import os
 import argparse
 import sys
+import zipfile
+from functools import partial
 
-def extract_descriptions_from_slide(xml_file): # Extract descriptions from a single slide XML file
-    try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-    except (ET.ParseError, FileNotFoundError) as e:
-        print(f"[ERROR] Failed to parse {xml_file}: {e}")
-        return None
-    
-    ns = {
-        'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
-        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main'
-    }
+try:
+    from . import profiling
+    from .etag_manifest import update_etag_manifest
+    from .manifest import SlideManifest, add_force_argument, code_version, write_json
+    from .parallel import add_jobs_argument, map_slides
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import SlideDeck, SlideDocument, as_slide_deck, iter_shapes
+    from .xml_backend import ParseError, Query
+except ImportError:
+    import profiling
+    from etag_manifest import update_etag_manifest
+    from manifest import SlideManifest, add_force_argument, code_version, write_json
+    from parallel import add_jobs_argument, map_slides
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import SlideDeck, SlideDocument, as_slide_deck, iter_shapes
+    from xml_backend import ParseError, Query
 
+# sibling modules whose code shapes the output, for the manifest's code version
+_HELPER_MODULES = ("etag_manifest.py",)
+_XFRM, _OFF, _EXT = Query(".//a:xfrm"), Query("a:off"), Query("a:ext")
+
+def extract_descriptions_from_slide(xml_file): # Extract descriptions from a slide XML file, SlideDocument or streamed shapes
+    # Shapes are handled one at a time as the parser completes them (SlideDeck.iter_shapes)
+    if isinstance(xml_file, (str, os.PathLike, SlideDocument)):
+        shapes = iter_shapes(xml_file, kinds=("sp",))
+    else:
+        shapes = xml_file
+    
     all_text_content = []
     shape_text_groups = []
     description_text = []
     
     # Iterate through all shapes in the slide
-    for sp in root.findall(".//p:sp", ns):
-        # Get position and size information
-        xfrm = sp.find(".//a:xfrm", ns)
-        in_description_region = False
-        
-        if xfrm is not None:
-            pos = xfrm.find("a:off", ns)
-            size = xfrm.find("a:ext", ns)
+    try:
+        for shape in shapes:
+            # Get position and size information
+            xfrm = _XFRM.first(shape.element)
+            in_description_region = False
             
-            if pos is not None and size is not None:
-                x, y = int(pos.attrib.get("x", 0)), int(pos.attrib.get("y", 0))
-                width, height = int(size.attrib.get("cx", 0)), int(size.attrib.get("cy", 0))
+            if xfrm is not None:
+                pos = _OFF.first(xfrm)
+                size = _EXT.first(xfrm)
                 
-                # Check if shape is in the description region
-                # Range in which the descriptions are held
-                if x > 8011000 and y > 3000000:
-                    in_description_region = True
-        
-        # Extract text from this shape
-        text_elements = sp.findall(".//a:t", ns)
-        shape_text = [t.text for t in text_elements if t.text and t.text.strip()]
-        
-        if shape_text:
-            shape_text_groups.append(shape_text)
-            all_text_content.extend(shape_text)
+                if pos is not None and size is not None:
+                    x, y = int(pos.attrib.get("x", 0)), int(pos.attrib.get("y", 0))
+                    width, height = int(size.attrib.get("cx", 0)), int(size.attrib.get("cy", 0))
+                    
+                    # Check if shape is in the description region
+                    # Range in which the descriptions are held
+                    if x > 8011000 and y > 3000000:
+                        in_description_region = True
             
-            # If this shape is in the description region, add to description_text
-            if in_description_region:
-                description_text.extend(shape_text)
+            # Extract text from this shape
+            shape_text = [t for t in shape.texts if t and t.strip()]
+            
+            if shape_text:
+                shape_text_groups.append(shape_text)
+                all_text_content.extend(shape_text)
+                
+                # If this shape is in the description region, add to description_text
+                if in_description_region:
+                    description_text.extend(shape_text)
+    except (ParseError, FileNotFoundError) as e:
+        if shapes is xml_file:
+            raise  # the caller streamed the slide and reports its own errors
+        log.error(f"[ERROR] Failed to parse {xml_file}: {e}")
+        return None
     
     # Filter out empty strings and cleanup text
     all_text_content = [t.strip() for t in all_text_content if t and t.strip()]
@@ -122,88 +142,135 @@ def extract_descriptions_from_slide(xml_file): # Extract descriptions from a sin
     
     return bone_data
 
-def process_all_slides(ppt_dir, output_dir):
-    slides_dir = f"{ppt_dir}/ppt/slides"
+def process_slide(deck, slide_num, output_dir):
+    """
+    Extract one slide's descriptions and write them when the slide has any.
+    Returns (bone_data, error) where error is a message for parse or write failures.
+    """
+    with profiling.stage("slide", slide=slide_num):
+        return _process_slide(deck, slide_num, output_dir)
+
+def _process_slide(deck, slide_num, output_dir):
+    try:
+        with profiling.stage("shape_scan"):
+            bone_data = extract_descriptions_from_slide(deck.iter_shapes(slide_num, kinds=("sp",)))
+    except (ParseError, FileNotFoundError) as e:
+        return None, f"[ERROR] Failed to parse slide {slide_num}: {e}"
+    
+    if bone_data is None or bone_data["name"] == "Unknown" or not bone_data["description"]:
+        return bone_data, None
+    
+    # Write output
+    out_path = os.path.join(output_dir, f"slide{slide_num}.json")
+    try:
+        write_json(out_path, bone_data, indent=4)
+    except IOError as e:
+        return bone_data, f"\n[ERROR] Could not write output file {out_path}: {e}"
+    return bone_data, None
+
+def process_all_slides(ppt_dir, output_dir, jobs=1, force=False):
     # Discover all slides
     try:
-        if not os.path.exists(slides_dir):
-            print(f"[ERROR] Slides directory not found: {slides_dir}")
-            print("Make sure the slides directory exists")
+        deck = as_slide_deck(ppt_dir)
+        if not deck.exists():
+            log.error(f"[ERROR] Slides directory not found: {deck.slides_dir}")
+            log.error("Make sure the slides directory exists")
             return False
         
-        slide_files = [f for f in os.listdir(slides_dir) 
-                      if f.startswith('slide') and f.endswith('.xml')]
-        
         # Extract slide numbers and sort them
-        slide_nums = sorted([int(f.replace('slide', '').replace('.xml', '')) 
-                           for f in slide_files if f[5:-4].isdigit()])
+        slide_nums = deck.slide_numbers()
         
         # Skip slide 1 (title slide) and process remaining slides
         slide_nums = [n for n in slide_nums if n >= 2]
         
         if not slide_nums:
-            print("[ERROR] No slides found (need at least slide 2)")
+            log.error("[ERROR] No slides found (need at least slide 2)")
             return False
         
-        print("\n" + "="*70)
-        print("BONE DESCRIPTION EXTRACTION - ALL SLIDES")
-        print("="*70)
-        print(f"Mode: Batch processing all slides")
-        print(f"Found {len(slide_nums)} slides to process: {slide_nums}")
-        print("="*70 + "\n")
+        log.info("\n" + "="*70)
+        log.info("BONE DESCRIPTION EXTRACTION - ALL SLIDES")
+        log.info("="*70)
+        log.info(f"Mode: Batch processing all slides")
+        log.info(f"Found {len(slide_nums)} slides to process: {slide_nums}")
+        log.info("="*70 + "\n")
         
-    except FileNotFoundError as e:
-        print(f"[ERROR] Could not access slides directory: {e}")
+    except (FileNotFoundError, zipfile.BadZipFile) as e:
+        log.error(f"[ERROR] Could not access slides directory: {e}")
         return False
     
     # Process each slide and collect results
     processed_count = 0
     skipped_count = 0
+    unchanged_count = 0
+    
+    # Only slides whose inputs differ from the manifest are re-extracted
+    manifest = SlideManifest(output_dir, "descriptions", code_version(__file__, *_HELPER_MODULES), enabled=not force)
+    fingerprints = {n: manifest.fingerprint(deck, n) for n in slide_nums}
+    changed = [n for n in slide_nums if not manifest.is_unchanged(n, fingerprints[n], output_dir)]
+    
+    # Slides are extracted and written by the workers, then reported in slide order
+    results = dict(zip(changed, map_slides(partial(process_slide, output_dir=output_dir), changed, deck,
+                                           jobs=jobs, setup=SlideDeck, setup_args=(deck.portable_source(),))))
     
     for slide_num in slide_nums:
-        slide_path = f"{slides_dir}/slide{slide_num}.xml"
+        progress = f"Processing slide {slide_num}... "
         
-        print(f"Processing slide {slide_num}... ", end="", flush=True)
+        if slide_num not in results:
+            log.info(progress + "[UNCHANGED]")
+            unchanged_count += 1
+            continue
         
-        bone_data = extract_descriptions_from_slide(slide_path)
+        bone_data, error = results[slide_num]
+        written = bone_data is not None and not error and \
+            bone_data["name"] != "Unknown" and bool(bone_data["description"])
+        manifest.record(slide_num, fingerprints[slide_num], [f"slide{slide_num}.json"] if written else [])
         
         if bone_data is None:
-            print("[SKIPPED - Parse Error]")
+            if error:
+                log.error(error)
+            log.info(progress + "[SKIPPED - Parse Error]")
             skipped_count += 1
             continue
         
         if bone_data["name"] != "Unknown" and bone_data["description"]:
-            print(f"✓ {bone_data['name']} ({len(bone_data['description'])} descriptions)")
+            log.info(progress + f"✓ {bone_data['name']} ({len(bone_data['description'])} descriptions)")
             processed_count += 1
         else:
-            print("[SKIPPED - No descriptions found]")
+            log.info(progress + "[SKIPPED - No descriptions found]")
             skipped_count += 1
             continue
-    
-        # Write output
-        out_path = os.path.join(output_dir, f"slide{slide_num}.json")
-        try:
-            with open(out_path, 'w') as f:
-                json.dump(bone_data, f, indent=4)
-        except IOError as e:
-            print(f"\n[ERROR] Could not write output file {out_path}: {e}")
+        
+        if error:
+            log.error(error)
             return False
 
-    print("\n" + "="*70)
-    print("EXTRACTION COMPLETE!")
-    print("="*70)
-    print(f"Total slides processed: {processed_count}")
-    print(f"Total slides skipped: {skipped_count}")
-    print("="*70 + "\n")
+    removed = manifest.remove_stale(output_dir, slide_nums)
+    manifest.save()
+    if removed:
+        log.info(f"Removed {len(removed)} outputs of slides that no longer produce them")
+    update_etag_manifest(output_dir, [name for n in changed for name in manifest.outputs(n)],
+                         unchanged=[name for n in slide_nums if n not in results for name in manifest.outputs(n)])
+
+    log.info("\n" + "="*70)
+    log.info("EXTRACTION COMPLETE!")
+    log.info("="*70)
+    log.info(f"Total slides processed: {processed_count}")
+    log.info(f"Total slides skipped: {skipped_count}")
+    log.info(f"Total slides unchanged: {unchanged_count}")
+    log.info("="*70 + "\n")
     return True
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract bone descriptions from slides.")
-    parser.add_argument("ppt_dir", help="Path to the folder containing the PowerPoint data.")
+    parser.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
     parser.add_argument("output_dir", help="Path to the output directory.")
+    add_jobs_argument(parser)
+    add_force_argument(parser)
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
 
     os.makedirs(args.output_dir, exist_ok=True)
-    success = process_all_slides(args.ppt_dir, args.output_dir)
+    with profiled(args, "descriptions"):
+        success = process_all_slides(args.ppt_dir, args.output_dir, jobs=args.jobs, force=args.force)
     sys.exit(0 if success else 1)
\ No newline at end of file
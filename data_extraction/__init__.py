@@ -0,0 +1 @@
+"""PowerPoint data extraction scripts for the Digital Bone Box data branch."""
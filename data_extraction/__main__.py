@@ -0,0 +1,24 @@
+"""
+Command-line entry point of the package:
+
+    python -m data_extraction build DECK OUTPUT_DIR
+
+runs every extraction stage as one cached, parallel build (see build.py).
+"""
+
+import argparse
+import sys
+
+from .build import add_build_arguments, build_command
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m data_extraction")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_build_arguments(commands.add_parser("build", help="Run every extraction stage as one cached, parallel build."))
+    args = parser.parse_args()
+    sys.exit(0 if build_command(args) else 1)
+
+
+if __name__ == "__main__":
+    main()
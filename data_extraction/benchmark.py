@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the extraction pipeline.
+Generates synthetic decks (synthetic_deck.py) at a few sizes and runs every
+extractor on each one as a separate process, recording wall time and the
+process's peak resident memory. Results are written as JSON named after the
+current commit, so two runs can be compared with --compare to spot
+regressions between commits:
+
+    python benchmark.py --sizes small medium --repeat 3
+    python benchmark.py --compare benchmark_results/<old>.json benchmark_results/<new>.json
+
+Every run passes --force where the extractor has an incremental manifest, so
+the numbers measure a full extraction rather than a skip. Peak RSS includes
+the interpreter itself; "baseline_rss_bytes" records that floor (an empty
+Python process) for reference.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+try:
+    from .manifest import write_if_changed
+    from .synthetic_deck import DeckSpec, write_deck
+    from .xml_backend import BACKEND
+except ImportError:
+    from manifest import write_if_changed
+    from synthetic_deck import DeckSpec, write_deck
+    from xml_backend import BACKEND
+
+RESULTS_FORMAT = 1
+RESULTS_DIR = "benchmark_results"
+DEFAULT_THRESHOLD = 0.10
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+SIZES = {
+    "small": DeckSpec(slides=4, freeforms=3, bezier_points=24, connectors=4, labels=2, media=2),
+    "medium": DeckSpec(slides=20, freeforms=10, bezier_points=150, connectors=12, labels=8, media=3),
+    "large": DeckSpec(slides=60, freeforms=25, bezier_points=900, connectors=30, labels=20, media=4,
+                      image_size=(1600, 1200)),
+}
+
+
+def _boneset_input(deck):
+    return deck if deck.endswith(".pptx") else os.path.join(deck, "ppt", "slides", "slide1.xml")
+
+
+# extractor -> (script, argv builder(deck, output dir, spec), takes --jobs)
+EXTRACTORS = {
+    "colored_regions": ("ColoredRegionsExtractor.py", lambda deck, out, spec: [deck, out, "--force"], True),
+    "bone_images": ("extract_bone_images.py", lambda deck, out, spec: [deck, out, "--force"], True),
+    "text_labels": ("extract_text_labels.py", lambda deck, out, spec: [deck, out, "--force"], True),
+    "descriptions": ("Extract_Bone_Descriptions.py", lambda deck, out, spec: [deck, out, "--force"], True),
+    "boneset": ("xml_boneset_reader.py",
+                lambda deck, out, spec: [_boneset_input(deck), os.path.join(out, "boneset.json")], False),
+    "rotation": ("bony_pelvis_rotation.py",
+                 lambda deck, out, spec: [deck, *map(str, range(2, spec.slides + 2)), "2",
+                                          "--out-template", os.path.join(out, "template.json"),
+                                          "--out-metadata", os.path.join(out, "metadata.json")], False),
+}
+
+
+def _peak_rss(usage):
+    """ru_maxrss in bytes (Linux reports KiB, macOS bytes)"""
+    return usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+def run_process(argv, log_path):
+    """
+    Run argv to completion with its output in log_path.
+    Returns (seconds, peak RSS bytes or None where the platform cannot tell).
+    """
+    with open(log_path, "wb") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(argv, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # the child's own rusage, not the running total over every child so far
+            _, status, usage = os.wait4(proc.pid, 0)
+            seconds = time.perf_counter() - start
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak = _peak_rss(usage)
+        else:
+            proc.wait()
+            seconds, peak = time.perf_counter() - start, None
+    if proc.returncode != 0:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            tail = f.read()[-2000:]
+        raise RuntimeError(f"{' '.join(argv)} exited with {proc.returncode}:\n{tail}")
+    return seconds, peak
+
+
+def benchmark_extractor(name, deck, spec, work_dir, repeat=3, jobs=None):
+    """Time one extractor `repeat` times on a deck; returns its result record"""
+    script, build_args, takes_jobs = EXTRACTORS[name]
+    out = os.path.join(work_dir, name)
+    argv = [sys.executable, os.path.join(_HERE, script), *build_args(deck, out, spec)]
+    if jobs is not None and takes_jobs:
+        argv += ["--jobs", str(jobs)]
+    seconds, peaks = [], []
+    for _ in range(repeat):
+        shutil.rmtree(out, ignore_errors=True)
+        os.makedirs(out, exist_ok=True)
+        elapsed, peak = run_process(argv, os.path.join(work_dir, f"{name}.log"))
+        seconds.append(round(elapsed, 4))
+        if peak is not None:
+            peaks.append(peak)
+    return {
+        "seconds": seconds,
+        "best_seconds": min(seconds),
+        "median_seconds": round(statistics.median(seconds), 4),
+        "peak_rss_bytes": max(peaks) if peaks else None,
+    }
+
+
+def _git(*args):
+    try:
+        done = subprocess.run(["git", *args], cwd=_HERE, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return done.stdout.strip()
+
+
+def run_benchmarks(sizes, extractors, repeat=3, jobs=None, as_pptx=False, work_dir=None):
+    """Benchmark each extractor at each named size; returns the results document"""
+    commit = _git("rev-parse", "HEAD")
+    results = {
+        "format": RESULTS_FORMAT,
+        "commit": commit,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")) if commit else None,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "xml_backend": BACKEND,
+        "repeat": repeat,
+        "jobs": jobs,
+        "input": "pptx" if as_pptx else "folder",
+        "baseline_rss_bytes": None,
+        "sizes": {},
+    }
+    if work_dir:
+        os.makedirs(work_dir, exist_ok=True)
+    root = work_dir or tempfile.mkdtemp(prefix="extraction-bench-")
+    try:
+        _, results["baseline_rss_bytes"] = run_process([sys.executable, "-c", "pass"],
+                                                       os.path.join(root, "baseline.log"))
+        for size in sizes:
+            spec = SIZES[size]
+            deck = os.path.join(root, size, "deck.pptx" if as_pptx else "deck")
+            if not os.path.exists(deck):
+                write_deck(spec, deck)
+            deck_bytes = (os.path.getsize(deck) if as_pptx else
+                          sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(deck) for f in files))
+            entry = results["sizes"][size] = {"deck": spec.to_dict(), "deck_bytes": deck_bytes, "extractors": {}}
+            print(f"{size}: {spec.slides + 1} slides, {deck_bytes / 1e6:.2f} MB")
+            for name in extractors:
+                record = benchmark_extractor(name, deck, spec, os.path.join(root, size), repeat, jobs)
+                entry["extractors"][name] = record
+                rss = record["peak_rss_bytes"]
+                rss_text = f"   peak RSS {rss / 2**20:8.1f} MiB" if rss is not None else ""
+                print(f"  {name:<16} best {record['best_seconds']:8.3f} s   "
+                      f"median {record['median_seconds']:8.3f} s{rss_text}")
+    finally:
+        if work_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def compare_results(old, new, threshold=DEFAULT_THRESHOLD):
+    """
+    Rows comparing two results documents, one per (size, extractor, metric)
+    present in both: {size, extractor, metric, old, new, ratio, regressed}.
+    Times compare the best run; a metric regresses when new > old * (1 + threshold).
+    """
+    rows = []
+    for size, entry in new.get("sizes", {}).items():
+        before = old.get("sizes", {}).get(size)
+        if before is None:
+            continue
+        for name, record in entry["extractors"].items():
+            previous = before["extractors"].get(name)
+            if previous is None:
+                continue
+            for metric in ("best_seconds", "peak_rss_bytes"):
+                a, b = previous.get(metric), record.get(metric)
+                if not a or b is None:
+                    continue
+                ratio = b / a
+                rows.append({"size": size, "extractor": name, "metric": metric, "old": a, "new": b,
+                             "ratio": round(ratio, 4), "regressed": ratio > 1 + threshold})
+    return rows
+
+
+def print_comparison(old, new, rows):
+    print(f"Comparing {(old.get('commit') or '?')[:12]} -> {(new.get('commit') or '?')[:12]}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"  {row['size']:<7} {row['extractor']:<16} {row['metric']:<15} "
+              f"{row['old']:>12.4g} -> {row['new']:>12.4g}  x{row['ratio']:.3f}{flag}")
+
+
+def default_output(results):
+    commit = results.get("commit")
+    name = f"{commit[:12]}{'-dirty' if results.get('dirty') else ''}" if commit else "uncommitted"
+    return os.path.join(RESULTS_DIR, f"{name}.json")
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("format") != RESULTS_FORMAT:
+        raise SystemExit(f"{path}: unsupported benchmark results format {results.get('format')}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time and memory-profile the extractors on synthetic decks.")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(SIZES), default=["small", "medium"],
+                        help="Deck sizes to run (default: small medium).")
+    parser.add_argument("--extractors", nargs="+", choices=sorted(EXTRACTORS), default=list(EXTRACTORS),
+                        help="Extractors to run (default: all).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per extractor and size; the best is compared (default: 3).")
+    parser.add_argument("--jobs", type=int, help="Pass --jobs to the extractors that take it.")
+    parser.add_argument("--pptx", action="store_true", help="Benchmark .pptx archives instead of unzipped folders.")
+    parser.add_argument("--work-dir", help="Keep decks and extractor outputs here instead of a temporary folder.")
+    parser.add_argument("--output", help=f"Results file (default: {RESULTS_DIR}/<commit>.json).")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                        help="Compare against a previous results file; with two files, compare them without running.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative slowdown or memory growth reported as a regression (default: 0.10).")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 when a regression is found.")
+    args = parser.parse_args()
+
+    if args.compare and len(args.compare) > 2:
+        parser.error("--compare takes one or two results files")
+    if args.compare and len(args.compare) == 2:
+        old, new = _load(args.compare[0]), _load(args.compare[1])
+    else:
+        if args.repeat < 1:
+            parser.error("--repeat must be at least 1")
+        new = run_benchmarks(args.sizes, args.extractors, args.repeat, args.jobs, args.pptx, args.work_dir)
+        output = args.output or default_output(new)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        write_if_changed(output, json.dumps(new, indent=2))
+        print(f"✓ Results saved to {output}")
+        old = _load(args.compare[0]) if args.compare else None
+
+    if old is not None:
+        rows = compare_results(old, new, args.threshold)
+        print_comparison(old, new, rows)
+        if args.fail_on_regression and any(row["regressed"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,61 @@
-import argparse, json, os, re
-import xml.etree.ElementTree as ET
-
-NS = {
-    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
-    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
-    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-}
-PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
-
+import argparse, json, os
+
+try:
+    from . import profiling
+    from .manifest import write_if_changed
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import NS, as_slide_deck, as_slide_document
+    from .xml_backend import Query
+except ImportError:
+    import profiling
+    from manifest import write_if_changed
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import NS, as_slide_deck, as_slide_document
+    from xml_backend import Query
+
+# sibling modules whose code shapes the output, for the build's stage fingerprint
+_HELPER_MODULES = ()
 EMU_PER_DEG = 60000.0
-_SLIDE_NUM_RE = re.compile(r"(\d+)")
+_XFRM, _OFF, _EXT = Query(".//a:xfrm"), Query("a:off"), Query("a:ext")
+_BLIP, _SRC_RECT = Query(".//a:blip"), Query(".//a:srcRect")
 
 def _num(el, attr, default=0.0):
     try: return float(el.get(attr))
     except Exception: return default
 
-def _slide_num(path):
-    m = _SLIDE_NUM_RE.search(os.path.splitext(os.path.basename(path))[0])
-    return int(m.group(1)) if m else None
+def picture_frame(pic):
+    """Frame of a p:pic: EMU offset/extent, rotation, flips, crop and blip rId (None without an xfrm)"""
+    xfrm = _XFRM.first(pic)
+    if xfrm is None:
+        return None
+    off, ext = _OFF.first(xfrm), _EXT.first(xfrm)
+    if off is None or ext is None:
+        return None
+    x, y = _num(off, "x"), _num(off, "y")
+    cx, cy = _num(ext, "cx"), _num(ext, "cy")
+    area = cx * cy
+    blip = _BLIP.first(pic)
+    embed = blip.get("{%s}embed" % NS["r"]) if blip is not None else None
+    rot_emu = _num(xfrm, "rot", 0.0)
+    # srcRect crops are in 1/1000ths of a percent of the image size
+    src = _SRC_RECT.first(pic)
+    crop = {k: (_num(src, k) / 100000.0 if src is not None else 0.0) for k in ("l", "t", "r", "b")}
+    return {
+        "x": x, "y": y, "cx": cx, "cy": cy, "area": area,
+        "rot_emu": rot_emu,
+        "rot_deg": rot_emu / EMU_PER_DEG,
+        "flipH": (xfrm.get("flipH") == "1"),
+        "flipV": (xfrm.get("flipV") == "1"),
+        "embed": embed,
+        "crop": crop
+    }
 
-def two_largest_pics(root, min_area_frac=0.05):
+def two_largest_pics(doc, min_area_frac=0.05):
     pics = []
-    for pic in root.findall(".//p:pic", NS):
-        xfrm = pic.find(".//a:xfrm", NS)
-        if xfrm is None:
-            continue
-        off, ext = xfrm.find("a:off", NS), xfrm.find("a:ext", NS)
-        if off is None or ext is None:
-            continue
-        x, y = _num(off, "x"), _num(off, "y")
-        cx, cy = _num(ext, "cx"), _num(ext, "cy")
-        area = cx * cy
-        blip = pic.find(".//a:blip", NS)
-        embed = blip.get("{%s}embed" % NS["r"]) if blip is not None else None
-        rot_emu = _num(xfrm, "rot", 0.0)
-        pics.append({
-            "x": x, "y": y, "cx": cx, "cy": cy, "area": area,
-            "rot_emu": rot_emu,
-            "rot_deg": rot_emu / EMU_PER_DEG,
-            "flipH": (xfrm.get("flipH") == "1"),
-            "flipV": (xfrm.get("flipV") == "1"),
-            "embed": embed
-        })
+    for pic in doc.pictures:
+        frame = picture_frame(pic)
+        if frame is not None:
+            pics.append(frame)
     pics.sort(key=lambda d: d["area"], reverse=True)
     if not pics:
         return []
@@ -61,9 +75,8 @@ def _norm(item, box):
         "normW": item["cx"]/w, "normH": item["cy"]/h
     }
 
-def compute_template(slide_path, min_area_frac):
-    root = ET.parse(slide_path).getroot()
-    top2 = two_largest_pics(root, min_area_frac)
+def compute_template(slide, min_area_frac):
+    top2 = two_largest_pics(as_slide_document(slide), min_area_frac)
     if len(top2) < 2:
         raise SystemExit("Template slide must contain two main pictures.")
     left, right = sorted(top2, key=lambda d: d["x"])
@@ -85,14 +98,14 @@ def compute_template(slide_path, min_area_frac):
         "norm_basis": "two-image-union"
     }
 
-def extract_slide_metadata(slide_path, bone_set, min_area_frac):
-    root = ET.parse(slide_path).getroot()
-    top2 = two_largest_pics(root, min_area_frac)
+def extract_slide_metadata(slide, bone_set, min_area_frac):
+    doc = as_slide_document(slide)
+    top2 = two_largest_pics(doc, min_area_frac)
     if len(top2) < 2:
         return None
     left, right = sorted(top2, key=lambda d: d["x"])
     return {
-        "slide": _slide_num(slide_path),
+        "slide": doc.number,
         "bone_set": bone_set,
         "left_media": left["embed"],
         "right_media": right["embed"],
@@ -102,11 +115,11 @@ def extract_slide_metadata(slide_path, bone_set, min_area_frac):
 def _close(a, b, tol):
     return abs(a-b) <= tol
 
-def audit_slide(slide_path, template, tol, min_area_frac):
-    root = ET.parse(slide_path).getroot()
-    top2 = two_largest_pics(root, min_area_frac)
+def audit_slide(slide, template, tol, min_area_frac):
+    doc = as_slide_document(slide)
+    top2 = two_largest_pics(doc, min_area_frac)
     if len(top2) < 2:
-        return {"slide": _slide_num(slide_path), "ok": False, "reason": "fewer-than-two-pics"}
+        return {"slide": doc.number, "ok": False, "reason": "fewer-than-two-pics"}
     left, right = sorted(top2, key=lambda d: d["x"])
     box = _bbox(left, right)
     L = {**_norm(left, box),  "rot_deg": left["rot_deg"]}
@@ -118,34 +131,20 @@ def audit_slide(slide_path, template, tol, min_area_frac):
                 fails.append(f"{side}.{k}")
         if not _close(got["rot_deg"], want["rot_deg"], tol*10):
             fails.append(f"{side}.rot_deg")
-    return {"slide": _slide_num(slide_path), "ok": not fails, "fails": fails}
-
-# ---- rId -> filename/path resolver (optional via --rels-dir) ----
-
-def _read_rels_map(rels_path):
-    if not os.path.exists(rels_path):
-        return {}
-    root = ET.parse(rels_path).getroot()
-    out = {}
-    for rel in root.findall(f".//{{{PKG_REL_NS}}}Relationship"):
-        rid = rel.attrib.get("Id")
-        if rid:
-            out[rid] = {"Type": rel.attrib.get("Type",""), "Target": rel.attrib.get("Target","")}
-    return out
-
-def resolve_media_path(slides_dir, rels_dir, slide_num, rid):
-    rels_path = os.path.join(rels_dir, f"slide{slide_num}.xml.rels")
-    rels = _read_rels_map(rels_path)
+    return {"slide": doc.number, "ok": not fails, "fails": fails}
+
+# ---- rId -> filename/path resolver ----
+
+def resolve_media_path(deck, rels, rid):
     info = rels.get(rid)
     if not info or not info.get("Target"):
         return {"target": "", "path": ""}
     target = info["Target"]
-    fs_path = os.path.normpath(os.path.join(slides_dir, target))
-    return {"target": target, "path": fs_path}
+    return {"target": target, "path": deck.path(deck.media_part(target))}
 
-def main():
+def build_parser():
     ap = argparse.ArgumentParser()
-    ap.add_argument("ppt_dir", help="Path to the folder containing the PowerPoint data.")
+    ap.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
     ap.add_argument("slides", type=int, nargs="+", help="Slide numbers to parse.")
     ap.add_argument("representative", type=int, help="Slide number used as the representative example for computing the normalized template (must contain the two main pictures).")
     ap.add_argument("--out-template", default="annotations/template_rotation.json",
@@ -158,44 +157,55 @@ def main():
                     help="Tolerance used when comparing normalized geometry (fractional units). Smaller values require closer matches. Default: 0.02.")
     ap.add_argument("--min-area", type=float, default=0.05,
                 help="Minimum area fraction (relative to the largest picture) used to consider an image a \"main\" picture when selecting the representative pair. Default: 0.05.")
-    args = ap.parse_args()
+    add_profile_arguments(ap)
+    return ap
+
+def main():
+    args = build_parser().parse_args()
+
+    with profiled(args, "rotation"):
+        run(args)
 
-    slides_dir = os.path.join(args.ppt_dir, f"ppt/slides/")
-    rep_path = os.path.join(slides_dir, f"slide{args.representative}.xml")
-    if not os.path.exists(rep_path):
-        raise SystemExit(f"Missing representative slide: {rep_path}")
+def run(args):
+    deck = as_slide_deck(args.ppt_dir)
+    if not deck.has_slide(args.representative):
+        raise SystemExit(f"Missing representative slide: {deck.path(deck.slide_part(args.representative))}")
 
-    template = compute_template(rep_path, args.min_area)
+    doc = deck.slide(args.representative)
+    with profiling.stage("shape_scan"):
+        template = compute_template(doc, args.min_area)
 
     tpl_dir = os.path.dirname(args.out_template)
     if tpl_dir:
         os.makedirs(tpl_dir, exist_ok=True)
-    with open(args.out_template, "w") as f:
-        json.dump({
+    with profiling.stage("serialize"):
+        content = json.dumps({
             "bone_set": "Bony Pelvis",
             "display_format": "side-by-side",
             "extracted_from_slide": args.representative,
             "normalized_geometry": template
-        }, f, indent=2)
+        }, indent=2)
+    write_if_changed(args.out_template, content)
 
     metadata, verified, failures = [], [], []
     for n in args.slides:
-        path = os.path.join(slides_dir, f"slide{n}.xml")
-        if not os.path.exists(path):
+        if not deck.has_slide(n):
             continue
-        md = extract_slide_metadata(path, "Bony Pelvis", args.min_area)
+        doc = deck.slide(n)
+        with profiling.stage("shape_scan"):
+            md = extract_slide_metadata(doc, "Bony Pelvis", args.min_area)
         if md:
             # enrich with media targets/paths
-            rels_dir = os.path.join(slides_dir, f"_rels/")
-            left  = resolve_media_path(slides_dir, rels_dir, n, md["left_media"])
-            right = resolve_media_path(slides_dir, rels_dir, n, md["right_media"])
+            left  = resolve_media_path(deck, doc.rels, md["left_media"])
+            right = resolve_media_path(deck, doc.rels, md["right_media"])
             md["left_media_target"]  = left["target"]
             md["right_media_target"] = right["target"]
             md["left_media_path"]    = left["path"]
             md["right_media_path"]   = right["path"]
             metadata.append(md)
             if args.audit:
-                res = audit_slide(path, template, args.tolerance, args.min_area)
+                with profiling.stage("shape_scan"):
+                    res = audit_slide(doc, template, args.tolerance, args.min_area)
                 (verified if res["ok"] else failures).append(res)
 
     os.makedirs(os.path.dirname(args.out_metadata) or ".", exist_ok=True)
@@ -206,11 +216,12 @@ def main():
             "verified_slides": [v["slide"] for v in verified],
             "failed_slides": failures
         }
-    with open(args.out_metadata, "w") as f:
-        json.dump(out, f, indent=2)
+    with profiling.stage("serialize"):
+        content = json.dumps(out, indent=2)
+    write_if_changed(args.out_metadata, content)
 
-    print(f"template -> {args.out_template}")
-    print(f"metadata -> {args.out_metadata}")
+    log.info(f"template -> {args.out_template}")
+    log.info(f"metadata -> {args.out_metadata}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+Single-command build of every extraction output:
+
+    python -m data_extraction build DECK OUTPUT_DIR [--stages ...] [--jobs N]
+
+Each extractor is a stage of a dependency graph (STAGES) and writes into
+OUTPUT_DIR/<stage>/:
+
+    boneset/                 xml_boneset_reader (bonesets.json from slide 1,
+                             boneset_index.json over every slide)
+    descriptions/            Extract_Bone_Descriptions
+    bone_images/             extract_bone_images
+    text_labels/             extract_text_labels
+    colored_regions/         ColoredRegionsExtractor
+    rotation/                bony_pelvis_rotation (template and metadata)
+    navigation/              navigation_graph (links, breadcrumbs and the
+                             per-slide outputs above to prefetch)
+
+The deck is opened once (a .pptx is read into memory) and, when any stage
+has work to do, every slide is parsed once up front. Stages then run
+concurrently in worker processes, each as soon as the stages it depends on
+have finished; forked workers inherit the parsed deck instead of re-reading
+it, and where fork is unavailable each worker reopens the deck itself.
+
+A stage is skipped when its fingerprint (digests of the deck parts it reads,
+its code and options, and the fingerprints of the stages it depends on)
+matches OUTPUT_DIR/.build_manifest.json and the files it wrote last time are
+still there. A stage that does run still skips unchanged slides through the
+extractor's own manifest. --force re-runs everything.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    from . import ColoredRegionsExtractor, Extract_Bone_Descriptions, bony_pelvis_rotation, extract_bone_images, \
+        extract_text_labels, navigation_graph, profiling, xml_boneset_reader
+    from .ColoredRegionsExtractor import AnatomicalShapeParser
+    from .Extract_Bone_Descriptions import process_all_slides
+    from .manifest import add_force_argument, cached_part_digest, code_version, write_if_changed
+    from .navigation_graph import write_navigation
+    from .parallel import add_jobs_argument
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import MEDIA_DIR, SLIDES_DIR, SlideDeck
+    from .xml_boneset_reader import BONESET_INDEX_FILENAME, extract_bones_from_xml, generate_json_output, \
+        write_boneset_index
+except ImportError:
+    import ColoredRegionsExtractor
+    import Extract_Bone_Descriptions
+    import bony_pelvis_rotation
+    import extract_bone_images
+    import extract_text_labels
+    import navigation_graph
+    import profiling
+    import xml_boneset_reader
+    from ColoredRegionsExtractor import AnatomicalShapeParser
+    from Extract_Bone_Descriptions import process_all_slides
+    from manifest import add_force_argument, cached_part_digest, code_version, write_if_changed
+    from navigation_graph import write_navigation
+    from parallel import add_jobs_argument
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import MEDIA_DIR, SLIDES_DIR, SlideDeck
+    from xml_boneset_reader import BONESET_INDEX_FILENAME, extract_bones_from_xml, generate_json_output, \
+        write_boneset_index
+
+BUILD_MANIFEST_FILENAME = ".build_manifest.json"
+BUILD_MANIFEST_FORMAT = 1
+BONESET_SLIDE = 1
+
+# the deck shared by the stage workers: set before forking, or opened by _init_stage_worker
+_deck = None
+
+
+class StageError(Exception):
+    """Raised by a stage when its extractor reports a failure without raising"""
+
+
+def deck_parts(deck):
+    """Every slide, slide relationship and media part: what the per-slide extractors read"""
+    return deck.part_names(SLIDES_DIR) + deck.part_names(f"{SLIDES_DIR}/_rels") + deck.part_names(MEDIA_DIR)
+
+
+def link_parts(deck):
+    """Every slide and slide relationship part: where hyperlinks and their targets live"""
+    return deck.part_names(SLIDES_DIR) + deck.part_names(f"{SLIDES_DIR}/_rels")
+
+
+def _extractor_flags(args):
+    return ["--jobs", str(args.jobs)] + (["--force"] if args.force else [])
+
+
+def run_boneset(deck, out_dir, args):
+    bonesets, _ = extract_bones_from_xml(deck.slide(BONESET_SLIDE), BONESET_SLIDE)
+    generate_json_output(bonesets, os.path.join(out_dir, "bonesets.json"))
+    write_boneset_index(deck, os.path.join(out_dir, BONESET_INDEX_FILENAME), BONESET_SLIDE)
+
+
+def run_descriptions(deck, out_dir, args):
+    if not process_all_slides(deck, out_dir, jobs=args.jobs, force=args.force):
+        raise StageError("description extraction failed")
+
+
+def run_bone_images(deck, out_dir, args):
+    options = extract_bone_images.build_parser().parse_args([deck.location, out_dir, *_extractor_flags(args)])
+    options.ppt_dir = deck
+    extract_bone_images.run(options)
+
+
+def run_text_labels(deck, out_dir, args):
+    options = extract_text_labels.build_parser().parse_args([deck.location, out_dir, *_extractor_flags(args)])
+    options.ppt_dir = deck
+    extract_text_labels.run(options)
+
+
+def run_colored_regions(deck, out_dir, args):
+    AnatomicalShapeParser(deck, out_dir).parse_all_slides(jobs=args.jobs, force=args.force)
+
+
+def run_rotation(deck, out_dir, args):
+    slides = [n for n in deck.slide_numbers() if n >= 2]
+    if not slides:
+        raise StageError("the deck has no slides after the index slide")
+    options = bony_pelvis_rotation.build_parser().parse_args([
+        deck.location, *map(str, slides), str(args.representative),
+        "--out-template", os.path.join(out_dir, "template_rotation.json"),
+        "--out-metadata", os.path.join(out_dir, "rotation_metadata.json")])
+    options.ppt_dir = deck
+    bony_pelvis_rotation.run(options)
+
+
+def run_navigation(deck, out_dir, args):
+    # prefetch lists name the files the per-slide stages wrote beside this one
+    write_navigation(deck, out_dir, BONESET_SLIDE, assets_dir=args.output_dir)
+
+
+def extractor_modules(module):
+    """The extractor's source file and the sibling helpers it names in _HELPER_MODULES"""
+    return (os.path.basename(module.__file__),) + tuple(module._HELPER_MODULES)
+
+
+class Stage:
+    """
+    A node of the build graph. run(deck, out_dir, args) writes the stage's
+    outputs into out_dir; inputs(deck) names the deck parts it reads; module
+    is the extractor whose source files (extractor_modules) its output
+    depends on; options are the build arguments it uses; deps are stages
+    whose outputs it reads.
+    """
+
+    def __init__(self, name, run, module, inputs=deck_parts, options=(), deps=()):
+        self.name = name
+        self.run = run
+        self.modules = extractor_modules(module)
+        self.inputs = inputs
+        self.options = options
+        self.deps = deps
+
+
+# the extractors depend only on the deck and run side by side; navigation
+# lists their per-slide outputs, so it runs after them
+STAGES = {stage.name: stage for stage in (
+    Stage("boneset", run_boneset, xml_boneset_reader, inputs=link_parts),
+    Stage("descriptions", run_descriptions, Extract_Bone_Descriptions),
+    Stage("bone_images", run_bone_images, extract_bone_images),
+    Stage("text_labels", run_text_labels, extract_text_labels),
+    Stage("colored_regions", run_colored_regions, ColoredRegionsExtractor),
+    Stage("rotation", run_rotation, bony_pelvis_rotation, options=("representative",)),
+    Stage("navigation", run_navigation, navigation_graph, inputs=link_parts,
+          deps=("descriptions", "bone_images", "text_labels", "colored_regions")),
+)}
+
+
+def with_dependencies(names):
+    """The named stages plus everything they depend on, each after its dependencies"""
+    order, visiting = [], set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"build stages form a cycle through {name!r}")
+        visiting.add(name)
+        for dep in STAGES[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in STAGES:
+        if name in names:
+            visit(name)
+    return order
+
+
+class BuildManifest:
+    """OUTPUT_DIR/.build_manifest.json: the fingerprint and output files of each stage's last successful run"""
+
+    def __init__(self, output_dir, enabled=True):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, BUILD_MANIFEST_FILENAME)
+        self.enabled = enabled
+        self.stages = {}
+        self._part_cache = {}
+        self._digests = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("format") != BUILD_MANIFEST_FORMAT:
+            return
+        self.stages = data.get("stages", {})
+        self._part_cache = data.get("part_cache", {})
+
+    def _part_digest(self, deck, part):
+        digest = self._digests.get(part)
+        if digest is None:
+            digest = self._digests[part] = cached_part_digest(deck, part, self._part_cache)
+        return digest
+
+    def fingerprint(self, deck, stage, args, dep_fingerprints):
+        """Digest of everything the stage's outputs depend on"""
+        inputs = {
+            "parts": {part: self._part_digest(deck, part) for part in stage.inputs(deck)},
+            "code": code_version(__file__, *stage.modules),
+            "options": {name: getattr(args, name) for name in stage.options},
+            "deps": {name: dep_fingerprints[name] for name in stage.deps},
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def is_unchanged(self, name, fingerprint):
+        if not self.enabled:
+            return False
+        entry = self.stages.get(name)
+        if not entry or entry.get("inputs") != fingerprint:
+            return False
+        return all(os.path.exists(os.path.join(self.output_dir, path)) for path in entry.get("outputs", []))
+
+    def record(self, name, fingerprint, outputs):
+        self.stages[name] = {"inputs": fingerprint, "outputs": sorted(outputs)}
+
+    def forget(self, name):
+        self.stages.pop(name, None)
+
+    def save(self):
+        data = {
+            "format": BUILD_MANIFEST_FORMAT,
+            "stages": {k: self.stages[k] for k in sorted(self.stages)},
+            "part_cache": {k: self._part_cache[k] for k in sorted(self._part_cache)},
+        }
+        os.makedirs(self.output_dir, exist_ok=True)
+        write_if_changed(self.path, json.dumps(data, indent=1, sort_keys=True))
+
+
+def _output_files(output_dir, name):
+    """Files under a stage's output folder, relative to the build's output directory"""
+    files = []
+    for folder, _, names in os.walk(os.path.join(output_dir, name)):
+        files += [os.path.relpath(os.path.join(folder, f), output_dir).replace(os.sep, "/") for f in names]
+    return files
+
+
+def _init_stage_worker(source, state, verbose):
+    global _deck
+    profiling.init_worker(state)
+    if not verbose:
+        log.setLevel(logging.WARNING)
+    if _deck is None:
+        # spawned rather than forked: the parent's parsed deck is not available
+        _deck = SlideDeck(source, in_memory=True)
+
+
+def _run_stage(name, out_dir, args):
+    """Worker entry point: run one stage; returns (error or None, seconds, profiling measurements)"""
+    for handler in log.handlers:
+        handler.setFormatter(logging.Formatter(f"[{name}] %(message)s"))
+    start = time.perf_counter()
+    error = None
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        with profiling.stage(name):
+            STAGES[name].run(_deck, out_dir, args)
+    except StageError as e:
+        error = str(e)
+    except SystemExit as e:
+        error = str(e.code)
+    except Exception:
+        error = traceback.format_exc().rstrip()
+    return error, time.perf_counter() - start, profiling.collect()
+
+
+def _mp_context():
+    # fork lets the workers share the parent's parsed deck
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    return multiprocessing.get_context(method)
+
+
+def run_build(args):
+    """Build the selected stages for the parsed arguments; returns True when none failed"""
+    global _deck
+    start = time.perf_counter()
+    deck = SlideDeck(args.deck, in_memory=True)
+    if not deck.exists():
+        log.error(f"[ERROR] Slides directory not found: {deck.slides_dir}")
+        return False
+
+    names = with_dependencies(args.stages or list(STAGES))
+    manifest = BuildManifest(args.output_dir, enabled=not args.force)
+    fingerprints, pending = {}, []
+    for name in names:
+        fingerprints[name] = manifest.fingerprint(deck, STAGES[name], args, fingerprints)
+        if manifest.is_unchanged(name, fingerprints[name]):
+            log.info(f"= {name} unchanged")
+        else:
+            pending.append(name)
+
+    context = _mp_context()
+    if pending and context.get_start_method() == "fork":
+        deck.preload()
+    _deck = deck
+
+    built, failed, blocked = set(), set(), set()
+    stale = len(pending)
+    workers = min(args.parallel or stale, stale)
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_stage_worker,
+                                 initargs=(args.deck, profiling.worker_state(), args.verbose)) as pool:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    deps = STAGES[name].deps
+                    if any(dep in failed or dep in blocked for dep in deps):
+                        pending.remove(name)
+                        blocked.add(name)
+                        manifest.forget(name)
+                        log.warning(f"- {name} skipped: a stage it depends on failed")
+                    elif not any(dep in pending or dep in running.values() for dep in deps):
+                        pending.remove(name)
+                        log.info(f"▶ {name}")
+                        future = pool.submit(_run_stage, name, os.path.join(args.output_dir, name), args)
+                        running[future] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error, seconds, measurements = future.result()
+                    profiling.merge(measurements)
+                    if error:
+                        failed.add(name)
+                        manifest.forget(name)
+                        log.error(f"✗ {name} failed after {seconds:.2f} s:\n{error}")
+                    else:
+                        built.add(name)
+                        manifest.record(name, fingerprints[name], _output_files(args.output_dir, name))
+                        log.info(f"✓ {name} ({seconds:.2f} s)")
+    manifest.save()
+
+    log.info(f"Build finished in {time.perf_counter() - start:.2f} s: {len(built)} built, "
+             f"{len(names) - stale} unchanged, {len(failed)} failed, {len(blocked)} skipped")
+    return not failed and not blocked
+
+
+def add_build_arguments(parser):
+    """The build command's arguments, shared by build.py and python -m data_extraction build"""
+    parser.add_argument("deck", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
+    parser.add_argument("output_dir", help="Directory that receives one folder per stage.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), metavar="STAGE",
+                        help=f"Stages to build, plus the stages they depend on (default: all of {', '.join(STAGES)}).")
+    parser.add_argument("--parallel", type=int, default=0,
+                        help="Maximum number of stages running at once (default: every stage that is ready).")
+    parser.add_argument("--representative", type=int, default=2,
+                        help="Representative slide for the rotation template (default: 2).")
+    parser.add_argument("--verbose", action="store_true", help="Show each stage's own progress messages.")
+    add_jobs_argument(parser)
+    add_force_argument(parser)
+    add_profile_arguments(parser)
+
+
+def build_command(args):
+    with profiled(args, "build"):
+        return run_build(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every extraction stage as one cached, parallel build.")
+    add_build_arguments(parser)
+    sys.exit(0 if build_command(parser.parse_args()) else 1)
+
+
+if __name__ == "__main__":
+    main()
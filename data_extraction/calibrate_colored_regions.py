@@ -1,95 +1,203 @@
 #!/usr/bin/env python3
 """
 Calibration tool for colored region positioning
-Adds manual offset adjustments to align regions with web images
+Applies per-image affine adjustments (offset, scale, rotation) to colored
+region coordinates so the web viewer receives already-aligned geometry.
+A profile file can calibrate many bones in one batch run.
 """
 
 import json
+import math
+import os
 import argparse
 
+try:
+    from .manifest import write_if_changed
+    from .path_geometry import affine_coords
+    from .profiling import configure_logging, log
+except ImportError:
+    from manifest import write_if_changed
+    from path_geometry import affine_coords
+    from profiling import configure_logging, log
+
+# coordinate keys of a path command, as (x, y) pairs
+_POINT_KEYS = (('x1', 'y1'), ('x2', 'y2'), ('x', 'y'))
+
+
+def adjustment_matrix(adjustment, origin):
+    """
+    SVG-style (a, b, c, d, e, f) matrix for an OVERLAY_ADJUSTMENTS-style entry
+    {x, y, scale, rotation}: scale and rotate (degrees, clockwise on screen)
+    about origin, then translate by (x, y). Same order as the overlay's CSS
+    "translate() scale() rotate()" with transform-origin at the centre.
+    """
+    dx, dy = adjustment.get('x', 0), adjustment.get('y', 0)
+    scale = adjustment.get('scale', 1.0)
+    theta = math.radians(adjustment.get('rotation', 0))
+    cos, sin = scale * math.cos(theta), scale * math.sin(theta)
+    ox, oy = origin
+    return (cos, sin, -sin, cos,
+            ox + dx - (cos * ox - sin * oy),
+            oy + dy - (sin * ox + cos * oy))
+
+
+def _image_origin(image, data, coords):
+    """Centre of the image's coordinate space, or of its geometry when no size is recorded"""
+    dims = image if 'width' in image and 'height' in image else data.get('image_dimensions')
+    if dims and 'width' in dims and 'height' in dims:
+        return dims['width'] / 2, dims['height'] / 2
+    xs, ys = coords[0::2], coords[1::2]
+    if not xs:
+        return 0, 0
+    return (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+
+
+def calibrate_regions(data, adjustments):
+    """
+    Apply adjustments in place to a colored-region dict.
+    adjustments maps image index -> {x, y, scale, rotation}. Multi-image files
+    ({'images': [...]}) are matched on each image's 'index'; a single slide file
+    is treated as image 0. All coordinates of an image are transformed at once
+    and written back into the original command dicts, so other keys survive;
+    integer coordinates stay integers wherever the result is whole.
+    """
+    images = data['images'] if 'images' in data else [dict(data, index=0)]
+    for image in images:
+        image_index = image['index']
+        adjustment = adjustments.get(image_index)
+        if adjustment is None:
+            continue
+        log.info(f"\nApplying adjustment to image {image_index}: {adjustment}")
+
+        regions = image['colored_regions']
+        points = [(cmd, kx, ky) for region in regions for path in region['path_data']
+                  for cmd in path['commands'] for kx, ky in _POINT_KEYS if kx in cmd and ky in cmd]
+        coords = [value for cmd, kx, ky in points for value in (cmd[kx], cmd[ky])]
+        matrix = adjustment_matrix(adjustment, _image_origin(image, data, coords))
+
+        # One vectorized pass over every coordinate of the image
+        moved = affine_coords(coords, matrix, rounded=False).tolist()
+        for k, (cmd, kx, ky) in enumerate(points):
+            for key, value in ((kx, moved[2 * k]), (ky, moved[2 * k + 1])):
+                cmd[key] = int(value) if isinstance(cmd[key], int) and value.is_integer() else value
+        for region in regions:
+            log.info(f"  Adjusted {region['anatomical_name']}")
+    return data
+
+
 def add_offset_to_regions(input_file, output_file, offsets):
     """
     Add offset adjustments to colored region coordinates
-    
+
     Args:
         input_file: Path to input JSON file
         output_file: Path to output JSON file
         offsets: Dict with image indices as keys and (x_offset, y_offset) tuples as values
                  Example: {0: (10, -20), 1: (15, -25)}
     """
-    with open(input_file, 'r') as f:
+    calibrate_file(input_file, output_file,
+                   {index: {'x': x, 'y': y} for index, (x, y) in offsets.items()})
+
+
+def calibrate_file(input_file, output_file, adjustments):
+    """Calibrate one colored-region JSON file with {image index: adjustment}"""
+    with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    
-    for image in data['images']:
-        image_index = image['index']
-        if image_index in offsets:
-            x_offset, y_offset = offsets[image_index]
-            print(f"\nApplying offset to image {image_index}: ({x_offset}, {y_offset})")
-            
-            for region in image['colored_regions']:
-                region_name = region['anatomical_name']
-                print(f"  Adjusting {region_name}...")
-                
-                for path_data in region['path_data']:
-                    for cmd in path_data['commands']:
-                        # Apply offset to x coordinates
-                        if 'x' in cmd:
-                            cmd['x'] += x_offset
-                        if 'x1' in cmd:
-                            cmd['x1'] += x_offset
-                        if 'x2' in cmd:
-                            cmd['x2'] += x_offset
-                        
-                        # Apply offset to y coordinates
-                        if 'y' in cmd:
-                            cmd['y'] += y_offset
-                        if 'y1' in cmd:
-                            cmd['y1'] += y_offset
-                        if 'y2' in cmd:
-                            cmd['y2'] += y_offset
-    
-    with open(output_file, 'w') as f:
-        json.dump(data, f, indent=2)
-    
-    print(f"\n✅ Calibrated data saved to: {output_file}")
+
+    calibrate_regions(data, adjustments)
+
+    write_if_changed(output_file, json.dumps(data, indent=2))
+    log.info(f"\n✅ Calibrated data saved to: {output_file}")
+
+
+def load_profile(profile_file):
+    """
+    Read a calibration profile: {bone_id: {image index: {x, y, scale, rotation}}},
+    the same shape as OVERLAY_ADJUSTMENTS in coloredRegionsOverlay.js.
+    Offsets are in the region file's own coordinate units.
+    """
+    with open(profile_file, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    return {bone: {int(index): adjustment for index, adjustment in images.items()}
+            for bone, images in profile.items()}
+
+
+def calibrate_profile(profile_file, input_dir, output_dir, bones=None):
+    """Calibrate {bone}_colored_regions.json for every bone in the profile"""
+    profile = load_profile(profile_file)
+    os.makedirs(output_dir, exist_ok=True)
+    done = []
+    for bone, adjustments in sorted(profile.items()):
+        if bones and bone not in bones:
+            continue
+        input_file = os.path.join(input_dir, f"{bone}_colored_regions.json")
+        if not os.path.exists(input_file):
+            log.warning(f"⚠ No region file for {bone}: {input_file}")
+            continue
+        log.info(f"\n=== {bone} ===")
+        calibrate_file(input_file, os.path.join(output_dir, f"{bone}_colored_regions.json"), adjustments)
+        done.append(bone)
+    return done
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Calibrate colored region positioning.")
-    parser.add_argument("input_file", help="Path to input JSON file.")
-    parser.add_argument("output_file", help="Path to output JSON file.")
-    parser.add_argument("x_left", type=int, help="X value to adjust left image by. Positive moves right, negative moves left.")
-    parser.add_argument("y_left", type=int, help="Y value to adjust left image by. Positive moves down, negative moves up.")
-    parser.add_argument("x_right", type=int, help="X value to adjust right image by. Positive moves right, negative moves left.")
-    parser.add_argument("y_right", type=int, help="Y value to adjust right image by. Positive moves down, negative moves up.")
-    
+    parser.add_argument("input_file", nargs="?", help="Path to input JSON file.")
+    parser.add_argument("output_file", nargs="?", help="Path to output JSON file.")
+    parser.add_argument("x_left", type=int, nargs="?", default=0, help="X value to adjust left image by. Positive moves right, negative moves left.")
+    parser.add_argument("y_left", type=int, nargs="?", default=0, help="Y value to adjust left image by. Positive moves down, negative moves up.")
+    parser.add_argument("x_right", type=int, nargs="?", default=0, help="X value to adjust right image by. Positive moves right, negative moves left.")
+    parser.add_argument("y_right", type=int, nargs="?", default=0, help="Y value to adjust right image by. Positive moves down, negative moves up.")
+    parser.add_argument("--scale", type=float, nargs=2, default=(1.0, 1.0), metavar=("LEFT", "RIGHT"),
+                        help="Scale factor per image, about the image centre.")
+    parser.add_argument("--rotation", type=float, nargs=2, default=(0.0, 0.0), metavar=("LEFT", "RIGHT"),
+                        help="Rotation in degrees per image (clockwise on screen), about the image centre.")
+    parser.add_argument("--profile", help="Batch mode: JSON profile of {bone_id: {image index: {x, y, scale, rotation}}}.")
+    parser.add_argument("--input-dir", help="Batch mode: folder with {bone_id}_colored_regions.json files.")
+    parser.add_argument("--output-dir", help="Batch mode: folder to write calibrated files to.")
+    parser.add_argument("--bone", action="append", help="Batch mode: only calibrate these bone ids (repeatable).")
+
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors, not progress.")
+
     args = parser.parse_args()
-    
-    # Calibration offsets (adjust these values by trial and error)
-    # Positive x = move right, Negative x = move left
-    # Positive y = move down, Negative y = move up
-    offsets = {
-        0: (args.x_left, args.y_left),    # Left image
-        1: (args.x_right, args.y_right)    # Right image
-    }
-    
-    print("🎯 Colored Region Calibration Tool")
-    print("=" * 50)
-    print(f"Input file: {args.input_file}")
-    print(f"Output file: {args.output_file}")
-    print(f"\nOffsets to apply:")
-    for idx, (x, y) in offsets.items():
-        print(f"  Image {idx}: x={x:+d}, y={y:+d} EMUs")
-    
-    add_offset_to_regions(args.input_file, args.output_file, offsets)
-    
-    print("\n📋 Next steps:")
-    print("1. Hard reload the browser (Cmd+Shift+R)")
-    print("2. Select 'Bony Pelvis' boneset")
-    print("3. Check if regions are better aligned")
-    print("4. If not perfect, adjust the offset values and run again")
-    print("\nOffset guidelines:")
-    print("  - If regions are too LOW, use NEGATIVE y offset (move up)")
-    print("  - If regions are too HIGH, use POSITIVE y offset (move down)")
-    print("  - If regions are too LEFT, use POSITIVE x offset (move right)")
-    print("  - If regions are too RIGHT, use NEGATIVE x offset (move left)")
+    # --profile names the calibration profile here, so logging is set up without add_profile_arguments
+    configure_logging(args.quiet)
+
+    log.info("🎯 Colored Region Calibration Tool")
+    log.info("=" * 50)
+
+    if args.profile:
+        if not (args.input_dir and args.output_dir):
+            parser.error("--profile needs --input-dir and --output-dir")
+        bones = calibrate_profile(args.profile, args.input_dir, args.output_dir, args.bone)
+        log.info(f"\n✅ Calibrated {len(bones)} bone(s) into {args.output_dir}")
+    else:
+        if not (args.input_file and args.output_file):
+            parser.error("input_file and output_file are required without --profile")
+
+        # Calibration offsets
+        # Positive x = move right, Negative x = move left
+        # Positive y = move down, Negative y = move up
+        adjustments = {
+            0: {'x': args.x_left, 'y': args.y_left, 'scale': args.scale[0], 'rotation': args.rotation[0]},    # Left image
+            1: {'x': args.x_right, 'y': args.y_right, 'scale': args.scale[1], 'rotation': args.rotation[1]}   # Right image
+        }
+
+        log.info(f"Input file: {args.input_file}")
+        log.info(f"Output file: {args.output_file}")
+        log.info(f"\nAdjustments to apply:")
+        for idx, adj in adjustments.items():
+            log.info(f"  Image {idx}: x={adj['x']:+d}, y={adj['y']:+d}, scale={adj['scale']}, rotation={adj['rotation']}°")
+
+        calibrate_file(args.input_file, args.output_file, adjustments)
+
+        log.info("\n📋 Next steps:")
+        log.info("1. Hard reload the browser (Cmd+Shift+R)")
+        log.info("2. Select 'Bony Pelvis' boneset")
+        log.info("3. Check if regions are better aligned")
+        log.info("4. If not perfect, adjust the values and run again")
+        log.info("\nOffset guidelines:")
+        log.info("  - If regions are too LOW, use NEGATIVE y offset (move up)")
+        log.info("  - If regions are too HIGH, use POSITIVE y offset (move down)")
+        log.info("  - If regions are too LEFT, use POSITIVE x offset (move right)")
+        log.info("  - If regions are too RIGHT, use NEGATIVE x offset (move left)")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Single-file data pack for the boneset API.
+Bundles the published data tree (bonesets, bones, descriptions, text-label
+annotations and colored regions, i.e. the outputs of xml_boneset_reader,
+Extract_Bone_Descriptions, extract_text_labels and ColoredRegionsExtractor)
+into one versioned file, so the API can load one index at start-up and
+range-read or mmap just the entry a request needs instead of fetching one
+JSON file per bone.
+
+Layout (little-endian):
+
+    header   magic "DBPK", u16 version, u16 reserved, u32 index length
+    index    UTF-8 JSON: {"format", "version", "entries": {section: {key:
+             {"offset", "length", "sha256"}}}}, padded to 8 bytes
+    payload  compact UTF-8 JSON per entry, each starting on an 8-byte boundary
+
+Offsets are absolute from the start of the file. "version" is a digest of
+every entry, so it changes exactly when the pack's content does. A "combined"
+section holds the precomputed /combined-data response under the key "all".
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+try:
+    from .etag_manifest import ETAG_MANIFEST_FILENAME
+    from .manifest import write_if_changed
+    from .region_codec import read_regions
+    from .xml_boneset_reader import BONESET_INDEX_FILENAME
+except ImportError:
+    from etag_manifest import ETAG_MANIFEST_FILENAME
+    from manifest import write_if_changed
+    from region_codec import read_regions
+    from xml_boneset_reader import BONESET_INDEX_FILENAME
+
+MAGIC = b"DBPK"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<4sHHI")
+_ALIGN = 8
+
+# section -> (folder in the data tree, file name pattern capturing the key)
+SECTIONS = {
+    "boneset": ("boneset", r"(.+)\.json"),
+    "bone": ("bones", r"(.+)\.json"),
+    "description": ("descriptions", r"(.+)_description\.json"),
+    "annotation": ("annotations/text_label_annotations", r"(.+)_text_annotations\.json"),
+    "colored_regions": ("annotations/ColoredRegions", r"(.+)_colored_regions\.(?:json|bin)"),
+}
+
+
+class PackFormatError(ValueError):
+    """Raised for data that is not a data pack"""
+
+
+def _pad(n):
+    return -n % _ALIGN
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _load(path):
+    if path.endswith(".bin"):
+        return read_regions(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def collect_entries(data_dir):
+    """
+    {section: {key: obj}} from a data tree laid out like the data branch.
+    A boneset file holding a list (xml_boneset_reader's output) adds one entry
+    per boneset; files that do not match the section's naming are keyed by
+    their "id", or their file stem when they have none.
+    """
+    entries = {}
+    for section, (folder, pattern) in SECTIONS.items():
+        root = os.path.join(data_dir, folder)
+        if not os.path.isdir(root):
+            continue
+        found = entries.setdefault(section, {})
+        for name in sorted(os.listdir(root)):
+            path = os.path.join(root, name)
+            if name.startswith(".") or name in (ETAG_MANIFEST_FILENAME, BONESET_INDEX_FILENAME) \
+                    or not name.endswith((".json", ".bin")) or not os.path.isfile(path):
+                continue
+            if name.endswith(".bin") and section != "colored_regions":
+                continue
+            obj = _load(path)
+            items = obj if isinstance(obj, list) else [obj]
+            match = re.fullmatch(pattern, name)
+            for item in items:
+                if isinstance(obj, list) or not match:
+                    key = item.get("id") if isinstance(item, dict) else None
+                    key = key or os.path.splitext(name)[0]
+                else:
+                    key = match.group(1)
+                found[key] = item
+    entries["combined"] = {"all": combined_data(entries)}
+    return entries
+
+
+def combined_data(entries):
+    """The /combined-data response: bonesets, bones and sub-bones in boneset order"""
+    bonesets, bones, subbones = [], [], []
+    bone_entries = entries.get("bone", {})
+    for boneset in entries.get("boneset", {}).values():
+        bonesets.append({"id": boneset.get("id"), "name": boneset.get("name")})
+        for bone_id in boneset.get("bones") or []:
+            bone = bone_entries.get(bone_id)
+            if bone is None:
+                continue
+            bones.append({"id": bone.get("id"), "name": bone.get("name"), "boneset": boneset.get("id")})
+            for sub_id in bone.get("subBones") or []:
+                subbones.append({"id": sub_id, "name": sub_id.replace("_", " "), "bone": bone.get("id")})
+    return {"bonesets": bonesets, "bones": bones, "subbones": subbones}
+
+
+def encode_pack(entries):
+    """Bytes of a pack holding {section: {key: obj}}"""
+    payloads, index = [], {}
+    for section in sorted(entries):
+        for key in sorted(entries[section]):
+            payloads.append((section, key, _dumps(entries[section][key])))
+
+    version = hashlib.sha256()
+    for section, key, blob in payloads:
+        version.update(f"{section}/{key}\0".encode("utf-8"))
+        version.update(hashlib.sha256(blob).digest())
+
+    # the index size depends on the offsets it records, so lay out until it settles
+    index_len = 0
+    while True:
+        offset = _HEADER.size + index_len + _pad(_HEADER.size + index_len)
+        index = {}
+        for section, key, blob in payloads:
+            index.setdefault(section, {})[key] = {"offset": offset, "length": len(blob),
+                                                  "sha256": hashlib.sha256(blob).hexdigest()}
+            offset += len(blob) + _pad(len(blob))
+        index_bytes = _dumps({"format": FORMAT_VERSION, "version": version.hexdigest()[:16], "entries": index})
+        if len(index_bytes) == index_len:
+            break
+        index_len = len(index_bytes)
+
+    out = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(index_bytes)))
+    out += index_bytes
+    out += b"\0" * _pad(len(out))
+    for _, _, blob in payloads:
+        out += blob
+        out += b"\0" * _pad(len(blob))
+    return bytes(out)
+
+
+def build_pack(data_dir, output_file):
+    """Bundle data_dir into output_file; returns the pack's index"""
+    data = encode_pack(collect_entries(data_dir))
+    write_if_changed(output_file, data)
+    return DataPack(data).index
+
+
+class DataPack:
+    """
+    Read access to a pack file (mmapped) or bytes. Only the index is parsed up
+    front; entries are decoded on demand.
+    """
+
+    def __init__(self, source):
+        self._file = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self._buf = memoryview(source)
+        else:
+            self._file = open(source, "rb")
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._buf) < _HEADER.size:
+            raise PackFormatError("file too short for a data pack header")
+        magic, version, _, index_len = _HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise PackFormatError("not a data pack (bad magic)")
+        if version != FORMAT_VERSION:
+            raise PackFormatError(f"unsupported data pack version {version}")
+        self.index = json.loads(bytes(self._buf[_HEADER.size:_HEADER.size + index_len]).decode("utf-8"))
+        self.version = self.index["version"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._buf.close()
+            self._file.close()
+            self._file = None
+
+    def sections(self):
+        return sorted(self.index["entries"])
+
+    def keys(self, section):
+        return sorted(self.index["entries"].get(section, {}))
+
+    def raw(self, section, key):
+        """The entry's JSON bytes, or None if the pack has no such entry"""
+        entry = self.index["entries"].get(section, {}).get(key)
+        if entry is None:
+            return None
+        return bytes(self._buf[entry["offset"]:entry["offset"] + entry["length"]])
+
+    def get(self, section, key, default=None):
+        raw = self.raw(section, key)
+        return default if raw is None else json.loads(raw.decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bundle the boneset data tree into a single indexed data pack.")
+    parser.add_argument("data_dir", nargs="?",
+                        help="Data tree laid out like the data branch (boneset/, bones/, descriptions/, annotations/...).")
+    parser.add_argument("pack_file", help="Pack file to write, or to read with --list/--get.")
+    parser.add_argument("--list", action="store_true", help="List the sections and entries of an existing pack.")
+    parser.add_argument("--get", nargs=2, metavar=("SECTION", "KEY"), help="Print one entry of an existing pack.")
+    args = parser.parse_args()
+
+    if args.list or args.get:
+        with DataPack(args.pack_file) as pack:
+            if args.get:
+                value = pack.get(*args.get)
+                if value is None:
+                    sys.exit(f"No entry {args.get[0]}/{args.get[1]} in {args.pack_file}")
+                print(json.dumps(value, indent=2, ensure_ascii=False))
+            else:
+                print(f"Pack version {pack.version}")
+                for section in pack.sections():
+                    print(f"  {section}: {', '.join(pack.keys(section))}")
+        return
+    if not args.data_dir:
+        parser.error("data_dir is required to build a pack")
+
+    index = build_pack(args.data_dir, args.pack_file)
+    counts = {section: len(keys) for section, keys in index["entries"].items()}
+    print(f"✓ Wrote {args.pack_file} (version {index['version']}): {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Strong-ETag manifest for published output folders.
+The JSON writers record the files they own in OUTPUT_DIR/etags.json:
+
+    {"algorithm": "sha256", "format": 1,
+     "files": {"slide2.json": {"sha256": "<hex digest>", "size": 1234}, ...}}
+
+Outputs are canonical (manifest.canonical_json) and replaced atomically, so a
+file's SHA-256 changes exactly when its content does. A server can send
+'"<sha256>"' as a strong ETag and answer If-None-Match with 304, and a client
+can cache a file forever under its hash, fetching it again only when the
+manifest lists a new one. Several writers may share a folder; each updates
+only its own entries.
+"""
+
+import hashlib
+import json
+import os
+
+try:
+    from .manifest import write_json
+except ImportError:
+    from manifest import write_json
+
+ETAG_MANIFEST_FILENAME = "etags.json"
+ETAG_MANIFEST_FORMAT = 1
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def etag(sha256):
+    """The strong ETag header value for a manifest entry's digest"""
+    return f'"{sha256}"'
+
+
+def load_etag_manifest(output_dir):
+    """{file name: {"sha256", "size"}} from output_dir/etags.json, empty when missing or unreadable"""
+    try:
+        with open(os.path.join(output_dir, ETAG_MANIFEST_FILENAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("format") != ETAG_MANIFEST_FORMAT:
+        return {}
+    return data.get("files", {})
+
+
+def update_etag_manifest(output_dir, names, unchanged=()):
+    """
+    Hash the named files (relative to output_dir) into output_dir/etags.json.
+    Entries already listed are re-hashed too, and dropped once their file is
+    gone, so the manifest always matches the bytes on disk. Files in
+    unchanged, which the caller knows it did not rewrite (outputs of slides
+    the SlideManifest skipped), keep their recorded digest while their size
+    matches. Returns the files mapping.
+    """
+    recorded = load_etag_manifest(output_dir)
+    unchanged = {name.replace(os.sep, "/") for name in unchanged}
+    listed = set(recorded) | unchanged | {name.replace(os.sep, "/") for name in names}
+    listed.discard(ETAG_MANIFEST_FILENAME)
+    files = {}
+    for name in sorted(listed):
+        path = os.path.join(output_dir, name)
+        if not os.path.isfile(path):
+            continue
+        size = os.path.getsize(path)
+        entry = recorded.get(name)
+        if name in unchanged and entry and entry.get("size") == size and entry.get("sha256"):
+            files[name] = entry
+        else:
+            files[name] = {"sha256": file_sha256(path), "size": size}
+    os.makedirs(output_dir or ".", exist_ok=True)
+    write_json(os.path.join(output_dir, ETAG_MANIFEST_FILENAME),
+               {"format": ETAG_MANIFEST_FORMAT, "algorithm": "sha256", "files": files}, indent=1)
+    return files
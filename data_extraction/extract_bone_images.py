@@ -4,11 +4,33 @@ Extracts images from slides and names them based on the bone featured on that sl
 Each slide focuses on a specific bone (Ilium, Ischium, Pubis, or Bony Pelvis overview).
 """
 import os
-import sys
-import xml.etree.ElementTree as ET
-import shutil
 import re
 import argparse
+from functools import partial
+
+try:
+    from . import profiling
+    from .bony_pelvis_rotation import picture_frame
+    from .image_derivatives import add_derivative_arguments, build_derivatives, parse_formats, parse_widths
+    from .image_tiles import add_tile_arguments, build_tiles
+    from .manifest import SlideManifest, add_force_argument, code_version
+    from .media_store import MediaStore, add_media_store_arguments, prune_media_store
+    from .parallel import add_jobs_argument, map_slides, resolve_jobs
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import MEDIA_DIR, SLIDES_DIR, as_slide_deck, as_slide_document
+except ImportError:
+    import profiling
+    from bony_pelvis_rotation import picture_frame
+    from image_derivatives import add_derivative_arguments, build_derivatives, parse_formats, parse_widths
+    from image_tiles import add_tile_arguments, build_tiles
+    from manifest import SlideManifest, add_force_argument, code_version
+    from media_store import MediaStore, add_media_store_arguments, prune_media_store
+    from parallel import add_jobs_argument, map_slides, resolve_jobs
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import MEDIA_DIR, SLIDES_DIR, as_slide_deck, as_slide_document
+
+# sibling modules whose code shapes the output, for the manifest's code version
+_HELPER_MODULES = ("media_store.py", "bony_pelvis_rotation.py", "image_derivatives.py", "image_tiles.py")
 
 def sanitize_filename(name):
     """Remove or replace characters that aren't safe for filenames."""
@@ -24,8 +46,7 @@ def get_slide_bone_name(slide_path):
     
     Returns the bone name (e.g., "Ilium", "Ischium", "Pubis", "Bony Pelvis")
     """
-    tree = ET.parse(slide_path)
-    root = tree.getroot()
+    doc = as_slide_document(slide_path)
     ns = {
         'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
         'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
@@ -40,12 +61,12 @@ def get_slide_bone_name(slide_path):
     
     candidate_bones = []
     
-    for shape in root.findall('.//p:sp', ns):
+    for shape in doc.shapes:
         shape_text = []
         has_bullets = False
         
         # Collect all text in this shape
-        for text_elem in shape.findall('.//a:t', ns):
+        for text_elem in doc.text_elements(shape):
             if text_elem.text:
                 shape_text.append(text_elem.text.strip())
         
@@ -84,23 +105,17 @@ def get_slide_bone_name(slide_path):
     # Fallback: if no description found, return "Bony Pelvis"
     return "Bony Pelvis"
 
-def get_images_from_rels(rels_path):
+def get_images_from_rels(rels):
     """
-    Parse .rels file line by line, looking for image relationships only.
+    Filter a slide's parsed relationships (SlideDocument.rels) down to images only.
     Returns dict mapping rId -> image filename
     """
-    tree = ET.parse(rels_path)
-    root = tree.getroot()
     images = {}
     
-    # Read line by line (element by element)
-    for rel in root.findall('.//{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'):
-        rel_type = rel.get('Type', '')
+    for rid, rel in rels.items():
         # Only process image relationships - ignore charts, themes, layouts, etc.
-        if '/image' in rel_type:
-            rid = rel.get('Id')
-            target = rel.get('Target')
-            images[rid] = target
+        if '/image' in rel['Type']:
+            images[rid] = rel['Target']
     
     return images
 
@@ -109,168 +124,279 @@ def get_image_rids_from_slide(slide_path):
     Find all rIds that reference images in the slide XML.
     Returns a list of rIds in the order they appear (first = lateral, second = medial).
     """
-    tree = ET.parse(slide_path)
-    root = tree.getroot()
-    ns = {
-        'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
-        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-        'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-    }
+    doc = as_slide_document(slide_path)
     
     image_rids = []
     
     # Look for image references (blip elements contain image rIds)
-    for blip in root.findall('.//a:blip', ns):
-        rid = blip.get('{%s}embed' % ns['r'])
-        if rid and rid not in image_rids:
+    for _, rid in doc.blips:
+        if rid not in image_rids:
             image_rids.append(rid)
     
     return image_rids
 
-def process_slide(slide_num, ppt_dir, output_dir):
+def plan_slide_images(doc, slide_num, bone_name):
+    """
+    (rId, media target, output filename) for each image on the slide, in the
+    order they appear (first = lateral, second = medial).
+    """
+    # Get image rIds from slide (in order: lateral, then medial)
+    image_rids = get_image_rids_from_slide(doc)
+    
+    # Get image files from .rels (only image relationships)
+    rid_to_image = get_images_from_rels(doc.rels)
+    
+    # Filter to only image rIds that exist in both places
+    actual_images = [(rid, rid_to_image[rid]) for rid in image_rids if rid in rid_to_image]
+    
+    # Sanitize bone name for filename
+    clean_bone_name = sanitize_filename(bone_name)
+    
+    views = ['lateral', 'medial', 'view3', 'view4']  # Handle up to 4 images per slide
+    planned = []
+    for idx, (rid, target) in enumerate(actual_images):
+        # Determine view name
+        view = views[idx] if idx < len(views) else f"view{idx+1}"
+        
+        # Get file extension
+        ext = os.path.splitext(os.path.basename(target))[1]
+        
+        # Create destination filename: slide{num}_{bone_name}_{view}.{ext}
+        planned.append((rid, target, f"slide{slide_num}_{clean_bone_name}_{view}{ext}"))
+    return planned
+
+def process_slide(slide_num, ppt_dir, output_dir, store=None):
     """
     Process one slide: extract images and name based on the bone featured on that slide.
     Each slide shows a specific bone with lateral and medial views.
+    ppt_dir may be a path or an already-open SlideDeck; images are written
+    through store (a MediaStore), or a temporary one for this slide.
+    Returns the output filenames for the slide.
     """
-    print(f"\n{'='*60}")
-    print(f"Processing Slide {slide_num}...")
-    print('='*60)
+    with profiling.stage("slide", slide=slide_num):
+        return _process_slide(slide_num, ppt_dir, output_dir, store)
+
+def _process_slide(slide_num, ppt_dir, output_dir, store):
+    log.info(f"\n{'='*60}")
+    log.info(f"Processing Slide {slide_num}...")
+    log.info('='*60)
 
-    slides_dir = f"{ppt_dir}/ppt/slides"
-    rels_dir = f"{slides_dir}/_rels"
-    media_dir = f"{ppt_dir}/ppt/media"
+    deck = as_slide_deck(ppt_dir)
 
-    print(slides_dir)
-    print(rels_dir)
-    print(media_dir)
+    log.debug(deck.path(SLIDES_DIR))
+    log.debug(deck.path(f"{SLIDES_DIR}/_rels"))
+    log.debug(deck.path(MEDIA_DIR))
     
-    slide_path = f"{slides_dir}/slide{slide_num}.xml"
-    rels_path = f"{rels_dir}/slide{slide_num}.xml.rels"
+    # Check if parts exist
+    if not deck.has_slide(slide_num):
+        log.warning(f"⚠ Slide file not found: {deck.path(deck.slide_part(slide_num))}")
+        return []
+    if not deck.has_rels(slide_num):
+        log.warning(f"⚠ Rels file not found: {deck.path(deck.rels_part(slide_num))}")
+        return []
     
-    # Check if files exist
-    if not os.path.exists(slide_path):
-        print(f"⚠ Slide file not found: {slide_path}")
-        return
-    if not os.path.exists(rels_path):
-        print(f"⚠ Rels file not found: {rels_path}")
-        return
+    doc = deck.slide(slide_num)
     
-    # Get the bone name this slide is about
-    bone_name = get_slide_bone_name(slide_path)
+    with profiling.stage("shape_scan"):
+        # Get the bone name this slide is about
+        bone_name = get_slide_bone_name(doc)
+        actual_images = plan_slide_images(doc, slide_num, bone_name) if bone_name else []
     
     if not bone_name:
-        print(f"⚠ Could not identify bone name for slide {slide_num}")
-        print(f"  Skipping this slide...")
-        return
-    
-    print(f"Identified bone: {bone_name}")
-    
-    # Get image rIds from slide (in order: lateral, then medial)
-    image_rids = get_image_rids_from_slide(slide_path)
+        log.warning(f"⚠ Could not identify bone name for slide {slide_num}")
+        log.warning(f"  Skipping this slide...")
+        return []
     
-    # Get image files from .rels (only image relationships)
-    rid_to_image = get_images_from_rels(rels_path)
-    
-    # Filter to only image rIds that exist in both places
-    actual_images = [(rid, rid_to_image[rid]) for rid in image_rids if rid in rid_to_image]
+    log.info(f"Identified bone: {bone_name}")
     
     if not actual_images:
-        print(f"⚠ No images found on slide {slide_num}")
-        return
+        log.warning(f"⚠ No images found on slide {slide_num}")
+        return []
     
-    print(f"Found {len(actual_images)} image(s) to extract")
-    
-    # Sanitize bone name for filename
-    clean_bone_name = sanitize_filename(bone_name)
+    log.info(f"Found {len(actual_images)} image(s) to extract")
+    profiling.count("images", len(actual_images))
     
     # Extract and rename images
-    views = ['lateral', 'medial', 'view3', 'view4']  # Handle up to 4 images per slide
+    outputs, writes = [], []
+    own_store = store is None
+    if own_store:
+        store = MediaStore(output_dir)
     
-    for idx, (rid, target) in enumerate(actual_images):
+    for rid, target, dest_filename in actual_images:
         image_file = os.path.basename(target)
-        source = f"{media_dir}/{image_file}"
+        source = deck.media_part(target)
         
         # Check if source exists
-        if not os.path.exists(source):
-            print(f"  ⚠ Source image not found: {source}")
+        if not deck.has_part(source):
+            log.warning(f"  ⚠ Source image not found: {deck.path(source)}")
             continue
         
-        # Determine view name
-        view = views[idx] if idx < len(views) else f"view{idx+1}"
-        
-        # Get file extension
-        ext = os.path.splitext(image_file)[1]
-        
-        # Create destination filename: slide{num}_{bone_name}_{view}.{ext}
-        dest_filename = f"slide{slide_num}_{clean_bone_name}_{view}{ext}"
         dest = f"{output_dir}/{dest_filename}"
         
-        # Copy the image
-        shutil.copy2(source, dest)
-        print(f"  ✓ {image_file} -> {dest_filename}")
+        # Write the image on the store's thread pool: each unique blob once,
+        # per-slide names linked to it, identical destinations left untouched
+        outputs.append(dest_filename)
+        writes.append(store.place(deck, source, dest, image_file))
+    
+    try:
+        for write in writes:
+            write.result()
+    finally:
+        if own_store:
+            store.close()
     
     # Confirm completion after each slide
-    print(f"\n✓ Slide {slide_num} complete ({len(actual_images)} images extracted)")
+    log.info(f"\n✓ Slide {slide_num} complete ({len(actual_images)} images extracted)")
+    return outputs
 
-def main():
-    """Main function to process slides - allows single slide or all slides."""
+def image_frames(deck, slide_nums):
+    """
+    Picture frame of every extracted image, keyed by output filename:
+    {slide, media, frame}, used to register tiles to slide coordinates.
+    """
+    frames = {}
+    for slide_num in slide_nums:
+        if not (deck.has_slide(slide_num) and deck.has_rels(slide_num)):
+            continue
+        doc = deck.slide(slide_num)
+        bone_name = get_slide_bone_name(doc)
+        if not bone_name:
+            continue
+        by_rid = {}
+        for pic in doc.pictures:
+            frame = picture_frame(pic)
+            if frame is not None and frame["embed"]:
+                by_rid.setdefault(frame["embed"], frame)
+        for rid, target, dest_filename in plan_slide_images(doc, slide_num, bone_name):
+            if rid in by_rid:
+                frames[dest_filename] = {"slide": slide_num, "media": target, "frame": by_rid[rid]}
+    return frames
+
+class _ExportContext:
+    """The deck and media store shared by every slide processed in one process"""
+
+    def __init__(self, source, output_dir, store_mode, threads):
+        self.deck = as_slide_deck(source)
+        self.store = MediaStore(output_dir, store_mode, threads)
+
+
+def _process_slide_task(context, slide_num, output_dir):
+    """Worker entry point for map_slides"""
+    return process_slide(slide_num, context.deck, output_dir, store=context.store)
+
+def build_parser():
+    """The command-line parser, also used by the build orchestrator (build.py)"""
     parser = argparse.ArgumentParser(description="Extract bone images from PowerPoint slides.")
-    parser.add_argument("ppt_dir", help="Path to the folder containing the PowerPoint data.")
+    parser.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
     parser.add_argument("output_dir", help="Path to the output directory.")
     parser.add_argument("--slide-number", type=int, help="Specific slide number to process (optional, processes all if not specified).")
+    add_jobs_argument(parser)
+    add_force_argument(parser)
+    add_media_store_arguments(parser)
+    parser.add_argument("--derivatives", action="store_true",
+                        help="Also write resized/modern-format copies and an image manifest to output_dir/derivatives.")
+    add_derivative_arguments(parser)
+    parser.add_argument("--tiles", action="store_true",
+                        help="Also write a DeepZoom tile pyramid and descriptor JSON per image to output_dir/tiles.")
+    add_tile_arguments(parser)
+    add_profile_arguments(parser)
+    return parser
+
+def main():
+    """Main function to process slides - allows single slide or all slides."""
+    args = build_parser().parse_args()
     
-    args = parser.parse_args()
-    
-    ppt_dir = args.ppt_dir
+    with profiled(args, "bone_images"):
+        run(args)
+
+def run(args):
+    """Extract images for the parsed command-line arguments; args.ppt_dir may be an open SlideDeck"""
+    deck = as_slide_deck(args.ppt_dir)
     output_dir = args.output_dir
     
     os.makedirs(output_dir, exist_ok=True)
     
-    print("\n" + "="*60)
-    print("BONE IMAGE EXTRACTION - Sprint 3")
-    print("="*60)
-    print("Extracts images from PowerPoint slides and names them")
-    print("based on the bone featured on each slide.")
-    print("="*60 + "\n")
+    log.info("\n" + "="*60)
+    log.info("BONE IMAGE EXTRACTION - Sprint 3")
+    log.info("="*60)
+    log.info("Extracts images from PowerPoint slides and names them")
+    log.info("based on the bone featured on each slide.")
+    log.info("="*60 + "\n")
     
     # Allow user to specify which slide to process
     if args.slide_number is not None:
         slide_num = args.slide_number
         if slide_num < 2:
-            print("Error: Slide number must be 2 or greater (slide 1 is title slide)")
+            log.error("Error: Slide number must be 2 or greater (slide 1 is title slide)")
             return
         slide_nums = [slide_num]
-        print(f"Mode: Single slide processing")
-        print(f"Target: Slide {slide_num}\n")
+        log.info(f"Mode: Single slide processing")
+        log.info(f"Target: Slide {slide_num}\n")
     else:
         # Default: get all slide numbers (starting from slide 2)
-        try:
-            slides_dir = f"{ppt_dir}/ppt/slides"
-            slide_files = [f for f in os.listdir(slides_dir) if f.startswith('slide') and f.endswith('.xml')]
-            slide_nums = sorted([int(f.replace('slide', '').replace('.xml', '')) for f in slide_files if f[5:-4].isdigit()])
-            slide_nums = [n for n in slide_nums if n >= 2]
-            
-            if not slide_nums:
-                print("Error: No slide files found!")
-                return
-                
-            print(f"Mode: Batch processing")
-            print(f"Found {len(slide_nums)} slides to process: {slide_nums}\n")
-        except FileNotFoundError:
-            print(f"Error: Slides directory not found: {ppt_dir}")
-            print("Make sure the slides directory exists")
+        if not deck.exists():
+            log.error(f"Error: Slides directory not found: {deck.location}")
+            log.error("Make sure the slides directory exists")
             return
-    
-    # Process each slide sequentially
-    for num in slide_nums:
-        process_slide(num, ppt_dir, output_dir)
-    
-    print("\n" + "="*60)
-    print("EXTRACTION COMPLETE!")
-    print("="*60)
-    print(f"Output directory: {output_dir}")
-    print(f"Total slides processed: {len(slide_nums)}")
-    print("="*60 + "\n")
+        slide_nums = [n for n in deck.slide_numbers() if n >= 2]
+        
+        if not slide_nums:
+            log.error("Error: No slide files found!")
+            return
+            
+        log.info(f"Mode: Batch processing")
+        log.info(f"Found {len(slide_nums)} slides to process: {slide_nums}\n")
+    
+    # Only slides whose inputs differ from the manifest are re-extracted
+    manifest = SlideManifest(output_dir, "bone_images", code_version(__file__, *_HELPER_MODULES),
+                             options={'media_store': args.media_store}, enabled=not args.force)
+    fingerprints = {n: manifest.fingerprint(deck, n) for n in slide_nums if deck.has_slide(n)}
+    changed = [n for n in slide_nums
+               if n not in fingerprints or not manifest.is_unchanged(n, fingerprints[n], output_dir)]
+    if len(changed) != len(slide_nums):
+        log.info(f"Skipping {len(slide_nums) - len(changed)} unchanged slides")
+    
+    # Process slides, in parallel worker processes when --jobs > 1; each
+    # worker builds its own context, so the parent only needs one in-process
+    in_process = min(resolve_jobs(args.jobs), len(changed)) <= 1
+    context = _ExportContext(deck, output_dir, args.media_store, args.copy_threads) if in_process else None
+    try:
+        outputs = map_slides(partial(_process_slide_task, output_dir=output_dir), changed, context,
+                             jobs=args.jobs, setup=_ExportContext,
+                             setup_args=(deck.portable_source(), output_dir, args.media_store, args.copy_threads))
+    finally:
+        if context is not None:
+            context.store.close()
+    for num, names in zip(changed, outputs):
+        if num in fingerprints:
+            manifest.record(num, fingerprints[num], names)
+    # a single-slide run leaves the other slides' entries alone
+    removed = manifest.remove_stale(output_dir, slide_nums if args.slide_number is None else None)
+    manifest.save()
+    if removed:
+        log.info(f"Removed {len(removed)} images of slides that no longer produce them")
+    # blobs whose last per-slide link was replaced or removed above
+    blobs, freed = prune_media_store(output_dir)
+    if blobs:
+        log.info(f"Pruned {blobs} unused media blobs ({freed / 1e6:.2f} MB)")
+    
+    if args.derivatives:
+        log.info("\nGenerating responsive derivatives...")
+        build_derivatives(output_dir, widths=parse_widths(args.derivative_widths),
+                          formats=parse_formats(args.derivative_formats), quality=args.derivative_quality,
+                          jobs=args.jobs, force=args.force)
+    
+    if args.tiles:
+        log.info("\nGenerating tile pyramids...")
+        build_tiles(output_dir, tile_size=args.tile_size, overlap=args.tile_overlap, fmt=args.tile_format,
+                    frames=image_frames(deck, slide_nums), jobs=args.jobs, force=args.force)
+    
+    log.info("\n" + "="*60)
+    log.info("EXTRACTION COMPLETE!")
+    log.info("="*60)
+    log.info(f"Output directory: {output_dir}")
+    log.info(f"Total slides processed: {len(slide_nums)}")
+    log.info("="*60 + "\n")
 
 if __name__ == "__main__":
     main()
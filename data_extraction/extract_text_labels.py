@@ -1,19 +1,35 @@
-import argparse, json, os, re, math
-import xml.etree.ElementTree as ET
-from pathlib import Path
-
-NS = {
-    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
-    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
-    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
-}
-PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
-R_ID_KEY = "{%s}id" % NS["r"]
+import argparse, os, re, math
+from functools import partial
+
+try:
+    from . import profiling
+    from .etag_manifest import update_etag_manifest
+    from .manifest import SlideManifest, add_force_argument, code_version, write_json
+    from .parallel import add_jobs_argument, map_slides
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import R_ID_KEY, SlideDeck, as_slide_deck
+    from .xml_backend import Query
+except ImportError:
+    import profiling
+    from etag_manifest import update_etag_manifest
+    from manifest import SlideManifest, add_force_argument, code_version, write_json
+    from parallel import add_jobs_argument, map_slides
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import R_ID_KEY, SlideDeck, as_slide_deck
+    from xml_backend import Query
+
+# sibling modules whose code shapes the output, for the manifest's code version
+_HELPER_MODULES = ("etag_manifest.py",)
+# element lookups, compiled once (as XPath objects when lxml is available)
+_OFF, _EXT, _XFRM = Query("a:off"), Query("a:ext"), Query(".//a:xfrm")
+_SRGB, _SCHEME, _SOLID_FILL = Query("a:srgbClr"), Query("a:schemeClr"), Query("a:solidFill")
+_ALL_RPR, _LN, _HEAD_END = Query(".//a:rPr"), Query(".//a:ln"), Query("a:headEnd")
+_CNVPR, _HLINK, _TX_BODY = Query("./p:nvSpPr/p:cNvPr"), Query("a:hlinkClick"), Query(".//p:txBody")
 
 # --------------------------- helpers ---------------------------
 
 def emu_box(xfrm):
-    off = xfrm.find("a:off", NS); ext = xfrm.find("a:ext", NS)
+    off = _OFF.first(xfrm); ext = _EXT.first(xfrm)
     x = float(off.get("x")); y = float(off.get("y"))
     w = float(ext.get("cx")); h = float(ext.get("cy"))
     rot_emu = float(xfrm.get("rot") or 0.0)
@@ -21,30 +37,20 @@ def emu_box(xfrm):
 
 def is_white_color(solid_fill):
     if solid_fill is None: return False
-    srgb = solid_fill.find("a:srgbClr", NS)
+    srgb = _SRGB.first(solid_fill)
     if srgb is not None: return srgb.get("val","").upper() == "FFFFFF"
-    scheme = solid_fill.find("a:schemeClr", NS)
+    scheme = _SCHEME.first(solid_fill)
     return scheme is not None and scheme.get("val") in ("lt1","bg1")
 
 def text_is_white(sp):
-    for rpr in sp.findall(".//a:rPr", NS):
-        if is_white_color(rpr.find("a:solidFill", NS)):
+    for rpr in _ALL_RPR.all(sp):
+        if is_white_color(_SOLID_FILL.first(rpr)):
             return True
     return False
 
 def line_is_white(shape):
-    ln = shape.find(".//a:ln", NS)
-    return is_white_color(ln.find("a:solidFill", NS)) if ln is not None else False
-
-def build_rels_map(rels_path):
-    m = {}
-    if not os.path.exists(rels_path): return m
-    root = ET.parse(rels_path).getroot()
-    for rel in root.findall(f".//{{{PKG_REL_NS}}}Relationship"):
-        rid = rel.attrib.get("Id")
-        if rid:
-            m[rid] = {"Type": rel.attrib.get("Type",""), "Target": rel.attrib.get("Target","")}
-    return m
+    ln = _LN.first(shape)
+    return is_white_color(_SOLID_FILL.first(ln)) if ln is not None else False
 
 def _link_payload(rid, rels_map):
     info = {"rId": rid, "target": (rels_map.get(rid) or {}).get("Target","")}
@@ -53,13 +59,13 @@ def _link_payload(rid, rels_map):
     return info
 
 def resolve_hyperlink_for_shape(shape_el, rels_map):
-    cNvPr = shape_el.find("./p:nvSpPr/p:cNvPr", NS)
+    cNvPr = _CNVPR.first(shape_el)
     if cNvPr is not None:
-        hl = cNvPr.find("a:hlinkClick", NS)
+        hl = _HLINK.first(cNvPr)
         if hl is not None and R_ID_KEY in hl.attrib:
             return _link_payload(hl.attrib[R_ID_KEY], rels_map)
-    for rPr in shape_el.findall(".//a:rPr", NS):
-        hl = rPr.find("a:hlinkClick", NS)
+    for rPr in _ALL_RPR.all(shape_el):
+        hl = _HLINK.first(rPr)
         if hl is not None and R_ID_KEY in hl.attrib:
             return _link_payload(hl.attrib[R_ID_KEY], rels_map)
     return None
@@ -68,9 +74,6 @@ def rect_contains_with_padding(rect, x, y, pad):
     return (rect["x"]-pad <= x <= rect["x"]+rect["width"]+pad and
             rect["y"]-pad <= y <= rect["y"]+rect["height"]+pad)
 
-def snap_point(pt, snap):
-    return (round(pt[0]/snap)*snap, round(pt[1]/snap)*snap)
-
 def rot_cos_sin(emu):
     # 60000 EMUs = 1 degree
     ang = (emu/60000.0) * math.pi/180.0
@@ -90,27 +93,26 @@ def endpoints_from_xfrm(xfrm):
 
 # ---------------------- extraction: texts ----------------------
 
-def extract_text_boxes(root, rels_map, bone_set="Bony Pelvis"):
+def extract_text_boxes(doc, bone_set="Bony Pelvis"):
     out = []
-    for sp in root.findall(".//p:sp", NS):
-        if sp.find(".//p:txBody", NS) is None: 
+    for sp in doc.shapes:
+        if _TX_BODY.first(sp) is None: 
             continue
         if not text_is_white(sp): 
             continue
-        xfrm = sp.find(".//a:xfrm", NS)
+        xfrm = _XFRM.first(sp)
         if xfrm is None: 
             continue
-        text = "".join(t.text or "" for t in sp.findall(".//a:t", NS)).strip()
+        text = "".join(t.text or "" for t in doc.text_elements(sp)).strip()
         if not text: 
             continue
-        hyperlink = resolve_hyperlink_for_shape(sp, rels_map)
-        cNv = sp.find("./p:nvSpPr/p:cNvPr", NS)
+        hyperlink = resolve_hyperlink_for_shape(sp, doc.rels)
         out.append({
             "annotation_id": f"annot_{len(out)+1}",
             "bone_name": bone_set,
             "subbone_name": text,
             "text_content": text,
-            "text_box": emu_box(xfrm) | {"shape_id": cNv.get("id") if cNv is not None else None},
+            "text_box": emu_box(xfrm) | {"shape_id": doc.shape_id(sp)},
             "has_hyperlink": hyperlink is not None,
             "hyperlink": hyperlink or {}
         })
@@ -118,149 +120,250 @@ def extract_text_boxes(root, rels_map, bone_set="Bony Pelvis"):
 
 # ---------------------- extraction: lines ----------------------
 
-def _collect_line_shape(shp, kind, lines):
+def _collect_line_shape(doc, shp, kind, lines):
     if not line_is_white(shp):
         return
-    xfrm = shp.find(".//a:xfrm", NS)
+    xfrm = _XFRM.first(shp)
     if xfrm is None:
         return
     p1, p2, box = endpoints_from_xfrm(xfrm)
-    ln = shp.find(".//a:ln", NS)
+    ln = _LN.first(shp)
     width = int(ln.get("w") or 0) if ln is not None else 0
-    head = ln.find("a:headEnd", NS) if ln is not None else None
-    cNv = shp.find(f"./p:nv{'CxnSp' if kind=='connector' else 'Sp'}Pr/p:cNvPr", NS)
+    head = _HEAD_END.first(ln) if ln is not None else None
     lines.append({
         "line_id": f"line_{len(lines)+1}",
         "kind": kind,
         "start_point": {"x": p1[0], "y": p1[1]},
         "end_point":   {"x": p2[0], "y": p2[1]},
         "style": {"width": width, "arrow_head": (head.get("type") if head is not None else "none")},
-        "shape_id": cNv.get("id") if cNv is not None else None,
+        "shape_id": doc.shape_id(shp),
         "bbox": box
     })
 
-def extract_lines(root):
+def extract_lines(doc):
     lines = []
-    for shp in root.findall(".//p:cxnSp", NS):   # connectors
-        _collect_line_shape(shp, "connector", lines)
+    for shp in doc.connectors:   # connectors
+        _collect_line_shape(doc, shp, "connector", lines)
     # simple line shapes (p:sp with no text, but with stroke)
-    for shp in root.findall(".//p:sp", NS):
-        if shp.find(".//p:txBody", NS) is None and shp.find(".//a:ln", NS) is not None:
-            _collect_line_shape(shp, "line", lines)
+    for shp in doc.shapes:
+        if _TX_BODY.first(shp) is None and _LN.first(shp) is not None:
+            _collect_line_shape(doc, shp, "line", lines)
     return lines
 
 # -------------------- graph + connection logic --------------------
 
+class UnionFind:
+    def __init__(self, n=0):
+        self.parent = list(range(n))
+    def add(self):
+        self.parent.append(len(self.parent)); return len(self.parent) - 1
+    def find(self, i):
+        p = self.parent
+        while p[i] != i:
+            p[i] = p[p[i]]; i = p[i]
+        return i
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb: self.parent[max(ra, rb)] = min(ra, rb)
+
+class GridIndex:
+    """Uniform grid over points; rect queries only touch overlapping cells."""
+    def __init__(self, cell):
+        self.cell = float(cell) if cell and cell > 0 else 1.0
+        self.cells = {}
+    def _key(self, x, y):
+        return (math.floor(x / self.cell), math.floor(y / self.cell))
+    def insert(self, idx, x, y):
+        self.cells.setdefault(self._key(x, y), []).append(idx)
+    def query_rect(self, x0, y0, x1, y1):
+        (cx0, cy0), (cx1, cy1) = self._key(x0, y0), self._key(x1, y1)
+        if (cx1-cx0+1) * (cy1-cy0+1) > len(self.cells):
+            # big query vs sparse grid: walk occupied cells instead of the range
+            keys = [k for k in self.cells if cx0 <= k[0] <= cx1 and cy0 <= k[1] <= cy1]
+        else:
+            keys = [(i, j) for i in range(cx0, cx1+1) for j in range(cy0, cy1+1)]
+        out = []
+        for k in keys:
+            out.extend(self.cells.get(k, ()))
+        return out
+
+class LineGraph:
+    """Junction graph of leader lines with precomputed connected components."""
+    def __init__(self, nodes, edges, index_cell):
+        self.nodes = nodes                    # node idx -> (x, y)
+        self.edge_lines = [ln for _, _, ln in edges]   # edge id -> line object
+        self.deg = [0] * len(nodes)
+        self.adj = {i: [] for i in range(len(nodes))}
+        uf = UnionFind(len(nodes))
+        for eid, (u, v, ln) in enumerate(edges):
+            self.deg[u] += 1; self.deg[v] += 1
+            self.adj[u].append((v, ln)); self.adj[v].append((u, ln))
+            uf.union(u, v)
+        self.component = [uf.find(i) for i in range(len(nodes))]
+        self.component_edges, self.component_leaves = {}, {}
+        for eid, (u, _, _) in enumerate(edges):
+            self.component_edges.setdefault(self.component[u], []).append(eid)
+        for i in range(len(nodes)):
+            if self.deg[i] <= 1:
+                self.component_leaves.setdefault(self.component[i], []).append(i)
+        self.index = GridIndex(index_cell)
+        for i, (x, y) in enumerate(nodes):
+            self.index.insert(i, x, y)
+
+    def nodes_in_rect(self, rect, pad):
+        cand = self.index.query_rect(rect["x"]-pad, rect["y"]-pad,
+                                     rect["x"]+rect["width"]+pad, rect["y"]+rect["height"]+pad)
+        return sorted(i for i in cand if rect_contains_with_padding(rect, *self.nodes[i], pad))
+
+def cluster_endpoints(points, tol):
+    """Merge endpoints closer than tol (single linkage), so junctions on cell borders stay joined."""
+    uf = UnionFind(len(points))
+    grid = GridIndex(tol)
+    tol2 = tol * tol
+    for i, (x, y) in enumerate(points):
+        if tol > 0:
+            for j in grid.query_rect(x-tol, y-tol, x+tol, y+tol):
+                px, py = points[j]
+                if (px-x)**2 + (py-y)**2 <= tol2:
+                    uf.union(i, j)
+        else:
+            for j in grid.cells.get(grid._key(x, y), ()):
+                if points[j] == (x, y): uf.union(i, j)
+        grid.insert(i, x, y)
+    return [uf.find(i) for i in range(len(points))]
+
 def build_graph(lines, snap):
-    nodes = {}           # snapped point -> index
-    deg = {}             # degree per node
-    edges = []           # (u, v, line_obj)
-    def add_node(pt):
-        key = snap_point(pt, snap)
-        if key not in nodes:
-            nodes[key] = len(nodes)
-            deg[nodes[key]] = 0
-        return nodes[key], key
+    """Cluster line endpoints within `snap` EMU into junction nodes and build the graph."""
+    points = []
     for ln in lines:
-        u, uk = add_node((ln["start_point"]["x"], ln["start_point"]["y"]))
-        v, vk = add_node((ln["end_point"]["x"], ln["end_point"]["y"]))
-        edges.append((u, v, ln))
-        deg[u] += 1; deg[v] += 1
-    adj = {i: [] for i in range(len(nodes))}
-    for u, v, ln in edges:
-        adj[u].append((v, ln)); adj[v].append((u, ln))
-    inv_nodes = {idx: pt for pt, idx in nodes.items()}
-    return adj, inv_nodes, deg
-
-def follow_from_label(text_box, adj, inv_nodes, deg, pad):
-    # start nodes: any graph node inside/on the padded text box
-    starts = [i for i, (x,y) in inv_nodes.items() if rect_contains_with_padding(text_box, x, y, pad)]
-    visited_nodes, visited_edges = set(), set()
-    terminals = set()
-    stack = starts[:]
-    while stack:
-        cur = stack.pop()
-        if cur in visited_nodes: 
-            continue
-        visited_nodes.add(cur)
-        is_touching_label = rect_contains_with_padding(text_box, *inv_nodes[cur], pad)
-        for nxt, ln in adj.get(cur, []):
-            eid = id(ln)
-            if eid not in visited_edges:
-                visited_edges.add(eid)
-            if nxt not in visited_nodes:
-                stack.append(nxt)
+        points.append((ln["start_point"]["x"], ln["start_point"]["y"]))
+        points.append((ln["end_point"]["x"], ln["end_point"]["y"]))
+    roots = cluster_endpoints(points, snap)
+    node_of, members = {}, []
+    for i, r in enumerate(roots):
+        if r not in node_of:
+            node_of[r] = len(members); members.append([])
+        members[node_of[r]].append(points[i])
+    # junction position = its lowest endpoint: a real coordinate, independent of line order,
+    # so target_regions carry no averaging noise
+    nodes = [min(m) for m in members]
+    edges = [(node_of[roots[2*k]], node_of[roots[2*k+1]], ln) for k, ln in enumerate(lines)]
+    return LineGraph(nodes, edges, index_cell=max(snap, 1.0) * 8)
+
+def follow_from_label(text_box, graph, pad):
+    # start nodes: graph nodes inside/on the padded text box (grid lookup)
+    starts = graph.nodes_in_rect(text_box, pad)
+    comps = sorted({graph.component[i] for i in starts})
+    terminals, edges = [], []
+    for c in comps:
+        edges.extend(graph.component_edges.get(c, []))
         # terminal if degree==1 and not touching label
-        if deg.get(cur, 0) <= 1 and not is_touching_label:
-            terminals.add(cur)
-    return list(terminals), list(visited_edges)
+        terminals.extend(i for i in graph.component_leaves.get(c, [])
+                         if not rect_contains_with_padding(text_box, *graph.nodes[i], pad))
+    return terminals, edges
 
 # ----------------------------- main flow -----------------------------
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("ppt_dir", help="Path to the folder containing the PowerPoint data.")
-    ap.add_argument("output_dir", help="Path to the output directory.")
-    ap.add_argument("--padding", type=float, default=4000.0, help="EMU padding around text box")
-    ap.add_argument("--snap", type=float, default=8000.0, help="EMU snap size for junctions")
-    args = ap.parse_args()
+def trace_labels(texts, graph, padding):
+    """Attach to each text box the leader lines it connects to and their far ends"""
+    for t in texts:
+        terminals, used_edges = follow_from_label(t["text_box"], graph, pad=padding)
+        # dedupe nearly-identical terminals by junction point
+        term_pts = []
+        seen = set()
+        for idx in terminals:
+            pt = graph.nodes[idx]
+            if pt not in seen:
+                seen.add(pt)
+                term_pts.append({"x": pt[0], "y": pt[1]})
+        # the line objects of every traversed edge
+        pointer_lines = [graph.edge_lines[eid] for eid in used_edges]
+        # keep outputs small & stable
+        pointer_lines.sort(key=lambda ln: (ln["shape_id"] or 0, ln["line_id"]))
+        # sort target points by distance from the label center
+        tcx = t["text_box"]["x"] + t["text_box"]["width"] / 2.0
+        tcy = t["text_box"]["y"] + t["text_box"]["height"] / 2.0
+        term_pts.sort(key=lambda p: (p["x"] - tcx)**2 + (p["y"] - tcy)**2)
 
-    slides_dir = os.path.join(args.ppt_dir, f"ppt/slides/")
-    rels_dir = os.path.join(slides_dir, f"_rels/")
+        t["pointer_lines"] = pointer_lines
+        t["target_regions"] = term_pts
 
-    for slide_file in sorted(Path(slides_dir).glob("slide*.xml")):
-        slide_number = int(slide_file.stem.replace('slide', ''))
-        slide_xml = os.path.join(slides_dir, f"slide{slide_number}.xml")
-        rels_xml  = os.path.join(rels_dir,   f"slide{slide_number}.xml.rels")
-        root = ET.parse(slide_xml).getroot()
-        rels_map = build_rels_map(rels_xml)
+def process_slide(deck, slide_number, output_dir, padding=4000.0, snap=8000.0):
+    """Extract, trace and write one slide's labels; returns the written path or None"""
+    with profiling.stage("slide", slide=slide_number):
+        doc = deck.slide(slide_number)
 
-        texts = extract_text_boxes(root, rels_map, bone_set="Bony Pelvis")
-        lines = extract_lines(root)
-        adj, inv_nodes, deg = build_graph(lines, snap=args.snap)
+        with profiling.stage("shape_scan"):
+            texts = extract_text_boxes(doc, bone_set="Bony Pelvis")
+            lines = extract_lines(doc)
+        with profiling.stage("graph_build"):
+            graph = build_graph(lines, snap=snap)
+        profiling.count("labels", len(texts))
+        profiling.count("edges", len(lines))
 
         # connection-based association
-        for t in texts:
-            terminals, used_edges = follow_from_label(t["text_box"], adj, inv_nodes, deg, pad=args.padding)
-            # dedupe nearly-identical terminals by snapped point
-            term_pts = []
-            seen = set()
-            for idx in terminals:
-                pt = inv_nodes[idx]
-                if pt not in seen:
-                    seen.add(pt)
-                    term_pts.append({"x": pt[0], "y": pt[1]})
-            # collect the actual line objects that were traversed
-            pointer_lines = []
-            used = set()
-            for u in adj:
-                for v, ln in adj[u]:
-                    eid = id(ln)
-                    if eid in used_edges and eid not in used:
-                        used.add(eid)
-                        pointer_lines.append(ln)
-            # keep outputs small & stable
-            pointer_lines.sort(key=lambda ln: (ln["shape_id"] or 0, ln["line_id"]))
-            # sort target points by distance from the label center
-            tcx = t["text_box"]["x"] + t["text_box"]["width"] / 2.0
-            tcy = t["text_box"]["y"] + t["text_box"]["height"] / 2.0
-            term_pts.sort(key=lambda p: (p["x"] - tcx)**2 + (p["y"] - tcy)**2)
-
-            t["pointer_lines"] = pointer_lines
-            t["target_regions"] = term_pts
+        with profiling.stage("label_trace"):
+            trace_labels(texts, graph, padding)
 
         if len(texts) > 0:
             payload = {
                 "text_annotations": texts,
                 "total_text_annotations": len(texts),
-                "config": {"padding_emu": args.padding, "snap_emu": args.snap}
+                "config": {"padding_emu": padding, "snap_emu": snap}
             }
 
-            out_path = os.path.join(args.output_dir, f"slide{slide_number}.json")
-            os.makedirs(args.output_dir, exist_ok=True)
-            with open(out_path, "w") as f:
-                json.dump(payload, f, indent=2)
-            print(f"Wrote {out_path}")
+            out_path = os.path.join(output_dir, f"slide{slide_number}.json")
+            os.makedirs(output_dir, exist_ok=True)
+            write_json(out_path, payload, indent=2)
+            return out_path
+        return None
+
+def build_parser():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
+    ap.add_argument("output_dir", help="Path to the output directory.")
+    ap.add_argument("--padding", type=float, default=4000.0, help="EMU padding around text box")
+    ap.add_argument("--snap", type=float, default=8000.0, help="EMU tolerance for merging line endpoints into junctions")
+    add_jobs_argument(ap)
+    add_force_argument(ap)
+    add_profile_arguments(ap)
+    return ap
+
+def main():
+    args = build_parser().parse_args()
+
+    with profiled(args, "text_labels"):
+        run(args)
+
+def run(args):
+    deck = as_slide_deck(args.ppt_dir)
+    slide_numbers = deck.slide_numbers()
+
+    # skip slides whose xml, rels, media, code and options all match the manifest
+    manifest = SlideManifest(args.output_dir, "text_labels", code_version(__file__, *_HELPER_MODULES),
+                             options={"padding_emu": args.padding, "snap_emu": args.snap},
+                             enabled=not args.force)
+    fingerprints = {n: manifest.fingerprint(deck, n) for n in slide_numbers}
+    changed = [n for n in slide_numbers if not manifest.is_unchanged(n, fingerprints[n], args.output_dir)]
+
+    task = partial(process_slide, output_dir=args.output_dir, padding=args.padding, snap=args.snap)
+    written = map_slides(task, changed, deck, jobs=args.jobs,
+                         setup=SlideDeck, setup_args=(deck.portable_source(),))
+    for slide_number, out_path in zip(changed, written):
+        manifest.record(slide_number, fingerprints[slide_number],
+                        [os.path.basename(out_path)] if out_path else [])
+        if out_path:
+            log.info(f"Wrote {out_path}")
+    if slide_numbers:
+        removed = manifest.remove_stale(args.output_dir, slide_numbers)
+        manifest.save()
+        if removed:
+            log.info(f"Removed {len(removed)} outputs of slides that no longer produce them")
+        update_etag_manifest(args.output_dir, [name for n in changed for name in manifest.outputs(n)],
+                             unchanged=[name for n in slide_numbers if n not in changed
+                                        for name in manifest.outputs(n)])
+    if len(changed) != len(slide_numbers):
+        log.info(f"Skipped {len(slide_numbers) - len(changed)} unchanged slides")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Responsive derivatives for extracted bone images.
+Writes each image at several widths in a modern compressed format (WebP by
+default) and an image_manifest.json listing pixel dimensions and byte sizes
+of the original and every derivative, so pages can pick a srcset entry
+instead of the full-size PNG. Images whose source hash and options match
+the manifest are skipped, and derivatives the manifest no longer lists are
+deleted. Encoding needs Pillow; without it the manifest is
+still written with the original dimensions read from the file headers.
+"""
+
+import argparse
+import io
+import json
+import os
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; only the manifest is produced without it
+    Image = None
+
+try:
+    from . import profiling
+    from .manifest import file_digest, write_if_changed
+    from .media_store import image_size
+    from .parallel import add_jobs_argument, map_slides
+    from .profiling import add_profile_arguments, log, profiled
+except ImportError:
+    import profiling
+    from manifest import file_digest, write_if_changed
+    from media_store import image_size
+    from parallel import add_jobs_argument, map_slides
+    from profiling import add_profile_arguments, log, profiled
+
+DERIVATIVES_DIR = "derivatives"
+IMAGE_MANIFEST = "image_manifest.json"
+MANIFEST_FORMAT = 2
+DEFAULT_WIDTHS = (320, 640, 1280)
+DEFAULT_FORMATS = ("webp",)
+DEFAULT_QUALITY = 80
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff")
+_FORMATS = {"webp": ("WEBP", ".webp"), "avif": ("AVIF", ".avif"),
+            "jpeg": ("JPEG", ".jpg"), "png": ("PNG", ".png")}
+
+
+def add_derivative_arguments(parser):
+    """Add the shared --derivative-* flags to a CLI parser"""
+    parser.add_argument("--derivative-widths", default=",".join(str(w) for w in DEFAULT_WIDTHS),
+                        help="Comma-separated pixel widths to generate (default: 320,640,1280). "
+                             "Widths at or above the original are skipped; a full-size copy is always written.")
+    parser.add_argument("--derivative-formats", default=",".join(DEFAULT_FORMATS),
+                        help=f"Comma-separated output formats from {sorted(_FORMATS)} (default: webp).")
+    parser.add_argument("--derivative-quality", type=int, default=DEFAULT_QUALITY,
+                        help="Encoder quality for lossy formats (default: 80).")
+
+
+class DerivativeSpec:
+    """What to generate and where; also the per-worker context for map_slides"""
+
+    def __init__(self, input_dir, output_dir, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS,
+                 quality=DEFAULT_QUALITY):
+        unknown = [f for f in formats if f not in _FORMATS]
+        if unknown:
+            raise ValueError(f"unknown derivative format(s): {unknown}")
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.widths = tuple(sorted(set(int(w) for w in widths)))
+        self.formats = tuple(formats)
+        self.quality = quality
+
+    def options(self):
+        return {"widths": list(self.widths), "formats": list(self.formats), "quality": self.quality,
+                "encoder": "pillow" if Image is not None else None}
+
+
+def derivative_name(name, width, ext):
+    """
+    File name of one derivative: the source stem and extension, so a.png and
+    a.jpg never write over each other, then the width and output extension
+    """
+    stem, source_ext = os.path.splitext(name)
+    return f"{stem}_{source_ext[1:]}_w{width}{ext}"
+
+
+def _encode(image, fmt, quality):
+    pil_format, _ = _FORMATS[fmt]
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA")
+    buf = io.BytesIO()
+    if fmt == "png":
+        image.save(buf, format=pil_format, optimize=True)
+    else:
+        image.save(buf, format=pil_format, quality=quality)
+    return buf.getvalue()
+
+
+def make_derivatives(spec, name, digest=None):
+    """Manifest entry for one source image, writing its derivatives when Pillow is available"""
+    source = spec.input_dir / name
+    data = source.read_bytes()
+    entry = {"sha256": digest or file_digest(source), "bytes": len(data), "derivatives": []}
+    size = image_size(data)
+    if Image is None:
+        if size:
+            entry["width"], entry["height"] = size
+        return entry
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        width, height = image.size
+        entry["width"], entry["height"] = width, height
+        targets = [w for w in spec.widths if w < width] + [width]
+        for fmt in spec.formats:
+            ext = _FORMATS[fmt][1]
+            for w in targets:
+                h = max(1, round(height * w / width))
+                resized = image if w == width else image.resize((w, h), Image.LANCZOS)
+                encoded = _encode(resized, fmt, spec.quality)
+                filename = derivative_name(name, w, ext)
+                write_if_changed(spec.output_dir / filename, encoded)
+                entry["derivatives"].append({"file": filename, "width": w, "height": h,
+                                             "format": fmt, "bytes": len(encoded)})
+    log.info(f"  ✓ {name}: {len(entry['derivatives'])} derivative(s)")
+    return entry
+
+
+def _derive_task(spec, item):
+    """Worker entry point for map_slides"""
+    name, digest = item
+    return make_derivatives(spec, name, digest)
+
+
+def build_derivatives(images_dir, output_dir=None, widths=DEFAULT_WIDTHS, formats=DEFAULT_FORMATS,
+                      quality=DEFAULT_QUALITY, jobs=1, force=False):
+    """
+    Generate derivatives for every image directly inside images_dir and
+    write the manifest; returns the manifest dict.
+    """
+    output_dir = Path(output_dir or Path(images_dir) / DERIVATIVES_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    spec = DerivativeSpec(images_dir, output_dir, widths, formats, quality)
+    manifest_path = output_dir / IMAGE_MANIFEST
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+    previous = {}
+    if not force and old.get("format") == MANIFEST_FORMAT and old.get("options") == spec.options():
+        previous = old.get("images", {})
+
+    names = sorted(name for name in os.listdir(images_dir)
+                   if not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+                   and os.path.isfile(os.path.join(images_dir, name)))
+    images, todo = {}, []
+    for name in names:
+        digest = file_digest(spec.input_dir / name)
+        entry = previous.get(name)
+        if (entry and entry.get("sha256") == digest and
+                all((output_dir / d["file"]).exists() for d in entry["derivatives"])):
+            images[name] = entry
+        else:
+            todo.append((name, digest))
+
+    if Image is None and todo:
+        log.warning("⚠ Pillow is not installed; writing the image manifest without derivatives")
+    if len(todo) != len(names):
+        log.info(f"Skipping {len(names) - len(todo)} unchanged image(s)")
+    results = map_slides(_derive_task, todo, spec, jobs=jobs, setup=DerivativeSpec,
+                         setup_args=(spec.input_dir, spec.output_dir, spec.widths, spec.formats, spec.quality))
+    for (name, _), entry in zip(todo, results):
+        images[name] = entry
+
+    manifest = {"format": MANIFEST_FORMAT, "options": spec.options(),
+                "images": {name: images[name] for name in sorted(images)}}
+    write_if_changed(manifest_path, json.dumps(manifest, indent=2))
+
+    # derivatives of images that are gone, or of widths and formats no longer asked for
+    listed = {d["file"] for entry in images.values() for d in entry["derivatives"]}
+    removed = 0
+    for entry in old.get("images", {}).values():
+        for d in entry.get("derivatives", []):
+            if d["file"] not in listed:
+                try:
+                    os.remove(output_dir / d["file"])
+                except FileNotFoundError:
+                    continue
+                removed += 1
+    profiling.count("files_removed", removed)
+    if removed:
+        log.info(f"Removed {removed} derivative(s) the manifest no longer lists")
+    return manifest
+
+
+def parse_widths(text):
+    return tuple(int(w) for w in text.split(",") if w.strip())
+
+
+def parse_formats(text):
+    return tuple(f.strip().lower() for f in text.split(",") if f.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write responsive derivatives of extracted bone images.")
+    parser.add_argument("images_dir", help="Folder of extracted images (output of extract_bone_images.py).")
+    parser.add_argument("--output-dir", help=f"Where to write derivatives and {IMAGE_MANIFEST} (default: images_dir/{DERIVATIVES_DIR}).")
+    parser.add_argument("--force", action="store_true", help="Regenerate every image, ignoring the manifest.")
+    add_derivative_arguments(parser)
+    add_jobs_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled(args, "derivatives"):
+        manifest = build_derivatives(args.images_dir, args.output_dir, parse_widths(args.derivative_widths),
+                                     parse_formats(args.derivative_formats), args.derivative_quality,
+                                     jobs=args.jobs, force=args.force)
+        log.info(f"✓ Image manifest covers {len(manifest['images'])} image(s)")
+
+
+if __name__ == "__main__":
+    main()
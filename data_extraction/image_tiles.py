@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+DeepZoom tile pyramids for extracted bone images.
+Each image is cut into fixed-size tiles at every power-of-two level
+({stem}_files/{level}/{col}_{row}.{ext}, level 0 being 1x1 px) so a viewer
+only fetches the tiles in view. The {stem}.json descriptor carries the usual
+DZI "Image" block plus the level sizes and, when the picture frame is known,
+the slide-EMU -> image-pixel matrix, so colored regions and text labels
+(both in slide EMUs) map into the same tile space via level_matrix().
+Tiling needs Pillow; images whose hash and options match are skipped, and
+the pyramids and descriptors of images no longer present are deleted.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; tiling is skipped without it
+    Image = None
+
+try:
+    from . import profiling
+    from .image_derivatives import IMAGE_EXTENSIONS
+    from .manifest import file_digest, write_if_changed
+    from .media_store import image_size
+    from .overlay_registration import _multiply, slide_to_image
+    from .parallel import add_jobs_argument, map_slides
+    from .profiling import add_profile_arguments, log, profiled
+except ImportError:
+    import profiling
+    from image_derivatives import IMAGE_EXTENSIONS
+    from manifest import file_digest, write_if_changed
+    from media_store import image_size
+    from overlay_registration import _multiply, slide_to_image
+    from parallel import add_jobs_argument, map_slides
+    from profiling import add_profile_arguments, log, profiled
+
+TILES_DIR = "tiles"
+TILE_MANIFEST = "tiles.json"
+MANIFEST_FORMAT = 1
+DEEPZOOM_XMLNS = "http://schemas.microsoft.com/deepzoom/2008"
+DEFAULT_TILE_SIZE = 256
+DEFAULT_OVERLAP = 1
+DEFAULT_QUALITY = 85
+_FORMATS = {"webp": ("WEBP", "webp"), "png": ("PNG", "png"), "jpeg": ("JPEG", "jpg")}
+
+
+def add_tile_arguments(parser):
+    """Add the shared --tile-* flags to a CLI parser"""
+    parser.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE,
+                        help="Tile edge in pixels, not counting overlap (default: 256).")
+    parser.add_argument("--tile-overlap", type=int, default=DEFAULT_OVERLAP,
+                        help="Pixels each tile shares with its neighbours (default: 1).")
+    parser.add_argument("--tile-format", choices=sorted(_FORMATS), default="webp",
+                        help="Tile image format (default: webp).")
+
+
+def pyramid_levels(width, height):
+    """[(level, width, height)] from level 0 (1x1) up to full size"""
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    return [(level, math.ceil(width / 2 ** (max_level - level)), math.ceil(height / 2 ** (max_level - level)))
+            for level in range(max_level + 1)]
+
+
+def tile_boxes(width, height, tile_size, overlap):
+    """(col, row, (left, top, right, bottom)) of every tile of one level"""
+    for row in range(math.ceil(height / tile_size)):
+        top = max(0, row * tile_size - overlap)
+        bottom = min(height, (row + 1) * tile_size + overlap)
+        for col in range(math.ceil(width / tile_size)):
+            left = max(0, col * tile_size - overlap)
+            right = min(width, (col + 1) * tile_size + overlap)
+            yield col, row, (left, top, right, bottom)
+
+
+class TileSpec:
+    """What to tile and where; also the per-worker context for map_slides"""
+
+    def __init__(self, input_dir, output_dir, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP,
+                 fmt="webp", quality=DEFAULT_QUALITY):
+        if fmt not in _FORMATS:
+            raise ValueError(f"unknown tile format: {fmt}")
+        if tile_size < 1 or overlap < 0:
+            raise ValueError("tile size must be positive and overlap non-negative")
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.fmt = fmt
+        self.quality = quality
+
+    def options(self):
+        return {"tile_size": self.tile_size, "overlap": self.overlap, "format": self.fmt,
+                "quality": self.quality}
+
+
+def _save(image, spec, path):
+    pil_format = _FORMATS[spec.fmt][0]
+    if spec.fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA")
+    buf = io.BytesIO()
+    if spec.fmt == "png":
+        image.save(buf, format=pil_format, optimize=True)
+    else:
+        image.save(buf, format=pil_format, quality=spec.quality)
+    write_if_changed(path, buf.getvalue())
+
+
+def make_tiles(spec, name):
+    """Cut one image into its pyramid; returns the number of tiles written, None if undecodable"""
+    stem = os.path.splitext(name)[0]
+    root = spec.output_dir / f"{stem}_files"
+    count = 0
+    try:
+        image = Image.open(spec.input_dir / name)
+        image.load()
+    except OSError as e:
+        log.warning(f"  ⚠ {name}: cannot decode image ({e})")
+        return None
+    # a smaller image or another tile size leaves levels and tiles the new pyramid lacks
+    shutil.rmtree(root, ignore_errors=True)
+    with image:
+        levels = pyramid_levels(*image.size)
+        current = image
+        for level, width, height in reversed(levels):
+            if current.size != (width, height):
+                # halve the previous level rather than resampling the original each time
+                current = current.resize((width, height), Image.LANCZOS)
+            level_dir = root / str(level)
+            level_dir.mkdir(parents=True, exist_ok=True)
+            for col, row, box in tile_boxes(width, height, spec.tile_size, spec.overlap):
+                _save(current.crop(box), spec, level_dir / f"{col}_{row}.{_FORMATS[spec.fmt][1]}")
+                count += 1
+    log.info(f"  ✓ {name}: {len(levels)} levels, {count} tiles")
+    return count
+
+
+def _tile_task(spec, name):
+    """Worker entry point for map_slides"""
+    return make_tiles(spec, name)
+
+
+def tile_descriptor(spec, name, size, digest, frame=None):
+    """DZI-style descriptor of one image's pyramid, with its slide registration when known"""
+    stem = os.path.splitext(name)[0]
+    width, height = size
+    descriptor = {
+        "Image": {
+            "xmlns": DEEPZOOM_XMLNS,
+            "Url": f"{stem}_files/",
+            "Format": _FORMATS[spec.fmt][1],
+            "Overlap": spec.overlap,
+            "TileSize": spec.tile_size,
+            "Size": {"Width": width, "Height": height},
+        },
+        "levels": [{"level": level, "width": w, "height": h,
+                    "columns": math.ceil(w / spec.tile_size), "rows": math.ceil(h / spec.tile_size)}
+                   for level, w, h in pyramid_levels(width, height)],
+        "source": {"file": name, "sha256": digest},
+        "slide": None,
+        "media": None,
+        "slide_to_image": None,
+    }
+    if frame and frame.get("frame") and frame["frame"]["cx"] and frame["frame"]["cy"]:
+        descriptor["slide"] = frame.get("slide")
+        descriptor["media"] = frame.get("media")
+        descriptor["slide_to_image"] = [round(v, 12) + 0.0 for v in slide_to_image(frame["frame"], width, height)]
+    return descriptor
+
+
+def level_matrix(descriptor, level=None, space="slide"):
+    """
+    Matrix from slide EMUs (space="slide") or full-size image pixels
+    (space="image") to pixels of one pyramid level (default: the top level).
+    Apply it with path_geometry.affine_coords / PathGeometry.affine.
+    """
+    max_level = descriptor["levels"][-1]["level"]
+    level = max_level if level is None else level
+    if not 0 <= level <= max_level:
+        raise ValueError(f"level must be between 0 and {max_level}")
+    scale = 1.0 / 2 ** (max_level - level)
+    matrix = (scale, 0.0, 0.0, scale, 0.0, 0.0)
+    if space == "image":
+        return matrix
+    if space != "slide":
+        raise ValueError("space must be 'slide' or 'image'")
+    if descriptor.get("slide_to_image") is None:
+        raise ValueError(f"{descriptor['source']['file']} has no slide registration")
+    return _multiply(matrix, descriptor["slide_to_image"])
+
+
+def tile_coordinates(descriptor, x, y, level=None, space="slide"):
+    """Where a point lands in the pyramid: {level, x, y, column, row} (x, y in level pixels)"""
+    a, b, c, d, e, f = level_matrix(descriptor, level, space)
+    level = descriptor["levels"][-1]["level"] if level is None else level
+    u, v = a * x + c * y + e, b * x + d * y + f
+    size = descriptor["Image"]["TileSize"]
+    return {"level": level, "x": u, "y": v, "column": math.floor(u / size), "row": math.floor(v / size)}
+
+
+def build_tiles(images_dir, output_dir=None, tile_size=DEFAULT_TILE_SIZE, overlap=DEFAULT_OVERLAP, fmt="webp",
+                quality=DEFAULT_QUALITY, frames=None, jobs=1, force=False):
+    """
+    Tile every image directly inside images_dir and write one descriptor per
+    image. frames maps image file name -> {slide, media, frame} where frame is
+    a bony_pelvis_rotation.picture_frame dict. Returns {name: descriptor}.
+    """
+    output_dir = Path(output_dir or Path(images_dir) / TILES_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    spec = TileSpec(images_dir, output_dir, tile_size, overlap, fmt, quality)
+    frames = frames or {}
+    manifest_path = output_dir / TILE_MANIFEST
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        old = {}
+    previous = {}
+    if not force and old.get("format") == MANIFEST_FORMAT and old.get("options") == spec.options():
+        previous = old.get("images", {})
+
+    names = sorted(name for name in os.listdir(images_dir)
+                   if not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+                   and os.path.isfile(os.path.join(images_dir, name)))
+    digests = {name: file_digest(spec.input_dir / name) for name in names}
+    todo = [name for name in names
+            if previous.get(name) != digests[name]
+            or not (output_dir / f"{os.path.splitext(name)[0]}_files").is_dir()]
+
+    if Image is None:
+        if todo:
+            log.warning("⚠ Pillow is not installed; skipping tile generation")
+        return {}
+    if len(todo) != len(names):
+        log.info(f"Skipping {len(names) - len(todo)} unchanged image(s)")
+    counts = map_slides(_tile_task, todo, spec, jobs=jobs, setup=TileSpec,
+                        setup_args=(spec.input_dir, spec.output_dir, spec.tile_size, spec.overlap,
+                                    spec.fmt, spec.quality))
+    for name, count in zip(todo, counts):
+        if count is None:
+            # no pyramid, so no descriptor; retried on the next run
+            names.remove(name)
+            del digests[name]
+
+    descriptors = {}
+    for name in names:
+        with open(spec.input_dir / name, "rb") as f:
+            size = image_size(f.read(1 << 16))
+        if size is None:
+            with Image.open(spec.input_dir / name) as image:
+                size = image.size
+        descriptor = tile_descriptor(spec, name, size, digests[name], frames.get(name))
+        write_if_changed(output_dir / f"{os.path.splitext(name)[0]}.json", json.dumps(descriptor, indent=2))
+        descriptors[name] = descriptor
+
+    write_if_changed(manifest_path, json.dumps({"format": MANIFEST_FORMAT, "options": spec.options(),
+                                                "images": digests}, indent=2))
+    removed = remove_stale_tiles(output_dir, old.get("images", {}), names)
+    if removed:
+        log.info(f"Removed the tiles of {removed} image(s) no longer present")
+    return descriptors
+
+
+def remove_stale_tiles(output_dir, previous, names):
+    """Delete the pyramid and descriptor of every image in previous but not in names; returns how many"""
+    keep = {os.path.splitext(name)[0] for name in names}
+    removed = 0
+    for stem in sorted({os.path.splitext(name)[0] for name in previous} - keep):
+        shutil.rmtree(Path(output_dir) / f"{stem}_files", ignore_errors=True)
+        try:
+            os.remove(Path(output_dir) / f"{stem}.json")
+        except FileNotFoundError:
+            pass
+        removed += 1
+    profiling.count("files_removed", removed)
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write DeepZoom tile pyramids of extracted bone images.")
+    parser.add_argument("images_dir", help="Folder of extracted images (output of extract_bone_images.py).")
+    parser.add_argument("--output-dir", help=f"Where to write the pyramids and descriptors (default: images_dir/{TILES_DIR}).")
+    parser.add_argument("--force", action="store_true", help="Re-tile every image, ignoring the tile manifest.")
+    add_tile_arguments(parser)
+    add_jobs_argument(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    with profiled(args, "tiles"):
+        descriptors = build_tiles(args.images_dir, args.output_dir, args.tile_size, args.tile_overlap,
+                                  args.tile_format, jobs=args.jobs, force=args.force)
+        log.info(f"✓ Wrote tile descriptors for {len(descriptors)} image(s)")
+
+
+if __name__ == "__main__":
+    main()
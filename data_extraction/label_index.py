@@ -0,0 +1,199 @@
+"""
+Per-slide spatial index of text labels, for naming colored regions.
+A LabelReader takes labels from the same streaming pass that reads the
+slide's other shapes, each with its box, a token set computed once, and the
+far ends of the leader lines that start at it (traced with extract_text_labels' junction
+graph). Label boxes and leader-line targets are bucketed into uniform grids,
+so picking the label for a region costs a few cell lookups instead of a scan
+over every label on the slide.
+
+A region's label is, in order of preference: the label whose leader line
+ends inside the region's bounds (nearest its centre), a label whose box
+overlaps the bounds (nearest centre), then the label nearest the bounds.
+"""
+
+import math
+import re
+
+try:
+    from .extract_text_labels import GridIndex, build_graph, emu_box, endpoints_from_xfrm, follow_from_label, \
+        line_is_white
+    from .xml_backend import Query
+except ImportError:
+    from extract_text_labels import GridIndex, build_graph, emu_box, endpoints_from_xfrm, follow_from_label, \
+        line_is_white
+    from xml_backend import Query
+
+DEFAULT_CELL = 914400   # EMUs, one inch
+_WORD = re.compile(r"[^\W\d_]+")
+_XFRM, _OFF, _EXT = Query(".//a:xfrm"), Query("a:off"), Query("a:ext")
+_TX_BODY, _LN = Query(".//p:txBody"), Query(".//a:ln")
+_CXN_SP = "{http://schemas.openxmlformats.org/presentationml/2006/main}cxnSp"
+
+
+def tokenize(text):
+    """The lower-case words of a label, for keyword matching"""
+    return frozenset(_WORD.findall(text.lower()))
+
+
+class Label:
+    """A text label: its text (also lower-cased) and tokens, slide box (x, y, x1, y1) and leader-line targets"""
+
+    __slots__ = ("shape_id", "text", "lower", "tokens", "box", "targets")
+
+    def __init__(self, shape_id, text, box, targets=()):
+        self.shape_id = shape_id
+        self.text = text
+        self.lower = text.lower()
+        self.tokens = tokenize(text)
+        self.box = box
+        self.targets = list(targets)
+
+
+def _frame(xfrm):
+    """emu_box for an a:xfrm, or None when it lacks an offset or extent"""
+    if xfrm is None or _OFF.first(xfrm) is None or _EXT.first(xfrm) is None:
+        return None
+    return emu_box(xfrm)
+
+
+class LabelReader:
+    """
+    Collects labels and leader lines from streamed shapes (SlideDeck.iter_shapes
+    with kinds sp and cxnSp) one shape at a time, so it can share a pass with
+    other readers: white connectors and text-less outlined shapes are the
+    lines, padding and snap are extract_text_labels' EMU tolerances.
+    """
+
+    def __init__(self, padding=4000.0, snap=8000.0):
+        self.padding = padding
+        self.snap = snap
+        self._labels, self._frames, self._lines = [], [], []
+
+    def add(self, shape):
+        """Take what is needed from a shape while its element is still valid"""
+        el = shape.element
+        text = " ".join(t.strip() for t in shape.texts if t and t.strip())
+        if text:
+            frame = _frame(_XFRM.first(el))
+            box = (frame["x"], frame["y"], frame["x"] + frame["width"], frame["y"] + frame["height"]) \
+                if frame else None
+            self._labels.append(Label(shape.shape_id, text, box))
+            self._frames.append(frame)
+        elif (el.tag == _CXN_SP or (_TX_BODY.first(el) is None and _LN.first(el) is not None)) \
+                and line_is_white(el):
+            xfrm = _XFRM.first(el)
+            if _frame(xfrm) is not None:
+                p1, p2, _ = endpoints_from_xfrm(xfrm)
+                self._lines.append({"start_point": {"x": p1[0], "y": p1[1]}, "end_point": {"x": p2[0], "y": p2[1]}})
+
+    def labels(self):
+        """The labels seen so far, with leader-line targets traced"""
+        if self._lines:
+            graph = build_graph(self._lines, self.snap)
+            for label, frame in zip(self._labels, self._frames):
+                if frame is not None:
+                    terminals, _ = follow_from_label(frame, graph, self.padding)
+                    label.targets = [graph.nodes[i] for i in terminals]
+        return self._labels
+
+
+def read_labels(shapes, padding=4000.0, snap=8000.0):
+    """Labels, with leader-line targets, from an iterable of streamed shapes (see LabelReader)"""
+    reader = LabelReader(padding, snap)
+    for shape in shapes:
+        reader.add(shape)
+    return reader.labels()
+
+
+def _gap(a, b):
+    """Distance between two (x0, y0, x1, y1) boxes, 0 when they touch or overlap"""
+    dx = max(a[0] - b[2], b[0] - a[2], 0)
+    dy = max(a[1] - b[3], b[1] - a[3], 0)
+    return math.hypot(dx, dy)
+
+
+def _centre(box):
+    return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+
+
+class LabelIndex:
+    """Uniform grids over label boxes and leader-line targets of one slide"""
+
+    def __init__(self, labels, cell=DEFAULT_CELL):
+        self.labels = [label for label in labels if label.box is not None]
+        self.cell = float(cell)
+        self.cells = {}                      # (i, j) -> label ids whose box overlaps the cell
+        self.targets = GridIndex(cell)       # target id -> (label id, x, y)
+        self._target_owner = []
+        for idx, label in enumerate(self.labels):
+            (i0, j0), (i1, j1) = self._key(*label.box[:2]), self._key(*label.box[2:])
+            for i in range(i0, i1 + 1):
+                for j in range(j0, j1 + 1):
+                    self.cells.setdefault((i, j), []).append(idx)
+            for x, y in label.targets:
+                self.targets.insert(len(self._target_owner), x, y)
+                self._target_owner.append((idx, x, y))
+        keys = list(self.cells)
+        self._extent = (min(k[0] for k in keys), min(k[1] for k in keys),
+                        max(k[0] for k in keys), max(k[1] for k in keys)) if keys else None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _key(self, x, y):
+        return math.floor(x / self.cell), math.floor(y / self.cell)
+
+    def pointing_into(self, box):
+        """The label whose leader line ends inside box nearest its centre, or None"""
+        cx, cy = _centre(box)
+        best = None
+        for tid in self.targets.query_rect(*box):
+            idx, x, y = self._target_owner[tid]
+            if box[0] <= x <= box[2] and box[1] <= y <= box[3]:
+                key = ((x - cx) ** 2 + (y - cy) ** 2, idx)
+                if best is None or key < best:
+                    best = key
+        return self.labels[best[1]] if best else None
+
+    def overlapping(self, box):
+        """The label whose box overlaps box with its centre nearest box's centre, or None"""
+        cx, cy = _centre(box)
+        (i0, j0), (i1, j1) = self._key(*box[:2]), self._key(*box[2:])
+        best = None
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for idx in self.cells.get((i, j), ()):
+                    lb = self.labels[idx].box
+                    if _gap(lb, box) == 0:
+                        lx, ly = _centre(lb)
+                        key = ((lx - cx) ** 2 + (ly - cy) ** 2, idx)
+                        if best is None or key < best:
+                            best = key
+        return self.labels[best[1]] if best else None
+
+    def nearest(self, box):
+        """The label whose box is nearest box, searching rings of cells outwards; None when empty"""
+        if self._extent is None:
+            return None
+        (i0, j0), (i1, j1) = self._key(*box[:2]), self._key(*box[2:])
+        ei0, ej0, ei1, ej1 = self._extent
+        last_ring = max(i0 - ei0, j0 - ej0, ei1 - i1, ej1 - j1, 0)
+        best = None
+        for ring in range(last_ring + 1):
+            # every label in ring r or beyond is at least (r - 1) cells away
+            if best is not None and best[0] <= (ring - 1) * self.cell:
+                break
+            for i in range(i0 - ring, i1 + ring + 1):
+                # ring 0 is the box's own cells; later rings only their border
+                full = ring == 0 or i in (i0 - ring, i1 + ring)
+                for j in (range(j0 - ring, j1 + ring + 1) if full else (j0 - ring, j1 + ring)):
+                    for idx in self.cells.get((i, j), ()):
+                        key = (_gap(self.labels[idx].box, box), idx)
+                        if best is None or key < best:
+                            best = key
+        return self.labels[best[1]] if best else None
+
+    def label_for(self, box):
+        """The label that names a region with bounds box: leader-line target, then overlap, then nearest"""
+        return self.pointing_into(box) or self.overlapping(box) or self.nearest(box)
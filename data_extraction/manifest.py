@@ -0,0 +1,235 @@
+"""
+Content-hash manifest for incremental extraction.
+Records, per slide, digests of the slide XML, its rels, the media it
+references, the extractor code and the options that shape its output, so
+unchanged slides can be skipped, unchanged outputs are never rewritten and
+outputs a slide no longer produces are deleted.
+Also the shared output writers: JSON is serialized canonically and every
+file is replaced atomically, so readers never see a half-written file.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from . import profiling
+except ImportError:
+    import profiling
+
+MANIFEST_FILENAME = ".extraction_manifest.json"
+MANIFEST_FORMAT = 1
+_MEDIA_REL_TYPES = ("/image", "/media", "/video", "/audio")
+_SHARED_MODULES = ("slide_document.py", "xml_backend.py", "manifest.py")
+
+
+def add_force_argument(parser):
+    """Add the shared --force flag to a CLI parser"""
+    parser.add_argument("--force", action="store_true",
+                        help="Re-extract every slide, ignoring the incremental manifest in the output directory.")
+
+
+def code_version(module_file, *helpers):
+    """Digest of an extractor's source plus the shared modules and named sibling helpers it builds on"""
+    here = Path(__file__).parent
+    h = hashlib.sha256()
+    for path in (Path(module_file), *(here / name for name in _SHARED_MODULES + helpers)):
+        if path.exists():
+            h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def canonical_json(obj, indent=None):
+    """
+    The canonical text of a JSON value: keys sorted, non-ASCII kept as UTF-8,
+    no trailing spaces and a final newline; compact when indent is None.
+    Equal data always serializes to identical bytes.
+    """
+    separators = (",", ":") if indent is None else (",", ": ")
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, indent=indent, separators=separators) + "\n"
+
+
+@contextmanager
+def atomic_path(path):
+    """A temporary path beside path, renamed over it when the block succeeds and removed if it fails"""
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_if_changed(path, data):
+    """Atomically write str/bytes to path unless the file already holds exactly that; returns True if written"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with profiling.stage("write"):
+        try:
+            if os.path.getsize(path) == len(data):
+                with open(path, "rb") as f:
+                    if f.read() == data:
+                        profiling.count("files_unchanged")
+                        return False
+        except OSError:
+            pass
+        with atomic_path(path) as tmp:
+            with open(tmp, "wb") as f:
+                f.write(data)
+    profiling.count("files_written")
+    profiling.count("bytes_written", len(data))
+    return True
+
+
+def write_json(path, obj, indent=2):
+    """write_if_changed for the canonical JSON of obj"""
+    with profiling.stage("serialize"):
+        data = canonical_json(obj, indent)
+    return write_if_changed(path, data)
+
+
+def copy_part_if_changed(deck, part, dest):
+    """Copy a deck part to dest unless dest already has identical bytes; returns True if copied"""
+    with profiling.stage("write"):
+        try:
+            if os.path.getsize(dest) == deck.part_size(part):
+                digest = deck.part_digest(part)
+                if file_digest(dest) == digest:
+                    profiling.count("files_unchanged")
+                    return False
+        except OSError:
+            pass
+        with atomic_path(dest) as tmp:
+            deck.copy_part(part, tmp)
+    profiling.count("files_written")
+    profiling.count("bytes_written", deck.part_size(part))
+    return True
+
+
+def cached_part_digest(deck, part, cache):
+    """
+    A part's sha256 digest, reusing the one in cache ({path: [size, change
+    key, digest]}) while the part keeps its size and change key: the mtime
+    of a folder source's file, the CRC and timestamp of an archive member.
+    The key only decides when to re-hash; the digest is always of the bytes.
+    """
+    stat = deck.part_stat(part)
+    key = deck.path(part)
+    cached = cache.get(key)
+    if cached and cached[0] == stat[0] and cached[1] == stat[1]:
+        return cached[2]
+    digest = deck.part_digest(part)
+    cache[key] = [stat[0], stat[1], digest]
+    return digest
+
+
+def file_digest(path):
+    """Digest of a file on disk in the part digest scheme"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return "sha256:" + h.hexdigest()
+
+
+class SlideManifest:
+    """Per-output-directory record of what each slide was extracted from"""
+
+    def __init__(self, output_dir, extractor, version, options=None, enabled=True):
+        self.path = Path(output_dir) / MANIFEST_FILENAME
+        self.extractor = extractor
+        self.version = version
+        self.options = options or {}
+        self.enabled = enabled
+        self.slides = {}
+        self._part_cache = {}
+        self._stale = set()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("format") != MANIFEST_FORMAT or data.get("extractor") != self.extractor:
+            return
+        self.slides = data.get("slides", {})
+        self._part_cache = data.get("part_cache", {})
+
+    def _digest(self, deck, part):
+        return cached_part_digest(deck, part, self._part_cache)
+
+    def fingerprint(self, deck, slide_number):
+        """Digests of everything the slide's outputs depend on, without parsing XML"""
+        slide_part = deck.slide_part(slide_number)
+        rels_part = deck.rels_part(slide_number)
+        fingerprint = {
+            "slide": self._digest(deck, slide_part),
+            "rels": self._digest(deck, rels_part) if deck.has_part(rels_part) else None,
+            "media": {},
+            "extractor": self.version,
+            "options": self.options,
+        }
+        if fingerprint["rels"] is not None:
+            for rel in deck.slide_rels(slide_number).values():
+                if rel["Type"].endswith(_MEDIA_REL_TYPES):
+                    media = deck.media_part(rel["Target"])
+                    if deck.has_part(media):
+                        fingerprint["media"][media] = self._digest(deck, media)
+        return fingerprint
+
+    def is_unchanged(self, slide_number, fingerprint, output_dir):
+        """True when the slide was extracted from identical inputs and its outputs still exist"""
+        if not self.enabled:
+            return False
+        entry = self.slides.get(str(slide_number))
+        if not entry or entry.get("inputs") != fingerprint:
+            return False
+        return all(os.path.exists(os.path.join(output_dir, name)) for name in entry.get("outputs", []))
+
+    def outputs(self, slide_number):
+        return list((self.slides.get(str(slide_number)) or {}).get("outputs", []))
+
+    def record(self, slide_number, fingerprint, outputs):
+        self._stale.update(set(self.outputs(slide_number)) - set(outputs))
+        self.slides[str(slide_number)] = {"inputs": fingerprint, "outputs": sorted(outputs)}
+
+    def remove_stale(self, output_dir, slide_numbers=None):
+        """
+        Delete the files a slide used to write but no longer does. Given the
+        deck's slide numbers, slides missing from it are forgotten first, so
+        their outputs go too. Returns the removed names.
+        """
+        if slide_numbers is not None:
+            keep = {str(n) for n in slide_numbers}
+            for key in [key for key in self.slides if key not in keep]:
+                self._stale.update(self.slides.pop(key).get("outputs", []))
+        recorded = {name for entry in self.slides.values() for name in entry.get("outputs", [])}
+        removed = []
+        for name in sorted(self._stale - recorded):
+            try:
+                os.remove(os.path.join(output_dir, name))
+            except FileNotFoundError:
+                continue
+            removed.append(name)
+        self._stale.clear()
+        profiling.count("files_removed", len(removed))
+        return removed
+
+    def save(self):
+        data = {
+            "format": MANIFEST_FORMAT,
+            "extractor": self.extractor,
+            "slides": {k: self.slides[k] for k in sorted(self.slides, key=int)},
+            "part_cache": {k: self._part_cache[k] for k in sorted(self._part_cache)},
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_if_changed(self.path, json.dumps(data, indent=1, sort_keys=True))
@@ -0,0 +1,253 @@
+"""
+Content-addressed media store for extracted images.
+Each unique media blob is written once, under <output>/.media/<sha256><ext>,
+and the per-slide file names are hardlinked to it. Where the filesystem has
+no hardlinks, no store is kept and each file is written on its own. Blob
+writes and links run on a bounded thread pool, so a slide's images are
+written concurrently. prune_media_store drops the blobs no output links to
+any more.
+"""
+
+import os
+import posixpath
+import shutil
+import struct
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    from . import profiling
+    from .manifest import copy_part_if_changed
+    from .profiling import log
+except ImportError:
+    import profiling
+    from manifest import copy_part_if_changed
+    from profiling import log
+
+MEDIA_STORE_DIR = ".media"
+STORE_MODES = ("link", "copy")
+_FICLONE = 0x40049409   # Linux ioctl that shares extents between two files (btrfs, XFS, ...)
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def add_media_store_arguments(parser):
+    """Add the shared --media-store and --copy-threads flags to a CLI parser"""
+    parser.add_argument("--media-store", choices=STORE_MODES, default="link",
+                        help="link: write each unique image once to .media/ and hardlink the per-slide names to it; "
+                             "copy: write every per-slide file separately (default: link).")
+    parser.add_argument("--copy-threads", type=int, default=min(8, os.cpu_count() or 1),
+                        help="Threads used to write images (default: min(8, CPU count)).")
+
+
+def image_size(data):
+    """(width, height) in pixels from a PNG, JPEG, GIF or BMP header, else None"""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return struct.unpack("<HH", data[6:10])
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return width, abs(height)
+    if data[:2] == b"\xff\xd8":
+        pos = 2
+        while pos + 9 < len(data):
+            if data[pos] != 0xFF:
+                pos += 1
+                continue
+            marker = data[pos + 1]
+            if marker in _JPEG_SOF:
+                height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+                return width, height
+            if marker == 0xD8 or 0xD0 <= marker <= 0xD7 or marker == 0x01 or marker == 0xFF:
+                pos += 2 if marker != 0xFF else 1
+                continue
+            pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+    return None
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+
+
+def _same_bytes(a, b):
+    if os.path.getsize(a) != os.path.getsize(b):
+        return False
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            block = fa.read(1 << 20)
+            if block != fb.read(1 << 20):
+                return False
+            if not block:
+                return True
+
+
+def _supports_hardlinks(directory):
+    """True when files in directory can be hardlinked"""
+    probe = Path(directory) / f".tmp-{uuid.uuid4().hex}"
+    probe.touch()
+    try:
+        os.link(probe, f"{probe}.link")
+    except OSError:
+        return False
+    else:
+        os.remove(f"{probe}.link")
+        return True
+    finally:
+        os.remove(probe)
+
+
+def prune_media_store(output_dir):
+    """
+    Delete the blobs in output_dir/.media that no per-slide file is linked to
+    (a link count of one), and temp files left by interrupted writes. Stores
+    are only kept where hardlinks work, so a lone blob is never in use. Run
+    it once no store is writing. Returns (blobs removed, bytes freed).
+    """
+    root = Path(output_dir) / MEDIA_STORE_DIR
+    if not root.is_dir():
+        return 0, 0
+    removed = freed = 0
+    for path in root.iterdir():
+        try:
+            stat = path.stat()
+            if not path.is_file() or (stat.st_nlink > 1 and not path.name.startswith(".tmp-")):
+                continue
+            path.unlink()
+        except OSError:
+            continue
+        removed += 1
+        freed += stat.st_size
+    profiling.count("blobs_removed", removed)
+    return removed, freed
+
+
+class MediaStore:
+    """Writes deck media parts to per-slide destinations, deduplicated by content"""
+
+    def __init__(self, output_dir, mode="link", threads=4):
+        if mode not in STORE_MODES:
+            raise ValueError(f"mode must be one of {STORE_MODES}")
+        self.mode = mode
+        self.root = Path(output_dir) / MEDIA_STORE_DIR
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads))
+        self._futures = []
+        self._lock = threading.Lock()
+        self._part_locks = {}
+        self._digest_locks = {}
+        self._blobs = {}        # (deck location, part) -> blob path
+        self._by_digest = {}    # part digest -> blob path
+        self._links = None      # whether the store's filesystem has hardlinks, probed on first use
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def place(self, deck, part, dest, label=""):
+        """Queue writing part to dest; the future resolves to True if dest changed"""
+        future = self._pool.submit(self._place, deck, part, str(dest), label)
+        self._futures.append(future)
+        return future
+
+    def wait(self):
+        """Block until every queued write is done, re-raising the first failure"""
+        futures, self._futures = self._futures, []
+        return [f.result() for f in futures]
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown()
+
+    def _can_link(self):
+        with self._lock:
+            if self._links is None:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._links = _supports_hardlinks(self.root)
+                if not self._links:
+                    log.warning(f"⚠ No hardlinks in {self.root.parent}; writing each image separately")
+            return self._links
+
+    def _place(self, deck, part, dest, label):
+        # a blob nothing can link to would only be pruned and rewritten by the next run
+        if self.mode == "copy" or not self._can_link():
+            if os.path.exists(dest) and os.stat(dest).st_nlink > 1:
+                # give dest its own inode so the copy never writes through into a shared blob
+                tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+                shutil.copyfile(dest, tmp)
+                os.replace(tmp, dest)
+            changed = copy_part_if_changed(deck, part, dest)
+        else:
+            blob = self.blob(deck, part)
+            with profiling.stage("write"):
+                changed = self._link(blob, dest)
+            profiling.count("files_linked" if changed else "files_unchanged")
+        name = os.path.basename(dest)
+        log.info(f"  ✓ {label} -> {name}" if changed else f"  = {label} -> {name} (unchanged)")
+        return changed
+
+    def blob(self, deck, part):
+        """Path of the part's blob in the store, writing it on first use"""
+        key = (deck.location, part)
+        with self._lock:
+            lock = self._part_locks.setdefault(key, threading.Lock())
+        with lock:
+            blob = self._blobs.get(key)
+            if blob is None:
+                blob = self._blobs[key] = self._write_blob(deck, part)
+            return blob
+
+    def _write_blob(self, deck, part):
+        with profiling.stage("write"):
+            return self._store_blob(deck, part)
+
+    def _store_blob(self, deck, part):
+        ext = posixpath.splitext(part)[1].lower()
+        digest = deck.part_digest(part)
+        # parts with the same bytes share a lock, so only one thread writes their blob
+        with self._lock:
+            lock = self._digest_locks.setdefault(digest, threading.Lock())
+        with lock:
+            known = self._by_digest.get(digest)
+            if known is not None:
+                return known
+            self.root.mkdir(parents=True, exist_ok=True)
+            # part digests are content hashes, so the blob name is known before anything is written
+            blob = self.root / (digest[len("sha256:"):] + ext)
+            if not blob.exists():
+                tmp = self.root / f".tmp-{uuid.uuid4().hex}"
+                deck.copy_part(part, tmp)
+                try:
+                    # never replace a published blob: files linked to it would lose their share
+                    os.link(tmp, blob)
+                    profiling.count("bytes_written", os.path.getsize(blob))
+                except FileExistsError:
+                    pass    # another worker process published the same bytes first
+                finally:
+                    os.remove(tmp)
+            self._by_digest[digest] = blob
+            return blob
+
+    def _link(self, blob, dest):
+        """Point dest at blob; returns False when dest already had the blob's content"""
+        changed = True
+        if os.path.exists(dest):
+            if os.path.samefile(dest, blob):
+                return False
+            changed = not _same_bytes(dest, blob)
+        tmp = f"{dest}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            try:
+                _reflink(blob, tmp)
+            except (OSError, ImportError):
+                shutil.copyfile(blob, tmp)
+        os.replace(tmp, dest)
+        return changed
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Deck-wide slide navigation graph, built from the slides' hyperlinks.
+Every a:hlinkClick in the deck (on a shape or on one of its text runs) is
+resolved once: slide jumps through the slide's relationships, and
+ppaction://hlinkshowjump actions (next, previous, first, last slide) against
+the slide order. From the resulting slide -> slide graph every slide gets
+
+    links        the slides it links to, with the shape and text of each link
+    inbound      the slides that link to it
+    breadcrumbs  the shortest click path from the root (the boneset index,
+                 slide 1), each step named by the text of the link followed
+    prefetch     the slides one click away (its links, then the breadcrumb
+                 parent) and, given a build output folder, the files written
+                 for those slides, so a viewer can preload the next views
+                 instead of fetching them on click
+
+written to OUTPUT_DIR/navigation.json:
+
+    {"format": 1, "root": 1,
+     "slides": {"2": {"links": [{"slide": 3, "shape_id": "4", "text": "Ilium"}],
+                      "inbound": [1],
+                      "breadcrumbs": [{"slide": 1, "text": null}, {"slide": 2, "text": "Bony Pelvis"}],
+                      "prefetch": {"slides": [3, 1], "assets": ["colored_regions/slide3_precise_paths.json", ...]}},
+                ...}}
+
+Slides the root cannot reach have empty breadcrumbs.
+"""
+
+import argparse
+import os
+import posixpath
+import re
+from collections import deque
+
+try:
+    from . import profiling
+    from .etag_manifest import update_etag_manifest
+    from .manifest import write_json
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import R_ID_KEY, SLIDES_DIR, as_slide_deck, part_name
+    from .xml_backend import Query
+except ImportError:
+    import profiling
+    from etag_manifest import update_etag_manifest
+    from manifest import write_json
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import R_ID_KEY, SLIDES_DIR, as_slide_deck, part_name
+    from xml_backend import Query
+
+NAVIGATION_FORMAT = 1
+NAVIGATION_FILENAME = "navigation.json"
+DEFAULT_ROOT = 1
+JUMP_ACTION = "ppaction://hlinkshowjump"
+# sibling modules whose code shapes the output, for the build's stage fingerprint
+_HELPER_MODULES = ("etag_manifest.py",)
+_SHAPE_HLINK, _RUNS = Query("./*/p:cNvPr/a:hlinkClick"), Query(".//a:r")
+_RUN_HLINK, _RUN_TEXT = Query("a:rPr/a:hlinkClick"), Query("a:t")
+_SLIDE_PART = re.compile(r"^slide(\d+)\.xml$")
+_SLIDE_ASSET = re.compile(r"^slide(\d+)[._]")
+
+
+def _slide_of_part(name):
+    """Slide number of a part name such as ppt/slides/slide3.xml, or None"""
+    if posixpath.dirname(name) != SLIDES_DIR:
+        return None
+    match = _SLIDE_PART.match(posixpath.basename(name))
+    return int(match.group(1)) if match else None
+
+
+def resolve_link(hlink, rels, slide_number=None, order=()):
+    """
+    Slide number an a:hlinkClick leads to, or None (external links, missing
+    relationships). Show-jump actions need the slide's own number and the
+    deck's slide order; without them only relationship targets resolve.
+    """
+    action = hlink.get("action", "")
+    if action.startswith(JUMP_ACTION):
+        if slide_number not in order:
+            return None
+        jump = action.partition("jump=")[2]
+        position = order.index(slide_number)
+        if jump == "nextslide":
+            return order[position + 1] if position + 1 < len(order) else None
+        if jump == "previousslide":
+            return order[position - 1] if position > 0 else None
+        if jump == "firstslide":
+            return order[0]
+        if jump == "lastslide":
+            return order[-1]
+        return None
+    rel = rels.get(hlink.get(R_ID_KEY) or "")
+    if not rel or not rel.get("Target") or "://" in rel["Target"]:
+        return None
+    return _slide_of_part(part_name(SLIDES_DIR, rel["Target"]))
+
+
+def _shape_links(shape):
+    """(a:hlinkClick, text) pairs of a streamed shape: its own link with its text, then each linked run's"""
+    pairs = []
+    hlink = _SHAPE_HLINK.first(shape.element)
+    if hlink is not None:
+        pairs.append((hlink, " ".join(t.strip() for t in shape.texts if t and t.strip())))
+    for run in _RUNS.all(shape.element):
+        hlink = _RUN_HLINK.first(run)
+        if hlink is not None:
+            pairs.append((hlink, "".join(t.text or "" for t in _RUN_TEXT.all(run)).strip()))
+    return pairs
+
+
+def read_links(deck):
+    """{slide number: [{"slide", "shape_id", "text"}]} for every slide link in the deck, one pass per slide"""
+    order = deck.slide_numbers()
+    known = set(order)
+    links = {}
+    for slide_number in order:
+        with profiling.stage("shape_scan", slide=slide_number):
+            rels = deck.slide_rels(slide_number)
+            found, seen = [], set()
+            for shape in deck.iter_shapes(slide_number):
+                for hlink, text in _shape_links(shape):
+                    target = resolve_link(hlink, rels, slide_number, order)
+                    if target is None or target not in known or (target, shape.shape_id) in seen:
+                        continue
+                    seen.add((target, shape.shape_id))
+                    found.append({"slide": target, "shape_id": shape.shape_id, "text": text or None})
+        profiling.count("links", len(found))
+        links[slide_number] = found
+    return links
+
+
+def breadcrumb_parents(links, root):
+    """{slide: (parent, link)} along shortest click paths from root; lower-numbered slides win ties"""
+    parents = {root: (None, None)}
+    queue = deque([root])
+    while queue:
+        slide = queue.popleft()
+        for link in sorted(links.get(slide, ()), key=lambda link: link["slide"]):
+            if link["slide"] not in parents:
+                parents[link["slide"]] = (slide, link)
+                queue.append(link["slide"])
+    return parents
+
+
+def breadcrumbs(parents, slide):
+    """Root-first [{"slide", "text"}] path to slide, or [] when the root cannot reach it"""
+    if slide not in parents:
+        return []
+    path = []
+    while slide is not None:
+        parent, link = parents[slide]
+        path.append({"slide": slide, "text": link["text"] if link else None})
+        slide = parent
+    return path[::-1]
+
+
+def index_assets(assets_dir, exclude=()):
+    """{slide number: sorted paths relative to assets_dir} for the slide{N}.* and slide{N}_* files under it"""
+    assets = {}
+    if not assets_dir or not os.path.isdir(assets_dir):
+        return assets
+    for folder, dirs, names in os.walk(assets_dir):
+        # hidden folders hold manifests and the media store, not files a viewer asks for
+        dirs[:] = [d for d in dirs if not d.startswith(".")
+                   and os.path.relpath(os.path.join(folder, d), assets_dir) not in exclude]
+        for name in names:
+            match = _SLIDE_ASSET.match(name)
+            if match:
+                path = os.path.relpath(os.path.join(folder, name), assets_dir).replace(os.sep, "/")
+                assets.setdefault(int(match.group(1)), []).append(path)
+    return {slide: sorted(paths) for slide, paths in assets.items()}
+
+
+def build_navigation(links, root=DEFAULT_ROOT, assets=None):
+    """The navigation.json document for the links from read_links and the assets from index_assets"""
+    assets = assets or {}
+    with profiling.stage("graph_build"):
+        inbound = {slide: set() for slide in links}
+        for slide, out in links.items():
+            for link in out:
+                if link["slide"] != slide:
+                    inbound[link["slide"]].add(slide)
+        parents = breadcrumb_parents(links, root)
+
+    slides = {}
+    for slide, out in links.items():
+        neighbours = []
+        for link in out:
+            if link["slide"] != slide and link["slide"] not in neighbours:
+                neighbours.append(link["slide"])
+        parent = parents.get(slide, (None, None))[0]
+        if parent is not None and parent not in neighbours:
+            neighbours.append(parent)
+        slides[str(slide)] = {
+            "links": out,
+            "inbound": sorted(inbound[slide]),
+            "breadcrumbs": breadcrumbs(parents, slide),
+            "prefetch": {"slides": neighbours,
+                         "assets": [path for n in neighbours for path in assets.get(n, ())]},
+        }
+    return {"format": NAVIGATION_FORMAT, "root": root, "slides": slides}
+
+
+def write_navigation(deck, output_dir, root=DEFAULT_ROOT, assets_dir=None):
+    """Resolve the deck's links and write output_dir/navigation.json; returns the document"""
+    deck = as_slide_deck(deck)
+    links = read_links(deck)
+    if root not in links:
+        raise ValueError(f"root slide {root} is not in the deck")
+    exclude = {os.path.relpath(output_dir, assets_dir)} if assets_dir else ()
+    navigation = build_navigation(links, root, index_assets(assets_dir, exclude))
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = os.path.join(output_dir, NAVIGATION_FILENAME)
+    if write_json(out_path, navigation, indent=2):
+        log.info(f"Wrote {out_path}")
+    else:
+        log.info(f"Unchanged {out_path}")
+    update_etag_manifest(output_dir, [NAVIGATION_FILENAME])
+    return navigation
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(description="Build the slide navigation graph with breadcrumbs and prefetch lists.")
+    ap.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
+    ap.add_argument("output_dir", help="Path to the output directory.")
+    ap.add_argument("--root", type=int, default=DEFAULT_ROOT,
+                    help=f"Slide the breadcrumbs start from (default: {DEFAULT_ROOT}, the boneset index).")
+    ap.add_argument("--assets", metavar="DIR",
+                    help="Build output folder whose slide{N} files are listed for prefetching.")
+    add_profile_arguments(ap)
+    return ap
+
+
+def run(args):
+    deck = as_slide_deck(args.ppt_dir)
+    if not deck.exists():
+        log.error(f"[ERROR] Slides directory not found: {deck.slides_dir}")
+        return False
+    write_navigation(deck, args.output_dir, args.root, args.assets)
+    return True
+
+
+def main():
+    args = build_parser().parse_args()
+    with profiled(args, "navigation"):
+        ok = run(args)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
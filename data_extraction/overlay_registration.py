@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Automatic overlay registration from picture frames.
+For each slide, the two main pictures (bony_pelvis_rotation.two_largest_pics)
+give the EMU frame, rotation, flips and crop each image is drawn with. Together
+with the media's pixel size that fixes the affine transform from slide EMUs
+into each image's pixel space, so colored regions can be written in image
+coordinates directly instead of being nudged into place by hand.
+"""
+
+import argparse
+import json
+import math
+import os
+
+try:
+    from .bony_pelvis_rotation import two_largest_pics
+    from .manifest import write_if_changed
+    from .media_store import image_size
+    from .path_geometry import PathGeometry, affine_coords
+    from .region_codec import read_regions
+    from .slide_document import SlideDeck
+except ImportError:
+    from bony_pelvis_rotation import two_largest_pics
+    from manifest import write_if_changed
+    from media_store import image_size
+    from path_geometry import PathGeometry, affine_coords
+    from region_codec import read_regions
+    from slide_document import SlideDeck
+
+
+def _multiply(m, n):
+    """Compose SVG-style matrices: apply n, then m"""
+    a, b, c, d, e, f = m
+    p, q, r, s, t, u = n
+    return (a * p + c * q, b * p + d * q, a * r + c * s, b * r + d * s,
+            a * t + c * u + e, b * t + d * u + f)
+
+
+def _invert(m):
+    a, b, c, d, e, f = m
+    det = a * d - b * c
+    if not det:
+        raise ValueError("picture frame has zero size")
+    return (d / det, -b / det, -c / det, a / det,
+            (c * f - d * e) / det, (b * e - a * f) / det)
+
+
+def image_to_slide(pic, width, height):
+    """
+    Matrix from image pixels to slide EMUs for a picture dict from two_largest_pics:
+    crop to the srcRect, stretch to the frame, flip within the frame, then
+    rotate clockwise about the frame centre (DrawingML's order).
+    """
+    crop = pic.get("crop") or {}
+    l, t = crop.get("l", 0.0), crop.get("t", 0.0)
+    vis_w = (1.0 - l - crop.get("r", 0.0)) * width
+    vis_h = (1.0 - t - crop.get("b", 0.0)) * height
+    if not vis_w or not vis_h:
+        raise ValueError("picture is cropped to nothing")
+    sx, sy = pic["cx"] / vis_w, pic["cy"] / vis_h
+    # pixels -> frame-local EMUs, relative to the frame centre
+    m = (sx, 0.0, 0.0, sy, -l * width * sx - pic["cx"] / 2, -t * height * sy - pic["cy"] / 2)
+    if pic.get("flipH"):
+        m = _multiply((-1.0, 0.0, 0.0, 1.0, 0.0, 0.0), m)
+    if pic.get("flipV"):
+        m = _multiply((1.0, 0.0, 0.0, -1.0, 0.0, 0.0), m)
+    theta = math.radians(pic.get("rot_deg", 0.0))
+    cos, sin = math.cos(theta), math.sin(theta)
+    centre = (pic["x"] + pic["cx"] / 2, pic["y"] + pic["cy"] / 2)
+    return _multiply((cos, sin, -sin, cos, centre[0], centre[1]), m)
+
+
+def slide_to_image(pic, width, height):
+    """Inverse of image_to_slide: slide EMUs -> image pixels"""
+    return _invert(image_to_slide(pic, width, height))
+
+
+def register_slide(deck, slide_number, min_area_frac=0.05):
+    """
+    Registration for each main picture on a slide, left to right:
+    {index, media, width, height, frame, image_to_slide, slide_to_image}
+    """
+    doc = deck.slide(slide_number)
+    registrations = []
+    pics = sorted(two_largest_pics(doc, min_area_frac), key=lambda d: d["x"])
+    for index, pic in enumerate(pics):
+        target = doc.resolve(pic["embed"]) if pic["embed"] else ""
+        part = deck.media_part(target) if target else None
+        size = None
+        if part and deck.has_part(part):
+            with deck.open_part(part) as f:
+                size = image_size(f.read(1 << 16)) or image_size(deck.read_part(part))
+        entry = {
+            "index": index,
+            "media": target,
+            "frame": {k: pic[k] for k in ("x", "y", "cx", "cy", "rot_deg", "flipH", "flipV", "crop")},
+        }
+        if size is None or not pic["cx"] or not pic["cy"]:
+            entry["error"] = "unknown image size" if size is None else "empty frame"
+        else:
+            forward = image_to_slide(pic, *size)
+            entry.update({
+                "width": size[0],
+                "height": size[1],
+                "image_to_slide": [round(v, 9) for v in forward],
+                "slide_to_image": [round(v, 12) for v in _invert(forward)],
+            })
+        registrations.append(entry)
+    return registrations
+
+
+def _contains(registration, x, y):
+    """Whether slide point (x, y) lands inside the image"""
+    u, v = affine_coords([x, y], registration["slide_to_image"])
+    return 0 <= u <= registration["width"] and 0 <= v <= registration["height"]
+
+
+def registered_regions(slide_data, registrations):
+    """
+    Split a slide's regions between its registered images and map them into
+    image pixels. A region goes to the image containing its bounding-box
+    centre, or the image whose frame centre is nearest.
+    Returns the multi-image structure coloredRegionsOverlay.js reads.
+    """
+    usable = [r for r in registrations if "slide_to_image" in r]
+    images = [{"index": r["index"], "media": r["media"], "width": r["width"], "height": r["height"],
+               "colored_regions": []} for r in usable]
+    for region in slide_data.get("colored_regions", []):
+        geometries = [PathGeometry.from_dict(path) for path in region.get("path_data", [])]
+        xs = [x for g in geometries for x in g.coords[0::2]]
+        ys = [y for g in geometries for y in g.coords[1::2]]
+        if not xs or not usable:
+            continue
+        cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+        inside = [k for k, r in enumerate(usable) if _contains(r, cx, cy)]
+        if inside:
+            k = inside[0]
+        else:
+            k = min(range(len(usable)), key=lambda k: (
+                (usable[k]["frame"]["x"] + usable[k]["frame"]["cx"] / 2 - cx) ** 2 +
+                (usable[k]["frame"]["y"] + usable[k]["frame"]["cy"] / 2 - cy) ** 2))
+        out = {key: value for key, value in region.items() if key != "path_data"}
+        out["path_data"] = [dict(g.affine(usable[k]["slide_to_image"]).to_dict(),
+                                 path_width=usable[k]["width"], path_height=usable[k]["height"])
+                            for g in geometries]
+        images[k]["colored_regions"].append(out)
+    return {"slide_number": slide_data.get("slide_number"), "registration": registrations, "images": images}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Register colored regions to their slide images from the picture frames.")
+    parser.add_argument("ppt_dir", help="Path to the .pptx file or the folder containing the unzipped PowerPoint data.")
+    parser.add_argument("regions_dir", help="Folder with slide{N}_precise_paths.json (or .bin) files from ColoredRegionsExtractor.")
+    parser.add_argument("output_dir", help="Folder to write slide{N}_image_regions.json files to.")
+    parser.add_argument("--slides", type=int, nargs="+", help="Slide numbers to register (default: every slide with region data).")
+    parser.add_argument("--min-area", type=float, default=0.05,
+                        help="Minimum area fraction (relative to the largest picture) for a main picture. Default: 0.05.")
+    args = parser.parse_args()
+
+    deck = SlideDeck(args.ppt_dir)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for n in args.slides or deck.slide_numbers():
+        source = None
+        for ext in (".json", ".bin"):
+            path = os.path.join(args.regions_dir, f"slide{n}_precise_paths{ext}")
+            if os.path.exists(path):
+                source = path
+                break
+        if source is None or not deck.has_slide(n):
+            continue
+        registrations = register_slide(deck, n, args.min_area)
+        data = registered_regions(read_regions(source), registrations)
+        out = os.path.join(args.output_dir, f"slide{n}_image_regions.json")
+        write_if_changed(out, json.dumps(data, indent=2, ensure_ascii=False))
+        placed = [len(image["colored_regions"]) for image in data["images"]]
+        print(f"✓ Slide {n}: {len(registrations)} image(s), regions per image {placed} -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Process-pool helpers shared by the data_extraction scripts.
+Slides are independent, so each worker opens its own deck once and the
+results are handed back in slide order for a deterministic merge.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from . import profiling
+except ImportError:
+    import profiling
+
+_worker_context = None
+
+
+def add_jobs_argument(parser):
+    """Add the shared --jobs flag to a CLI parser"""
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of worker processes used to process slides in parallel. 0 uses every core. Default: 1.")
+
+
+def resolve_jobs(jobs):
+    """Turn a --jobs value into a worker count (0 or less means every core)"""
+    if jobs is None:
+        return 1
+    if jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def _init_worker(setup, setup_args, state):
+    global _worker_context
+    profiling.init_worker(state)
+    _worker_context = setup(*setup_args)
+
+
+def _run_task(task, slide_number):
+    # the worker's measurements travel back with each result (None when not profiling)
+    return task(_worker_context, slide_number), profiling.collect()
+
+
+def map_slides(task, slide_numbers, context, jobs=1, setup=None, setup_args=()):
+    """
+    Run task(context, slide_number) for every slide and return the results in
+    the order of slide_numbers.
+
+    With one job the given context is used in-process. With more, each worker
+    builds its own context once via setup(*setup_args); task, setup and their
+    arguments must then be picklable (module-level functions or partials).
+    """
+    slide_numbers = list(slide_numbers)
+    jobs = min(resolve_jobs(jobs), len(slide_numbers))
+    if jobs <= 1 or setup is None:
+        return [task(context, n) for n in slide_numbers]
+
+    chunksize = max(1, len(slide_numbers) // (jobs * 4))
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(setup, setup_args, profiling.worker_state())) as pool:
+        for result, measurements in pool.map(_run_task, [task] * len(slide_numbers), slide_numbers,
+                                             chunksize=chunksize):
+            profiling.merge(measurements)
+            results.append(result)
+    return results
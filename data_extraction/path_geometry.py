@@ -0,0 +1,222 @@
+"""
+Array-backed geometry for DrawingML custom paths.
+A path is stored as an opcode array plus one flat x/y coordinate array, so
+scaling from path space to slide space is a single affine operation per
+path (vectorized with NumPy when it is installed). The per-command dicts
+written to *_precise_paths.json are produced from it as an export view.
+"""
+
+import math
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python path gives identical results
+    np = None
+
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+MOVE_TO, LINE_TO, CUBIC_BEZ_TO, QUAD_BEZ_TO, CLOSE = range(5)
+
+# DrawingML tag -> opcode, and the points each opcode consumes
+_TAG_OPS = {
+    A_NS + "moveTo": MOVE_TO,
+    A_NS + "lnTo": LINE_TO,
+    A_NS + "cubicBezTo": CUBIC_BEZ_TO,
+    A_NS + "quadBezTo": QUAD_BEZ_TO,
+    A_NS + "close": CLOSE,
+}
+OP_POINTS = (1, 1, 3, 2, 0)
+OP_NAMES = ("moveTo", "lineTo", "cubicBezTo", "quadBezTo", "close")
+_PT = A_NS + "pt"
+_NAME_OPS = {name: op for op, name in enumerate(OP_NAMES)}
+
+
+class PathGeometry:
+    """One path as parallel opcode and flat coordinate arrays"""
+
+    __slots__ = ("ops", "coords", "width", "height")
+
+    def __init__(self, ops, coords, width=0, height=0):
+        self.ops = ops          # array('B') of opcodes
+        self.coords = coords    # flat [x0, y0, x1, y1, ...] (array('q') or a NumPy array)
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_element(cls, path):
+        """Read an a:path element; commands with too few points are dropped as before"""
+        ops, coords = array("B"), array("q")
+        for child in path:
+            op = _TAG_OPS.get(child.tag)
+            if op is None:
+                continue
+            needed = OP_POINTS[op]
+            if needed:
+                pts = [pt for pt in child.iter(_PT)][:needed]
+                if len(pts) < needed:
+                    continue
+                for pt in pts:
+                    coords.append(int(pt.get("x", 0)))
+                    coords.append(int(pt.get("y", 0)))
+            ops.append(op)
+        return cls(ops, coords, int(path.get("w", 0)), int(path.get("h", 0)))
+
+    @classmethod
+    def from_dict(cls, path):
+        """Rebuild arrays from the export view ({'path_width', 'path_height', 'commands'})"""
+        ops, coords = array("B"), []
+        for cmd in path.get("commands", []):
+            op = _NAME_OPS.get(cmd.get("type"))
+            if op is None:
+                continue
+            if op == CUBIC_BEZ_TO:
+                coords += (cmd["x1"], cmd["y1"], cmd["x2"], cmd["y2"], cmd["x"], cmd["y"])
+            elif op == QUAD_BEZ_TO:
+                coords += (cmd["x1"], cmd["y1"], cmd["x"], cmd["y"])
+            elif op != CLOSE:
+                coords += (cmd["x"], cmd["y"])
+            ops.append(op)
+        if any(isinstance(c, float) for c in coords):
+            coords = array("d", coords)
+        else:
+            coords = array("q", coords)
+        return cls(ops, coords, path.get("path_width", 0), path.get("path_height", 0))
+
+    def __len__(self):
+        return len(self.ops)
+
+    def point_count(self):
+        return len(self.coords) // 2
+
+    def bounds(self):
+        """(x0, y0, x1, y1) over every point, control points included; None for an empty path"""
+        if not len(self.coords):
+            return None
+        xs, ys = self.coords[0::2], self.coords[1::2]
+        return int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))
+
+    def to_slide(self, transform):
+        """
+        Scale path-space coordinates into the shape's slide frame:
+        offset + (coord / path_size) * frame_size, truncated to int.
+        A zero path size collapses that axis onto the frame offset.
+        """
+        ox, oy = transform["x"], transform["y"]
+        sx, sy = transform["width"], transform["height"]
+        pw, ph = self.width, self.height
+        if np is not None:
+            xy = np.asarray(self.coords, dtype=np.float64).reshape(-1, 2)
+            out = np.empty(xy.shape, dtype=np.int64)
+            out[:, 0] = np.trunc(ox + (xy[:, 0] / pw) * sx) if pw else ox
+            out[:, 1] = np.trunc(oy + (xy[:, 1] / ph) * sy) if ph else oy
+            coords = out.reshape(-1)
+        else:
+            xs, ys = self.coords[0::2], self.coords[1::2]
+            xs = [int(ox + (x / pw) * sx) for x in xs] if pw else [ox] * len(xs)
+            ys = [int(oy + (y / ph) * sy) for y in ys] if ph else [oy] * len(ys)
+            coords = array("q", [0]) * (len(xs) * 2)
+            coords[0::2], coords[1::2] = array("q", xs), array("q", ys)
+        return PathGeometry(self.ops, coords, pw, ph)
+
+    def affine(self, matrix):
+        """Apply an SVG-style (a, b, c, d, e, f) matrix to every point, rounding to int"""
+        return PathGeometry(self.ops, affine_coords(self.coords, matrix), self.width, self.height)
+
+    def flatten(self, tolerance):
+        """
+        Polyline approximation of the path: a list of (points, closed) subpaths
+        where points is a flat [x0, y0, x1, y1, ...] list of floats. Curves are
+        split into enough segments (Wang's formula) to stay within tolerance.
+        """
+        coords = self.coords.tolist()
+        subpaths, points, closed = [], [], False
+        start, i = None, 0
+        for op in self.ops:
+            if op == MOVE_TO:
+                if len(points) > 2:
+                    subpaths.append((points, closed))
+                points, closed = [float(coords[i]), float(coords[i + 1])], False
+                start = (points[0], points[1])
+            elif op == CLOSE:
+                if points:
+                    subpaths.append((points, True))
+                points = [start[0], start[1]] if start else []
+            else:
+                if not points:
+                    # drawing without a preceding moveTo starts at its first point
+                    points = [float(coords[i]), float(coords[i + 1])]
+                    start = (points[0], points[1])
+                if op == LINE_TO:
+                    points += (coords[i], coords[i + 1])
+                else:
+                    _flatten_bezier(points, coords[i:i + 2 * OP_POINTS[op]], tolerance)
+            i += 2 * OP_POINTS[op]
+        if len(points) > 2:
+            subpaths.append((points, closed))
+        return subpaths
+
+    def commands(self):
+        """Export view: the per-command dicts used in *_precise_paths.json"""
+        coords = self.coords.tolist()
+        out, i = [], 0
+        for op in self.ops:
+            if op == CLOSE:
+                out.append({"type": "close"})
+            elif op == CUBIC_BEZ_TO:
+                x1, y1, x2, y2, x, y = coords[i:i + 6]
+                out.append({"type": "cubicBezTo", "x1": x1, "y1": y1, "x2": x2, "y2": y2, "x": x, "y": y})
+            elif op == QUAD_BEZ_TO:
+                x1, y1, x, y = coords[i:i + 4]
+                out.append({"type": "quadBezTo", "x1": x1, "y1": y1, "x": x, "y": y})
+            else:
+                out.append({"type": OP_NAMES[op], "x": coords[i], "y": coords[i + 1]})
+            i += 2 * OP_POINTS[op]
+        return out
+
+    def to_dict(self):
+        """Export view of the whole path as stored in region['path_data']"""
+        return {"path_width": self.width, "path_height": self.height, "commands": self.commands()}
+
+
+def affine_coords(coords, matrix, rounded=True):
+    """
+    x' = a*x + c*y + e, y' = b*x + d*y + f over a flat coordinate array,
+    rounded half-to-even to int unless rounded is False (NumPy when
+    available, identical results without).
+    """
+    a, b, c, d, e, f = matrix
+    if np is not None:
+        xy = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        finish = np.rint if rounded else np.asarray
+        out = np.empty(xy.shape, dtype=np.int64 if rounded else np.float64)
+        out[:, 0] = finish(a * xy[:, 0] + c * xy[:, 1] + e)
+        out[:, 1] = finish(b * xy[:, 0] + d * xy[:, 1] + f)
+        return out.reshape(-1)
+    xs, ys = coords[0::2], coords[1::2]
+    finish = round if rounded else float
+    out = array("q" if rounded else "d", [0]) * len(coords)
+    out[0::2] = array(out.typecode, [finish(a * x + c * y + e) for x, y in zip(xs, ys)])
+    out[1::2] = array(out.typecode, [finish(b * x + d * y + f) for x, y in zip(xs, ys)])
+    return out
+
+
+def _flatten_bezier(points, ctrl, tolerance):
+    """Append the segments of a quadratic or cubic Bezier starting at points[-2:]"""
+    px, py = points[-2], points[-1]
+    xs, ys = [px] + ctrl[0::2], [py] + ctrl[1::2]
+    degree = len(xs) - 1
+    # Wang's formula: n = sqrt(d(d-1)/8 * max |second difference| / tolerance)
+    dd = max(math.hypot(xs[k] - 2 * xs[k + 1] + xs[k + 2], ys[k] - 2 * ys[k + 1] + ys[k + 2])
+             for k in range(degree - 1))
+    n = max(1, math.ceil(math.sqrt(degree * (degree - 1) / 8 * dd / max(tolerance, 1e-9))))
+    for step in range(1, n + 1):
+        t = step / n
+        u = 1 - t
+        if degree == 2:
+            a, b, c = u * u, 2 * u * t, t * t
+            points += (a * xs[0] + b * xs[1] + c * xs[2], a * ys[0] + b * ys[1] + c * ys[2])
+        else:
+            a, b, c, d = u * u * u, 3 * u * u * t, 3 * u * t * t, t * t * t
+            points += (a * xs[0] + b * xs[1] + c * xs[2] + d * xs[3],
+                       a * ys[0] + b * ys[1] + c * ys[2] + d * ys[3])
@@ -0,0 +1,307 @@
+"""
+Instrumentation and progress logging for the data_extraction scripts.
+Extractors wrap their work in stage() blocks (parse, shape_scan, path_parse,
+graph_build, label_trace, serialize, write) and bump count() counters
+(shapes, points, edges, bytes_written, ...). Both are no-ops until a CLI is
+run with --profile, which then records wall and CPU time per stage (wall_s
+includes nested stages, self_wall_s does not), the tracemalloc peak reached
+inside each stage, and one trace event per stage call, and writes
+
+    {prefix}.profile.json   totals per stage and counter
+    {prefix}.trace.json     Chrome trace events (chrome://tracing, Perfetto)
+
+Work done in map_slides worker processes is collected with each result and
+merged into the parent's report. Progress messages go through the
+"data_extraction" logger; --quiet keeps only warnings and errors.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+REPORT_FORMAT = 1
+STAGES = ("parse", "shape_scan", "path_parse", "graph_build", "label_trace", "serialize", "write")
+
+log = logging.getLogger("data_extraction")
+
+_active = None
+_NULL_STAGE = nullcontext()
+
+
+def _new_totals():
+    return {"calls": 0, "wall_s": 0.0, "self_wall_s": 0.0, "cpu_s": 0.0, "peak_bytes": 0}
+
+
+class Profiler:
+    """Per-stage wall/CPU time, tracemalloc peaks, counters and trace events of one process"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.pid = os.getpid()
+        self.stages = {}
+        self.counters = Counter()
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started = (time.perf_counter(), time.process_time())
+        self._owns_tracemalloc = False
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+    def stop(self):
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+            self._owns_tracemalloc = False
+
+    @property
+    def _open(self):
+        """This thread's open stage frames, innermost last"""
+        frames = getattr(self._local, "frames", None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def _fold_peak(self):
+        """Credit the peak since the last reset to every open stage"""
+        if self._owns_tracemalloc or (self.trace_memory and tracemalloc.is_tracing()):
+            peak = tracemalloc.get_traced_memory()[1]
+            for frame in self._open:
+                frame[2] = max(frame[2], peak)
+            tracemalloc.reset_peak()
+
+    def begin(self, name, args=None):
+        self._fold_peak()
+        # [name, args, tracemalloc peak, wall start, cpu start, wall spent in nested stages]
+        frame = [name, args, 0, time.perf_counter(), time.process_time(), 0.0]
+        self._open.append(frame)
+        return frame
+
+    def end(self, frame):
+        wall, cpu = time.perf_counter() - frame[3], time.process_time() - frame[4]
+        self._fold_peak()
+        # frames close in LIFO order, but compare by identity regardless
+        for i in range(len(self._open) - 1, -1, -1):
+            if self._open[i] is frame:
+                del self._open[i]
+                break
+        if self._open:
+            self._open[-1][5] += wall
+        name = frame[0]
+        event = {"name": name, "cat": "stage", "ph": "X", "ts": frame[3] * 1e6, "dur": wall * 1e6,
+                 "pid": self.pid, "tid": threading.get_native_id()}
+        if frame[1]:
+            event["args"] = frame[1]
+        with self._lock:
+            totals = self.stages.setdefault(name, _new_totals())
+            totals["calls"] += 1
+            totals["wall_s"] += wall
+            totals["self_wall_s"] += wall - frame[5]
+            totals["cpu_s"] += cpu
+            totals["peak_bytes"] = max(totals["peak_bytes"], frame[2])
+            self.events.append(event)
+
+    @contextmanager
+    def stage(self, name, **args):
+        frame = self.begin(name, args)
+        try:
+            yield
+        finally:
+            self.end(frame)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def snapshot(self, reset=False):
+        """Picklable state, for handing a worker's measurements back to the parent"""
+        with self._lock:
+            snap = {"pid": self.pid, "stages": self.stages, "counters": dict(self.counters), "events": self.events}
+            if reset:
+                self.stages, self.counters, self.events = {}, Counter(), []
+        return snap
+
+    def merge(self, snap):
+        with self._lock:
+            self._merge(snap)
+
+    def _merge(self, snap):
+        for name, theirs in snap["stages"].items():
+            totals = self.stages.setdefault(name, _new_totals())
+            totals["calls"] += theirs["calls"]
+            totals["wall_s"] += theirs["wall_s"]
+            totals["self_wall_s"] += theirs["self_wall_s"]
+            totals["cpu_s"] += theirs["cpu_s"]
+            totals["peak_bytes"] = max(totals["peak_bytes"], theirs["peak_bytes"])
+        self.counters.update(snap["counters"])
+        self.events.extend(snap["events"])
+
+    def report(self, name):
+        """The JSON report: run totals, then stages in pipeline order, then counters"""
+        wall = time.perf_counter() - self._started[0]
+        cpu = time.process_time() - self._started[1]
+        peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        return {
+            "format": REPORT_FORMAT,
+            "name": name,
+            "argv": sys.argv,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "worker_pids": sorted({e["pid"] for e in self.events} - {self.pid}),
+            "tracemalloc_peak_bytes": max([peak or 0] + [s["peak_bytes"] for s in self.stages.values()])
+            if self.trace_memory else None,
+            "stages": {stage: {k: round(v, 6) if isinstance(v, float) else v for k, v in totals.items()}
+                       for stage, totals in sorted(self.stages.items(), key=lambda kv: (order.get(kv[0], 99), kv[0]))},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def trace(self, name):
+        """Chrome trace-event document with timestamps relative to the start of the run"""
+        origin = self._started[0] * 1e6
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                   "args": {"name": name if pid == self.pid else f"{name} worker {pid}"}}
+                  for pid in sorted({e["pid"] for e in self.events} | {self.pid})]
+        for event in sorted(self.events, key=lambda e: e["ts"]):
+            events.append(dict(event, ts=round(event["ts"] - origin, 3), dur=round(event["dur"], 3)))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, prefix, name):
+        """Write {prefix}.profile.json and {prefix}.trace.json; returns their paths"""
+        directory = os.path.dirname(os.path.abspath(prefix))
+        os.makedirs(directory, exist_ok=True)
+        paths = (f"{prefix}.profile.json", f"{prefix}.trace.json")
+        with open(paths[0], "w", encoding="utf-8") as f:
+            json.dump(self.report(name), f, indent=2)
+        with open(paths[1], "w", encoding="utf-8") as f:
+            json.dump(self.trace(name), f)
+        return paths
+
+
+def active():
+    """The running Profiler, or None when profiling is off"""
+    return _active
+
+
+def enable(trace_memory=True):
+    global _active
+    if _active is None:
+        _active = Profiler(trace_memory)
+        _active.start()
+    return _active
+
+
+def disable():
+    global _active
+    if _active is not None:
+        _active.stop()
+    _active = None
+
+
+def stage(name, **args):
+    """Context manager timing one stage call; free when profiling is off"""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name, **args)
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
+
+
+def timed_iter(name, iterable):
+    """
+    Iterate, booking the time spent producing each item (not consuming it) to
+    stage `name`; for generators that parse as they go. Returns the iterable
+    itself when profiling is off.
+    """
+    if _active is None:
+        return iterable
+    return _timed_iter(_active, name, iter(iterable))
+
+
+def _timed_iter(profiler, name, iterator):
+    while True:
+        frame = profiler.begin(name)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            profiler.end(frame)
+        yield item
+
+
+def configure_logging(quiet=False):
+    """Progress to stdout as plain messages, like the print calls it replaces"""
+    level = logging.WARNING if quiet else logging.INFO
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.propagate = False
+    log.setLevel(level)
+
+
+def add_profile_arguments(parser):
+    """Add the shared --profile and --quiet flags to a CLI parser"""
+    parser.add_argument("--profile", nargs="?", const="extraction", metavar="PREFIX",
+                        help="Record per-stage timings, counters and tracemalloc peaks and write "
+                             "PREFIX.profile.json and PREFIX.trace.json (default prefix: extraction).")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors, not per-slide progress.")
+
+
+@contextmanager
+def profiled(args, name):
+    """
+    Run a CLI body under the options from add_profile_arguments: configures
+    logging, and with --profile records the run and writes its reports.
+    """
+    configure_logging(getattr(args, "quiet", False))
+    prefix = getattr(args, "profile", None)
+    if not prefix:
+        yield None
+        return
+    profiler = enable()
+    try:
+        yield profiler
+    finally:
+        paths = profiler.write(prefix, name)
+        disable()
+        print(f"Profile written to {paths[0]} and {paths[1]}", file=sys.stderr)
+
+
+def worker_state():
+    """What a map_slides worker needs to mirror this process's logging and profiling"""
+    return {"log_level": log.level if log.handlers else None,
+            "profile": _active is not None,
+            "trace_memory": _active.trace_memory if _active is not None else False}
+
+
+def init_worker(state):
+    global _active
+    if state.get("log_level") is not None:
+        configure_logging(state["log_level"] > logging.INFO)
+    # a forked worker inherits the parent's profiler and its events; measure afresh
+    _active = None
+    if state.get("profile"):
+        enable(state.get("trace_memory", True))
+
+
+def collect():
+    """A worker's measurements since the last collect(), or None when profiling is off"""
+    return _active.snapshot(reset=True) if _active is not None else None
+
+
+def merge(snap):
+    if _active is not None and snap is not None:
+        _active.merge(snap)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Compact binary encoding for colored-region files.
+Holds the same data as *_precise_paths.json and the combined
+{bone}_colored_regions.json files, but stores path coordinates as quantized,
+delta-encoded int32 streams and every name/color once in a string table.
+
+Layout (little-endian, every section 4-byte aligned so the coordinate
+streams can be read as Int32Array views without copying):
+
+    header   magic "DBBR", u16 version, u16 layout, i32 quantum,
+             u32 string count, u32 group count, u32 document extras
+    strings  per string: u32 byte length, UTF-8 bytes, padding
+    groups   per group:  u32 extras, u32 region count, then regions
+    region   u32 anatomical_name, u32 color, u32 color_name, u32 shape_id,
+             u32 extras, u32 path count, then paths
+    path     i32 path_width, i32 path_height, u32 op count, u32 coord count,
+             opcodes (u8, padded), coordinates (i32)
+
+String references are indexes into the table, NONE when the key is absent.
+"extras" are compact JSON objects (also in the table) carrying any keys the
+format has no dedicated field for, so a JSON -> binary -> JSON round trip is
+exact when quantum is 1 and the coordinates are integers. Opcodes are the
+path_geometry ones; coordinates are divided by the quantum and rounded, and
+each path stores its first point absolute and every later x and y as the
+difference from the previous x and y.
+"""
+
+import argparse
+import json
+import struct
+import sys
+from array import array
+
+try:
+    from .path_geometry import PathGeometry
+except ImportError:
+    from path_geometry import PathGeometry
+
+MAGIC = b"DBBR"
+FORMAT_VERSION = 1
+NONE = 0xFFFFFFFF
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+# layout: a single slide file ({'colored_regions': [...]}) or a multi-image
+# bone file ({'images': [{'colored_regions': [...]}, ...]})
+LAYOUT_SLIDE, LAYOUT_IMAGES = 0, 1
+
+_HEADER = struct.Struct("<4sHHiIII")
+_REGION = struct.Struct("<6I")
+_PATH = struct.Struct("<iiII")
+_U32 = struct.Struct("<I")
+_REGION_STRINGS = ("anatomical_name", "color", "color_name", "shape_id")
+
+
+class RegionFormatError(ValueError):
+    """Raised for data that is not a colored-region binary file, or that the format cannot hold"""
+
+
+def _pad(n):
+    return -n % 4
+
+
+def _extras_json(obj, skip):
+    extras = {k: v for k, v in obj.items() if k not in skip}
+    if not extras:
+        return None
+    return json.dumps(extras, ensure_ascii=False, separators=(",", ":"))
+
+
+def _quantize(coords, quantum):
+    if not isinstance(coords, array):
+        coords = array("q" if coords.dtype.kind in "iu" else "d", coords.tolist())
+    if quantum == 1 and coords.typecode == "q":
+        return coords
+    return array("q", (int((c / quantum) + 0.5) if c >= 0 else -int((-c / quantum) + 0.5)
+                       for c in coords))
+
+
+def _delta(coords):
+    """First point absolute, then per-axis differences, as the int32 stream"""
+    out = array("q", coords)
+    for i in range(len(out) - 1, 1, -1):
+        out[i] -= coords[i - 2]
+    if out and (min(out) < INT32_MIN or max(out) > INT32_MAX):
+        raise RegionFormatError("path coordinates or their differences do not fit in int32; "
+                                "encode with a larger quantum")
+    return array("i", out)
+
+
+def _undelta(stream):
+    out = array("q", stream)
+    for i in range(2, len(out)):
+        out[i] += out[i - 2]
+    return out
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings, self._index = [], {}
+
+    def ref(self, value):
+        if value is None:
+            return NONE
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+    def to_bytes(self):
+        out = bytearray()
+        for s in self.strings:
+            data = s.encode("utf-8")
+            out += _U32.pack(len(data)) + data + b"\0" * _pad(len(data))
+        return out
+
+
+def encode_regions(data, quantum=1):
+    """Encode a slide or multi-image colored-region dict to bytes"""
+    if quantum < 1:
+        raise ValueError("quantum must be a positive integer")
+    if "images" in data:
+        layout, groups = LAYOUT_IMAGES, data["images"]
+        doc_extras = _extras_json(data, ("images",))
+    else:
+        layout, groups = LAYOUT_SLIDE, [data]
+        doc_extras = None
+
+    strings = _StringTable()
+    doc_ref = strings.ref(doc_extras)
+    body = bytearray()
+    for group in groups:
+        regions = group.get("colored_regions", [])
+        body += struct.pack("<II", strings.ref(_extras_json(group, ("colored_regions",))), len(regions))
+        for region in regions:
+            paths = region.get("path_data", [])
+            refs = [strings.ref(region[k]) if region.get(k) is not None else NONE
+                    for k in _REGION_STRINGS]
+            extras = _extras_json(region, _REGION_STRINGS + ("path_data",))
+            body += _REGION.pack(*refs, strings.ref(extras), len(paths))
+            for path in paths:
+                geometry = path if isinstance(path, PathGeometry) else PathGeometry.from_dict(path)
+                stream = _delta(_quantize(geometry.coords, quantum))
+                if not (INT32_MIN <= geometry.width <= INT32_MAX and INT32_MIN <= geometry.height <= INT32_MAX):
+                    raise RegionFormatError(f"path size {geometry.width}x{geometry.height} does not fit in int32")
+                body += _PATH.pack(geometry.width, geometry.height, len(geometry.ops), len(stream))
+                body += bytes(geometry.ops) + b"\0" * _pad(len(geometry.ops))
+                if sys.byteorder != "little":
+                    stream.byteswap()
+                body += stream.tobytes()
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, layout, quantum,
+                          len(strings.strings), len(groups), doc_ref)
+    return header + bytes(strings.to_bytes()) + bytes(body)
+
+
+class RegionReader:
+    """Decodes a colored-region binary file; paths come back as PathGeometry"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        if len(self.data) < _HEADER.size:
+            raise RegionFormatError("file too short for a colored-region header")
+        magic, version, layout, quantum, n_strings, n_groups, doc_ref = _HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise RegionFormatError("not a colored-region file (bad magic)")
+        if version != FORMAT_VERSION:
+            raise RegionFormatError(f"unsupported colored-region format version {version}")
+        self.layout, self.quantum, self.group_count = layout, quantum, n_groups
+        self._pos = _HEADER.size
+        self.strings = [self._read_string() for _ in range(n_strings)]
+        self._doc_ref = doc_ref
+        self._body = self._pos
+
+    def _u32s(self, n):
+        values = struct.unpack_from(f"<{n}I", self.data, self._pos)
+        self._pos += 4 * n
+        return values
+
+    def _read_string(self):
+        (length,) = self._u32s(1)
+        text = bytes(self.data[self._pos:self._pos + length]).decode("utf-8")
+        self._pos += length + _pad(length)
+        return text
+
+    def string(self, ref):
+        return None if ref == NONE else self.strings[ref]
+
+    def _extras(self, ref):
+        return {} if ref == NONE else json.loads(self.strings[ref])
+
+    def _read_path(self):
+        width, height, n_ops, n_coords = _PATH.unpack_from(self.data, self._pos)
+        self._pos += _PATH.size
+        ops = array("B", self.data[self._pos:self._pos + n_ops])
+        self._pos += n_ops + _pad(n_ops)
+        stream = array("i")
+        stream.frombytes(self.data[self._pos:self._pos + 4 * n_coords])
+        if sys.byteorder != "little":
+            stream.byteswap()
+        self._pos += 4 * n_coords
+        coords = _undelta(stream)
+        if self.quantum != 1:
+            coords = array("q", (c * self.quantum for c in coords))
+        return PathGeometry(ops, coords, width, height)
+
+    def groups(self):
+        """Yield (group extras dict, [(region dict without path_data, [PathGeometry])])"""
+        self._pos = self._body
+        for _ in range(self.group_count):
+            extras_ref, n_regions = self._u32s(2)
+            regions = []
+            for _ in range(n_regions):
+                values = _REGION.unpack_from(self.data, self._pos)
+                self._pos += _REGION.size
+                region = {k: self.string(ref) for k, ref in zip(_REGION_STRINGS, values[:4])
+                          if ref != NONE}
+                region.update(self._extras(values[4]))
+                regions.append((region, [self._read_path() for _ in range(values[5])]))
+            yield self._extras(extras_ref), regions
+
+    def to_dict(self):
+        """The JSON structure the file was encoded from"""
+        groups = []
+        for extras, regions in self.groups():
+            group = dict(extras)
+            group["colored_regions"] = [_region_dict(region, paths) for region, paths in regions]
+            groups.append(group)
+        if self.layout == LAYOUT_SLIDE:
+            return groups[0] if groups else {"colored_regions": []}
+        doc = self._extras(self._doc_ref)
+        doc["images"] = groups
+        return doc
+
+
+def _region_dict(region, paths):
+    out = {}
+    # keep the key order parse_slide writes
+    for key in ("anatomical_name", "color", "color_name", "shape_id"):
+        if key in region:
+            out[key] = region[key]
+    out["path_data"] = [path.to_dict() for path in paths]
+    for key, value in region.items():
+        out.setdefault(key, value)
+    return out
+
+
+def decode_regions(data):
+    """Decode bytes produced by encode_regions back to the JSON structure"""
+    return RegionReader(data).to_dict()
+
+
+def read_regions(path):
+    """Load a colored-region file, binary or JSON, as the JSON structure"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] == MAGIC:
+        return decode_regions(data)
+    return json.loads(data.decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert colored-region files between JSON and the binary format.")
+    parser.add_argument("input_file", help="Path to a colored-region .json or .bin file.")
+    parser.add_argument("output_file", help="Path to write the converted file.")
+    parser.add_argument("--quantum", type=int, default=1,
+                        help="Coordinate quantization step in EMUs when writing binary (default: 1, lossless).")
+    args = parser.parse_args()
+
+    data = read_regions(args.input_file)
+    if args.output_file.endswith(".json"):
+        with open(args.output_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+    else:
+        with open(args.output_file, "wb") as f:
+            f.write(encode_regions(data, args.quantum))
+    print(f"✓ Wrote {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
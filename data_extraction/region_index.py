@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Point-in-region hit testing for colored regions.
+Each image's region paths are flattened to polygons and bucketed into a
+uniform grid. Every non-empty cell stores, per region, the winding number at
+the cell centre and the polygon edges that touch the cell, so a lookup only
+counts the edges crossed between the centre and the query point. Regions are
+filled with the nonzero rule, like the SVG overlay; when regions overlap, the
+last one drawn wins.
+"""
+
+import argparse
+import bisect
+import json
+import math
+
+try:
+    from .path_geometry import PathGeometry
+    from .region_codec import read_regions
+except ImportError:
+    from path_geometry import PathGeometry
+    from region_codec import read_regions
+
+INDEX_FORMAT = 1
+DEFAULT_TOLERANCE = 1000   # EMUs; well under a screen pixel at typical sizes
+MAX_GRID = 512
+_REGION_KEYS = ("anatomical_name", "color", "color_name", "shape_id", "hyperlink_target")
+
+
+def _orient(ax, ay, bx, by, cx, cy):
+    return (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+
+
+def _crossing(edge, cx, cy, px, py):
+    """Winding change when moving from (cx, cy) to (px, py) across edge, else 0"""
+    ax, ay, bx, by = edge
+    # the segment must straddle the edge's line...
+    oc, op = _orient(ax, ay, bx, by, cx, cy), _orient(ax, ay, bx, by, px, py)
+    if (oc > 0) == (op > 0):
+        return 0
+    # ...and the edge must straddle the segment's line (half-open at the vertices)
+    if (_orient(cx, cy, px, py, ax, ay) > 0) == (_orient(cx, cy, px, py, bx, by) > 0):
+        return 0
+    return 1 if op > 0 else -1
+
+
+class HitIndex:
+    """Uniform-grid point-in-region index over one image's colored regions"""
+
+    def __init__(self, regions, edges, origin, cell_size, cols, rows, cells, extras=None):
+        self.regions = regions          # per region: name/color/shape_id/bbox
+        self.edges = edges              # (x1, y1, x2, y2) per edge id
+        self.origin = origin
+        self.cell_size = cell_size
+        self.cols, self.rows = cols, rows
+        self.cells = cells              # cell id -> [(region, centre winding, edge ids)]
+        self.extras = extras or {}
+
+    @classmethod
+    def build(cls, regions, tolerance=DEFAULT_TOLERANCE, extras=None):
+        """Index a list of region dicts (with path_data) as written by parse_slide"""
+        infos, polygons = [], []
+        for number, region in enumerate(regions):
+            edges = []
+            for path in region.get("path_data", []):
+                geometry = path if isinstance(path, PathGeometry) else PathGeometry.from_dict(path)
+                for points, _ in geometry.flatten(tolerance):
+                    pts = [round(v) for v in points]
+                    n = len(pts) // 2
+                    # every subpath is filled as if closed
+                    for k in range(n):
+                        j = (k + 1) % n
+                        if (pts[2 * k], pts[2 * k + 1]) != (pts[2 * j], pts[2 * j + 1]):
+                            edges.append((pts[2 * k], pts[2 * k + 1], pts[2 * j], pts[2 * j + 1]))
+            info = {k: region[k] for k in _REGION_KEYS if k in region}
+            info["index"] = number
+            if edges:
+                xs = [e[0] for e in edges] + [e[2] for e in edges]
+                ys = [e[1] for e in edges] + [e[3] for e in edges]
+                info["bbox"] = [min(xs), min(ys), max(xs), max(ys)]
+            infos.append(info)
+            polygons.append(edges)
+
+        all_edges = [e for edges in polygons for e in edges]
+        if not all_edges:
+            return cls(infos, [], (0, 0), 1, 0, 0, {}, extras)
+        x0 = min(min(e[0], e[2]) for e in all_edges)
+        y0 = min(min(e[1], e[3]) for e in all_edges)
+        x1 = max(max(e[0], e[2]) for e in all_edges)
+        y1 = max(max(e[1], e[3]) for e in all_edges)
+        # roughly one edge per cell, capped at MAX_GRID cells per axis
+        cell = max(1, math.ceil(math.sqrt(max(1, (x1 - x0) * (y1 - y0)) / len(all_edges))))
+        cell = max(cell, math.ceil((x1 - x0 + 1) / MAX_GRID), math.ceil((y1 - y0 + 1) / MAX_GRID))
+        cols, rows = (x1 - x0) // cell + 1, (y1 - y0) // cell + 1
+
+        cells, edge_ids = {}, 0
+        for number, edges in enumerate(polygons):
+            if not edges:
+                continue
+            ids = range(edge_ids, edge_ids + len(edges))
+            edge_ids += len(edges)
+            touching = {}
+            for eid, (ax, ay, bx, by) in zip(ids, edges):
+                for row in range((min(ay, by) - y0) // cell, (max(ay, by) - y0) // cell + 1):
+                    for col in range((min(ax, bx) - x0) // cell, (max(ax, bx) - x0) // cell + 1):
+                        touching.setdefault(row * cols + col, []).append(eid)
+
+            # Winding number at each cell centre by scanline: edges crossing the
+            # centre row, sorted by x, with suffix sums of their directions
+            bx0, by0, bx1, by1 = infos[number]["bbox"]
+            for row in range((by0 - y0) // cell, (by1 - y0) // cell + 1):
+                cy = y0 + (row + 0.5) * cell
+                hits = []
+                for ax, ay, bx, by in edges:
+                    if (ay <= cy) != (by <= cy):
+                        hits.append((ax + (cy - ay) * (bx - ax) / (by - ay), 1 if by > ay else -1))
+                hits.sort()
+                xs = [h[0] for h in hits]
+                suffix = [0] * (len(hits) + 1)
+                for k in range(len(hits) - 1, -1, -1):
+                    suffix[k] = suffix[k + 1] + hits[k][1]
+                for col in range((bx0 - x0) // cell, (bx1 - x0) // cell + 1):
+                    cid = row * cols + col
+                    winding = suffix[bisect.bisect_right(xs, x0 + (col + 0.5) * cell)]
+                    crossing = touching.get(cid)
+                    if winding or crossing:
+                        cells.setdefault(cid, []).append((number, winding, tuple(crossing or ())))
+        return cls(infos, all_edges, (x0, y0), cell, cols, rows, cells, extras)
+
+    def _cell(self, x, y):
+        col = int((x - self.origin[0]) // self.cell_size)
+        row = int((y - self.origin[1]) // self.cell_size)
+        if not (0 <= col < self.cols and 0 <= row < self.rows):
+            return None, 0, 0
+        return row * self.cols + col, col, row
+
+    def locate_all(self, x, y):
+        """Every region containing (x, y), bottom to top"""
+        cid, col, row = self._cell(x, y)
+        if cid is None or cid not in self.cells:
+            return []
+        cx = self.origin[0] + (col + 0.5) * self.cell_size
+        cy = self.origin[1] + (row + 0.5) * self.cell_size
+        found = []
+        for number, winding, edge_ids in self.cells[cid]:
+            for eid in edge_ids:
+                winding += _crossing(self.edges[eid], cx, cy, x, y)
+            if winding:
+                found.append(self.regions[number])
+        return found
+
+    def locate(self, x, y):
+        """The topmost region containing (x, y), or None"""
+        found = self.locate_all(x, y)
+        return found[-1] if found else None
+
+    def to_dict(self):
+        out = dict(self.extras)
+        out.update({
+            "origin": list(self.origin),
+            "cell_size": self.cell_size,
+            "cols": self.cols,
+            "rows": self.rows,
+            "regions": self.regions,
+            "edges": [v for edge in self.edges for v in edge],
+            "cells": {str(cid): [[number, winding, list(ids)] for number, winding, ids in entries]
+                      for cid, entries in sorted(self.cells.items())},
+        })
+        return out
+
+    @classmethod
+    def from_dict(cls, data):
+        flat = data["edges"]
+        edges = [tuple(flat[k:k + 4]) for k in range(0, len(flat), 4)]
+        cells = {int(cid): [(number, winding, tuple(ids)) for number, winding, ids in entries]
+                 for cid, entries in data["cells"].items()}
+        known = ("origin", "cell_size", "cols", "rows", "regions", "edges", "cells")
+        return cls(data["regions"], edges, tuple(data["origin"]), data["cell_size"],
+                   data["cols"], data["rows"], cells, {k: v for k, v in data.items() if k not in known})
+
+
+def build_hit_indexes(data, tolerance=DEFAULT_TOLERANCE):
+    """One HitIndex per image of a slide file or a multi-image bone file"""
+    if "images" in data:
+        return [HitIndex.build(image.get("colored_regions", []), tolerance,
+                               {k: v for k, v in image.items() if k != "colored_regions"})
+                for image in data["images"]]
+    return [HitIndex.build(data.get("colored_regions", []), tolerance,
+                           {"slide_number": data.get("slide_number")})]
+
+
+def hit_index_dict(indexes, tolerance=DEFAULT_TOLERANCE):
+    """Serializable form of build_hit_indexes' result"""
+    return {"format": INDEX_FORMAT, "tolerance_emu": tolerance,
+            "images": [index.to_dict() for index in indexes]}
+
+
+def load_hit_indexes(path):
+    """Read a saved index file back into HitIndex objects, one per image"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format") != INDEX_FORMAT:
+        raise ValueError(f"unsupported hit index format {data.get('format')}")
+    return [HitIndex.from_dict(image) for image in data["images"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query a point-in-region hit index for colored regions.")
+    parser.add_argument("input_file", help="Colored-region file (.json or .bin) to index, or a saved *_hit_index.json with --locate.")
+    parser.add_argument("output_file", nargs="?", help="Where to write the index (JSON).")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Curve flattening tolerance in EMUs (default: 1000).")
+    parser.add_argument("--locate", nargs=2, type=float, metavar=("X", "Y"),
+                        help="Print the region at slide coordinates X Y (EMUs).")
+    parser.add_argument("--image", type=int, default=0, help="Image position in the file for --locate (default: 0).")
+    args = parser.parse_args()
+
+    data = read_regions(args.input_file)
+    if "tolerance_emu" in data and "format" in data:
+        indexes = load_hit_indexes(args.input_file)
+    else:
+        indexes = build_hit_indexes(data, args.tolerance)
+
+    if args.output_file:
+        with open(args.output_file, "w", encoding="utf-8") as f:
+            json.dump(hit_index_dict(indexes, args.tolerance), f, ensure_ascii=False, separators=(",", ":"))
+        print(f"✓ Wrote hit index: {args.output_file}")
+    if args.locate:
+        region = indexes[args.image].locate(*args.locate)
+        print(json.dumps(region, ensure_ascii=False) if region else "No region at that point")
+
+
+if __name__ == "__main__":
+    main()
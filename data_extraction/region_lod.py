@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Level-of-detail generation for colored-region paths.
+Each level flattens the Bezier curves into polylines, simplifies them with
+Ramer-Douglas-Peucker at a pixel tolerance, and drops subpaths that collapse
+to a line or a sliver. Level files keep the *_precise_paths.json structure
+(moveTo/lineTo/close commands), so the overlay can draw any level as-is;
+level 0 is the coarsest. Every region also carries its bounding box.
+"""
+
+import argparse
+import json
+import os
+
+try:
+    from .path_geometry import PathGeometry
+    from .region_codec import read_regions
+except ImportError:
+    from path_geometry import PathGeometry
+    from region_codec import read_regions
+
+DEFAULT_TOLERANCES = (8.0, 2.0, 0.5)   # pixels, coarse to fine
+DEFAULT_REFERENCE_WIDTH = 1920          # pixels the slide width is assumed to render at
+
+
+def parse_tolerances(text):
+    """'8,2,0.5' -> (8.0, 2.0, 0.5), ordered coarse to fine"""
+    values = [float(v) for v in text.split(",") if v.strip()]
+    if any(v <= 0 for v in values):
+        raise ValueError("LOD tolerances must be positive")
+    return tuple(sorted(set(values), reverse=True))
+
+
+def _segment_dist2(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    if length2:
+        t = ((px - ax) * dx + (py - ay) * dy) / length2
+        t = 0.0 if t < 0 else 1.0 if t > 1 else t
+        ax, ay = ax + t * dx, ay + t * dy
+    return (px - ax) ** 2 + (py - ay) ** 2
+
+
+def simplify(points, tolerance, closed=False):
+    """
+    Ramer-Douglas-Peucker over a flat [x0, y0, ...] polyline. A closed ring is
+    anchored at its first point and the point farthest from it, so it cannot
+    collapse onto a single segment. Returns the kept points, flat.
+    """
+    xs, ys = points[0::2], points[1::2]
+    n = len(xs)
+    if closed and n > 1 and xs[0] == xs[-1] and ys[0] == ys[-1]:
+        xs, ys, n = xs[:-1], ys[:-1], n - 1
+    if n < 3:
+        return list(points[:2 * n])
+    if closed:
+        far = max(range(1, n), key=lambda k: (xs[k] - xs[0]) ** 2 + (ys[k] - ys[0]) ** 2)
+        xs, ys = xs + [xs[0]], ys + [ys[0]]
+        stack = [(0, far), (far, n)]
+    else:
+        stack = [(0, n - 1)]
+
+    keep = [False] * len(xs)
+    keep[0] = keep[-1] = True
+    for i, j in stack:
+        keep[i] = keep[j] = True
+    tol2 = tolerance * tolerance
+    while stack:
+        i, j = stack.pop()
+        best, best_d2 = -1, tol2
+        ax, ay, bx, by = xs[i], ys[i], xs[j], ys[j]
+        for k in range(i + 1, j):
+            d2 = _segment_dist2(xs[k], ys[k], ax, ay, bx, by)
+            if d2 > best_d2:
+                best, best_d2 = k, d2
+        if best >= 0:
+            keep[best] = True
+            stack.append((i, best))
+            stack.append((best, j))
+
+    kept = []
+    for k in range(n):
+        if keep[k]:
+            kept += (xs[k], ys[k])
+    return kept
+
+
+def ring_area(points):
+    """Unsigned shoelace area of a flat point list treated as a closed ring"""
+    xs, ys = points[0::2], points[1::2]
+    n = len(xs)
+    twice = sum(xs[k] * ys[(k + 1) % n] - xs[(k + 1) % n] * ys[k] for k in range(n))
+    return abs(twice) / 2
+
+
+def bounding_box(subpaths):
+    """[min_x, min_y, max_x, max_y] over flat point lists, rounded outward to ints"""
+    xs = [x for points in subpaths for x in points[0::2]]
+    ys = [y for points in subpaths for y in points[1::2]]
+    if not xs:
+        return None
+    return [int(min(xs) // 1), int(min(ys) // 1), -int(-max(xs) // 1), -int(-max(ys) // 1)]
+
+
+def _commands(points, closed):
+    cmds = [{"type": "moveTo", "x": round(points[0]), "y": round(points[1])}]
+    for k in range(2, len(points), 2):
+        cmds.append({"type": "lineTo", "x": round(points[k]), "y": round(points[k + 1])})
+    if closed:
+        cmds.append({"type": "close"})
+    return cmds
+
+
+def build_levels(slide_data, tolerances=DEFAULT_TOLERANCES, reference_width=DEFAULT_REFERENCE_WIDTH):
+    """
+    LOD level dicts (coarse to fine) for one slide's data. Tolerances are in
+    pixels at reference_width; they are converted to EMUs with the slide width.
+    Curves are flattened once at half the finest tolerance and each level is
+    simplified with the remainder, so every level stays within its tolerance.
+    """
+    tolerances = tuple(sorted(tolerances, reverse=True))
+    if not tolerances:
+        return []
+    emu_per_px = slide_data["image_dimensions"]["width"] / reference_width
+    flat_tol = tolerances[-1] * emu_per_px / 2
+
+    # Flatten every region once; keep the open/closed flag per subpath
+    flattened = []
+    for region in slide_data["colored_regions"]:
+        subpaths = []
+        for path in region.get("path_data", []):
+            geometry = path if isinstance(path, PathGeometry) else PathGeometry.from_dict(path)
+            subpaths.extend(geometry.flatten(flat_tol))
+        flattened.append((region, subpaths, bounding_box([p for p, _ in subpaths])))
+
+    levels = []
+    for level, tol_px in enumerate(tolerances):
+        tol = tol_px * emu_per_px
+        regions = []
+        for region, subpaths, bbox in flattened:
+            path_data = []
+            for points, closed in subpaths:
+                kept = simplify(points, max(tol - flat_tol, 0.0), closed)
+                # Cull subpaths that collapse to a point, a line or a sliver at this tolerance
+                if len(kept) < 6 or ring_area(kept) <= tol * tol:
+                    continue
+                path_data.append({"path_width": 0, "path_height": 0, "commands": _commands(kept, closed)})
+            if not path_data:
+                continue
+            out = {k: v for k, v in region.items() if k != "path_data"}
+            out["path_data"] = path_data
+            out["bbox"] = bbox
+            regions.append(out)
+        levels.append({
+            "slide_number": slide_data.get("slide_number"),
+            "image_dimensions": slide_data["image_dimensions"],
+            "lod": {
+                "level": level,
+                "levels": len(tolerances),
+                "tolerance_px": tol_px,
+                "tolerance_emu": round(tol, 3),
+                "reference_width_px": reference_width,
+            },
+            "colored_regions": regions,
+        })
+    return levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write level-of-detail files for a *_precise_paths.json file.")
+    parser.add_argument("input_file", help="Path to a slide's precise paths JSON (or .bin) file.")
+    parser.add_argument("output_dir", help="Directory to write {stem}_lod{N}.json files to.")
+    parser.add_argument("--tolerances", default=",".join(str(t) for t in DEFAULT_TOLERANCES),
+                        help="Comma-separated pixel tolerances, one per level (default: 8,2,0.5).")
+    parser.add_argument("--reference-width", type=int, default=DEFAULT_REFERENCE_WIDTH,
+                        help="Pixel width the slide is assumed to render at (default: 1920).")
+    args = parser.parse_args()
+
+    slide_data = read_regions(args.input_file)
+    stem = os.path.basename(args.input_file).rsplit(".", 1)[0]
+    os.makedirs(args.output_dir, exist_ok=True)
+    for level in build_levels(slide_data, parse_tolerances(args.tolerances), args.reference_width):
+        out = os.path.join(args.output_dir, f"{stem}_lod{level['lod']['level']}.json")
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(level, f, indent=2, ensure_ascii=False)
+        print(f"✓ Level {level['lod']['level']}: {len(level['colored_regions'])} regions -> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Precomputed search index for the bone search box.
+Indexes boneset, bone and sub-bone names, the sub-bone labels traced by
+extract_text_labels (subbone_name) and description text, so a query costs a
+binary search plus a few postings-list lookups instead of lowercasing and
+scanning every name twice as server.js's searchItems does.
+
+The index holds:
+    docs       the result records ({id, name, type, boneset, bone, subbone})
+    names      normalized name per doc; texts: normalized description per doc
+    prefixes   sorted [name, doc] pairs, and word_prefixes sorted [key, doc]
+               pairs for every later word start of a name, for ranked prefix
+               hits by bisection
+    grams      {"2": {...}, "3": {...}} bigram/trigram postings over names,
+               and "text_grams" trigram postings over descriptions, for
+               substring candidates and typo-tolerant (trigram Dice) matching
+
+SearchIndex.search is the reference query implementation. Ranking: whole-name
+prefix, then word prefix, then name substring, then description substring,
+then fuzzy name matches; ties by name. Tiers are filled in that order and the
+search stops at the first tier that reaches the limit, so common short
+queries never touch the postings lists.
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+try:
+    from .data_pack import DataPack, collect_entries
+    from .manifest import write_if_changed
+except ImportError:
+    from data_pack import DataPack, collect_entries
+    from manifest import write_if_changed
+
+INDEX_FORMAT = 1
+SEARCH_INDEX_FILENAME = "search_index.json"
+FUZZY_THRESHOLD = 0.45
+_SPACES = re.compile(r"[\s_]+")
+
+
+def normalize(text):
+    """Lowercase, accents stripped, underscores and runs of whitespace as one space"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SPACES.sub(" ", text.lower()).strip()
+
+
+def ngrams(text, n):
+    """Distinct n-grams of the text padded with one space each side"""
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def load_entries(source):
+    """{section: {key: obj}} from a data tree or a data pack file"""
+    if os.path.isdir(source):
+        return collect_entries(source)
+    with DataPack(source) as pack:
+        return {section: {key: pack.get(section, key) for key in pack.keys(section)}
+                for section in pack.sections()}
+
+
+def search_documents(entries):
+    """
+    The searchable records, in the same shape as server.js's searchCache,
+    plus the description text of each record.
+    """
+    docs, texts, seen = [], [], set()
+    descriptions = entries.get("description", {})
+    bones = entries.get("bone", {})
+    annotations = entries.get("annotation", {})
+
+    def add(record):
+        key = (record["type"] if record["type"] != "label" else "subbone", normalize(record["name"]),
+               record["bone"])
+        if not record["name"] or key in seen:
+            return
+        seen.add(key)
+        description = descriptions.get(record["id"]) or {}
+        docs.append(record)
+        texts.append(normalize(" ".join(description.get("description") or [])))
+
+    for boneset in entries.get("boneset", {}).values():
+        boneset_id = boneset.get("id")
+        add({"id": boneset_id, "name": boneset.get("name"), "type": "boneset",
+             "boneset": boneset_id, "bone": None, "subbone": None})
+        for bone_id in boneset.get("bones") or []:
+            bone = bones.get(bone_id)
+            if bone is None:
+                continue
+            add({"id": bone.get("id"), "name": bone.get("name"), "type": "bone",
+                 "boneset": boneset_id, "bone": bone.get("id"), "subbone": None})
+            for sub_id in bone.get("subBones") or []:
+                add({"id": sub_id, "name": sub_id.replace("_", " "), "type": "subbone",
+                     "boneset": boneset_id, "bone": bone.get("id"), "subbone": sub_id})
+            # labels traced on the bone's slides that are not already listed sub-bones
+            for label in (annotations.get(bone_id) or {}).get("text_annotations", []):
+                name = (label.get("subbone_name") or "").strip()
+                label_id = normalize(name).replace(" ", "_")
+                add({"id": label_id, "name": name, "type": "label",
+                     "boneset": boneset_id, "bone": bone.get("id"), "subbone": label_id})
+    return docs, texts
+
+
+def build_index(entries):
+    """Search index dict for the given data entries"""
+    docs, texts = search_documents(entries)
+    names = [normalize(doc["name"]) for doc in docs]
+
+    prefixes = sorted([name, i] for i, name in enumerate(names))
+    word_prefixes = sorted([name[match.start():], i] for i, name in enumerate(names)
+                           for match in re.finditer(r"(?<= )\S", name))
+
+    grams = {"2": {}, "3": {}}
+    for i, name in enumerate(names):
+        for n in (2, 3):
+            for gram in ngrams(name, n):
+                grams[str(n)].setdefault(gram, []).append(i)
+    text_grams = {}
+    for i, text in enumerate(texts):
+        for gram in ngrams(text, 3):
+            text_grams.setdefault(gram, []).append(i)
+
+    return {
+        "format": INDEX_FORMAT,
+        "docs": docs,
+        "names": names,
+        "texts": texts,
+        "prefixes": prefixes,
+        "word_prefixes": word_prefixes,
+        "grams": {n: dict(sorted(postings.items())) for n, postings in grams.items()},
+        "text_grams": dict(sorted(text_grams.items())),
+    }
+
+
+class SearchIndex:
+    """Reference query implementation over a built index dict"""
+
+    def __init__(self, index):
+        if index.get("format") != INDEX_FORMAT:
+            raise ValueError(f"unsupported search index format {index.get('format')}")
+        self.docs = index["docs"]
+        self.names = index["names"]
+        self.texts = index["texts"]
+        self._prefixes = self._split(index["prefixes"])
+        self._word_prefixes = self._split(index["word_prefixes"])
+        self.grams = {int(n): postings for n, postings in index["grams"].items()}
+        self.text_grams = index["text_grams"]
+        self._sizes = None
+
+    @staticmethod
+    def _split(pairs):
+        return [key for key, _ in pairs], [doc for _, doc in pairs]
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _prefix_hits(prefixes, q):
+        """Docs whose key starts with q, in key order"""
+        keys, docs = prefixes
+        for pos in range(bisect_left(keys, q), len(keys)):
+            if not keys[pos].startswith(q):
+                break
+            yield docs[pos]
+
+    @staticmethod
+    def _candidates(postings, grams):
+        """Docs present in every gram's postings list, shortest list first"""
+        lists = sorted((postings.get(g, ()) for g in grams), key=len)
+        if not lists or not lists[0]:
+            return set()
+        found = set(lists[0])
+        for other in lists[1:]:
+            found.intersection_update(other)
+            if not found:
+                break
+        return found
+
+    def search(self, query, limit=20, fuzzy=True):
+        """Ranked result records for a query, each with its 'priority' (1 best)"""
+        q = normalize(query)
+        if not q or limit <= 0:
+            return []
+        ranked, seen = [], set()
+
+        def fill(priority, docs, key=None):
+            """Append one tier's unseen docs in rank order; True once the limit is reached"""
+            fresh = sorted({doc for doc in docs if doc not in seen}, key=key or self.names.__getitem__)
+            for doc in fresh[:limit - len(ranked)]:
+                seen.add(doc)
+                ranked.append((doc, priority))
+            return len(ranked) >= limit
+
+        # whole-name prefixes come out of the sorted array already in name order
+        whole = []
+        for doc in self._prefix_hits(self._prefixes, q):
+            whole.append(doc)
+            if len(whole) >= limit:
+                break
+        if fill(1, whole) or fill(2, self._prefix_hits(self._word_prefixes, q)):
+            return self._records(ranked)
+
+        # substring candidates from the n-grams the query must contain
+        n = 3 if len(q) >= 3 else 2
+        inner = {q[i:i + n] for i in range(len(q) - n + 1)}
+        if fill(3, (doc for doc in self._candidates(self.grams[n], inner) if q in self.names[doc])):
+            return self._records(ranked)
+        if len(q) < 3:
+            return self._records(ranked)
+        if fill(4, (doc for doc in self._candidates(self.text_grams, inner) if q in self.texts[doc])):
+            return self._records(ranked)
+
+        if fuzzy:
+            query_grams = ngrams(q, 3)
+            shared = Counter(chain.from_iterable(self.grams[3].get(g, ()) for g in query_grams))
+            # Dice >= threshold needs at least this many shared trigrams whatever the name's length
+            least = FUZZY_THRESHOLD * len(query_grams) / 2
+            sizes = self._gram_sizes()
+            dice = {doc: 2.0 * count / (len(query_grams) + sizes[doc])
+                    for doc, count in shared.items() if count >= least and doc not in seen}
+            fill(5, (doc for doc, score in dice.items() if score >= FUZZY_THRESHOLD),
+                 key=lambda doc: (-dice[doc], self.names[doc]))
+        return self._records(ranked)
+
+    def _gram_sizes(self):
+        if self._sizes is None:
+            self._sizes = [len(ngrams(name, 3)) for name in self.names]
+        return self._sizes
+
+    def _records(self, ranked):
+        return [dict(self.docs[doc], priority=priority) for doc, priority in ranked]
+
+
+def linear_search(docs, query, limit=20):
+    """Port of server.js searchItems, as the baseline for --benchmark"""
+    q = query.lower().strip()
+    results = [dict(d, priority=1) for d in docs if d["name"] and d["name"].lower().startswith(q)]
+    results += [dict(d, priority=2) for d in docs
+                if d["name"] and not d["name"].lower().startswith(q) and q in d["name"].lower()]
+    results.sort(key=lambda r: (r["priority"], r["name"]))
+    return results[:limit]
+
+
+def build_search_index(source, output_file):
+    """Write the search index for a data tree or pack; returns the index dict"""
+    index = build_index(load_entries(source))
+    write_if_changed(output_file, json.dumps(index, ensure_ascii=False, separators=(",", ":")))
+    return index
+
+
+def _benchmark(index, queries, rounds=200):
+    search = SearchIndex(index)
+    for label, run in (("index", lambda q: search.search(q)),
+                       ("linear", lambda q: linear_search(index["docs"], q))):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for q in queries:
+                run(q)
+        per_query = (time.perf_counter() - start) / (rounds * len(queries)) * 1e6
+        print(f"  {label:>6}: {per_query:8.1f} µs/query over {len(index['docs'])} docs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build (and query) the precomputed bone search index.")
+    parser.add_argument("source", help="Data tree laid out like the data branch, or a data pack file (data_pack.py).")
+    parser.add_argument("output_file", nargs="?", default=SEARCH_INDEX_FILENAME,
+                        help=f"Where to write the index (default: {SEARCH_INDEX_FILENAME}).")
+    parser.add_argument("--query", action="append", help="Run a query against the built index and print the results (repeatable).")
+    parser.add_argument("--limit", type=int, default=20, help="Maximum results per query (default: 20).")
+    parser.add_argument("--benchmark", action="store_true", help="Time the --query strings against a linear scan.")
+    args = parser.parse_args()
+
+    index = build_search_index(args.source, args.output_file)
+    print(f"✓ Indexed {len(index['docs'])} records -> {args.output_file}")
+    search = SearchIndex(index)
+    for q in args.query or []:
+        results = search.search(q, args.limit)
+        print(f"\n{q!r}: {len(results)} result(s)")
+        for r in results:
+            print(f"  [{r['priority']}] {r['name']} ({r['type']}, {r['bone'] or r['boneset']})")
+    if args.benchmark and args.query:
+        print()
+        _benchmark(index, args.query)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+Shared slide model for the data_extraction scripts.
+Parses a slide XML and its relationships once and indexes the elements the
+extractors look up (shapes, pictures, connectors, text runs, blips, hyperlinks).
+iter_shapes is the streaming alternative: it hands over each shape as soon as
+it is complete and then drops it, so memory stays bounded by the largest
+shape rather than the whole slide. Parsing goes through xml_backend (lxml
+when it is installed, ElementTree otherwise).
+"""
+
+import hashlib
+import io
+import os
+import posixpath
+import re
+import shutil
+import zipfile
+from pathlib import Path
+
+try:
+    from . import profiling, xml_backend
+    from .xml_backend import NS
+except ImportError:
+    import profiling
+    import xml_backend
+    from xml_backend import NS
+
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+R_ID_KEY = "{%s}id" % NS["r"]
+R_EMBED_KEY = "{%s}embed" % NS["r"]
+
+_P = "{%s}" % NS["p"]
+_A = "{%s}" % NS["a"]
+_SP, _PIC, _CXN = _P + "sp", _P + "pic", _P + "cxnSp"
+_CNVPR, _T, _R, _BLIP, _HLINK = _P + "cNvPr", _A + "t", _A + "r", _A + "blip", _A + "hlinkClick"
+_SLIDE_FILE_RE = re.compile(r"^slide(\d+)\.xml$")
+_SLIDE_TARGET_RE = re.compile(r"slide(\d+)\.xml")
+
+
+def parse_rels(rels_xml):
+    """Parse a .rels part into a dict of rId -> {"Type", "Target"}"""
+    rels = {}
+    if not rels_xml:
+        return rels
+    root = xml_backend.fromstring(rels_xml)
+    for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        rid = rel.attrib.get("Id")
+        if rid:
+            rels[rid] = {"Type": rel.attrib.get("Type", ""), "Target": rel.attrib.get("Target", "")}
+    return rels
+
+
+class StreamedShape:
+    """
+    A p:sp, p:pic or p:cxnSp from iter_shapes, with its cNvPr id and the text
+    of its a:t elements. The element is only valid until the iterator moves
+    on; it is cleared and detached from the tree after that.
+    """
+
+    __slots__ = ("element", "shape_id", "texts")
+
+    def __init__(self, element, shape_id=None, texts=None):
+        self.element = element
+        self.shape_id = shape_id
+        self.texts = texts if texts is not None else []
+
+    @property
+    def tag(self):
+        return self.element.tag
+
+
+def _stream_shapes(source, kinds):
+    owners = (_SP, _PIC, _CXN)
+    open_shapes, path = [], []
+    for event, el in xml_backend.iterparse(source, events=("start", "end")):
+        if event == "start":
+            path.append(el)
+            if el.tag in owners:
+                open_shapes.append(StreamedShape(el))
+            elif el.tag == _CNVPR and open_shapes and open_shapes[-1].shape_id is None:
+                open_shapes[-1].shape_id = el.get("id")
+            continue
+        path.pop()
+        if el.tag == _T:
+            if open_shapes:
+                open_shapes[-1].texts.append(el.text)
+        elif el.tag in owners:
+            shape = open_shapes.pop()
+            if el.tag in kinds:
+                profiling.count("shapes")
+                yield shape
+            # done with it: drop its subtree and its slot in the parent
+            el.clear()
+            if path:
+                path[-1].remove(el)
+
+
+def iter_shapes(slide, kinds=("sp", "pic", "cxnSp")):
+    """
+    StreamedShapes in document order for the given kinds (local p: names).
+    slide may be a slide XML path or binary stream, which is parsed
+    incrementally with iterparse, or an already parsed SlideDocument.
+    """
+    kinds = {_P + kind for kind in kinds}
+    if isinstance(slide, SlideDocument):
+        return (StreamedShape(el, slide.shape_id(el), [t.text for t in slide.text_elements(el)])
+                for el in slide.root.iter() if el.tag in kinds)
+    # parsing happens while the generator produces each shape, so that time is the parse stage
+    return profiling.timed_iter("parse", _stream_shapes(slide, kinds))
+
+
+class SlideDocument:
+    """A parsed slide with its rels and element indexes, built in a single pass"""
+
+    def __init__(self, root, rels=None, number=None, name=None):
+        self.root = root
+        self.rels = rels or {}
+        self.number = number
+        self.name = name
+
+        self.shapes = []          # p:sp in document order
+        self.pictures = []        # p:pic in document order
+        self.connectors = []      # p:cxnSp in document order
+        self.shapes_by_id = {}    # cNvPr id -> p:sp / p:pic / p:cxnSp
+        self.text_runs = []       # (owner shape, a:r)
+        self.blips = []           # (owner shape or None, embed rId)
+        self.hyperlinks = []      # (owner shape or None, a:hlinkClick)
+        self._shape_ids = {}
+        self._texts = {}
+        with profiling.stage("shape_scan"):
+            self._build_indexes()
+        profiling.count("shapes", len(self.shapes) + len(self.pictures) + len(self.connectors))
+
+    @classmethod
+    def from_bytes(cls, slide_xml, rels_xml=None, number=None, name=None):
+        with profiling.stage("parse"):
+            root, rels = xml_backend.fromstring(slide_xml), parse_rels(rels_xml)
+        return cls(root, rels, number=number, name=name)
+
+    @classmethod
+    def from_file(cls, slide_path, rels_path=None):
+        """Load a slide from disk; rels default to the sibling _rels/slideN.xml.rels"""
+        slide_path = Path(slide_path)
+        if rels_path is None:
+            rels_path = slide_path.parent / "_rels" / f"{slide_path.name}.rels"
+        rels_xml = Path(rels_path).read_bytes() if os.path.exists(rels_path) else None
+        match = _SLIDE_FILE_RE.match(slide_path.name)
+        return cls.from_bytes(slide_path.read_bytes(), rels_xml,
+                              number=int(match.group(1)) if match else None,
+                              name=str(slide_path))
+
+    def _build_indexes(self):
+        owners = (_SP, _PIC, _CXN)
+        stack = [(self.root, None)]
+        while stack:
+            el, owner = stack.pop()
+            tag = el.tag
+            if tag in owners:
+                owner = el
+                self._texts[el] = []
+                if tag == _SP:
+                    self.shapes.append(el)
+                elif tag == _PIC:
+                    self.pictures.append(el)
+                else:
+                    self.connectors.append(el)
+            elif tag == _BLIP:
+                rid = el.get(R_EMBED_KEY)
+                if rid:
+                    self.blips.append((owner, rid))
+            elif tag == _HLINK:
+                self.hyperlinks.append((owner, el))
+            elif owner is not None:
+                if tag == _CNVPR and owner not in self._shape_ids:
+                    shape_id = el.get("id")
+                    self._shape_ids[owner] = shape_id
+                    if shape_id is not None:
+                        self.shapes_by_id.setdefault(shape_id, owner)
+                elif tag == _T:
+                    self._texts[owner].append(el)
+                elif tag == _R:
+                    self.text_runs.append((owner, el))
+            # push children reversed so they pop in document order
+            stack.extend((child, owner) for child in reversed(el))
+
+    def shape_id(self, shape, default=None):
+        """cNvPr id of a p:sp, p:pic or p:cxnSp"""
+        return self._shape_ids.get(shape, default)
+
+    def text_elements(self, shape):
+        """All a:t elements inside a shape, in document order"""
+        return self._texts.get(shape, [])
+
+    def resolve(self, rid):
+        """Relationship target for an rId, or an empty string"""
+        return (self.rels.get(rid) or {}).get("Target", "")
+
+    def target_slide(self, rid):
+        """Slide number a relationship points at, if it points at a slide"""
+        match = _SLIDE_TARGET_RE.search(self.resolve(rid))
+        return int(match.group(1)) if match else None
+
+
+SLIDES_DIR = "ppt/slides"
+MEDIA_DIR = "ppt/media"
+
+
+class _DirectoryParts:
+    """Package parts read from an already-unzipped PowerPoint folder"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.location = str(root)
+        self.source = str(root)
+
+    def names(self, prefix):
+        folder = self.root / prefix
+        if not folder.is_dir():
+            return []
+        return [f"{prefix}/{name}" for name in os.listdir(folder)]
+
+    def has_dir(self, prefix):
+        return (self.root / prefix).is_dir()
+
+    def exists(self, name):
+        return (self.root / name).is_file()
+
+    def read(self, name):
+        return (self.root / name).read_bytes()
+
+    def open(self, name):
+        return open(self.root / name, "rb")
+
+    def path(self, name):
+        return os.path.normpath(os.path.join(self.root, name))
+
+    def copy(self, name, dest):
+        shutil.copy2(self.root / name, dest)
+
+    def size(self, name):
+        return os.path.getsize(self.root / name)
+
+    def stat(self, name):
+        st = os.stat(self.root / name)
+        return st.st_size, st.st_mtime_ns
+
+    def digest(self, name):
+        h = hashlib.sha256()
+        with open(self.root / name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return "sha256:" + h.hexdigest()
+
+
+class _ZipParts:
+    """Package parts streamed straight out of a .pptx archive"""
+
+    def __init__(self, source, location=None):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            self.location = location or "<pptx bytes>"
+            self.source = bytes(source)
+            self.zip = zipfile.ZipFile(io.BytesIO(self.source))
+        elif hasattr(source, "read"):
+            self.location = getattr(source, "name", "<pptx stream>")
+            self.source = None
+            self.zip = zipfile.ZipFile(source)
+        else:
+            self.location = str(source)
+            self.source = str(source)
+            self.zip = zipfile.ZipFile(source)
+        self._names = set(self.zip.namelist())
+        self._digests = {}
+
+    def names(self, prefix):
+        prefix = prefix.rstrip("/") + "/"
+        return [name for name in self._names
+                if name.startswith(prefix) and "/" not in name[len(prefix):]]
+
+    def has_dir(self, prefix):
+        prefix = prefix.rstrip("/") + "/"
+        return any(name.startswith(prefix) for name in self._names)
+
+    def exists(self, name):
+        return name in self._names
+
+    def read(self, name):
+        return self.zip.read(name)
+
+    def open(self, name):
+        return self.zip.open(name)
+
+    def path(self, name):
+        return f"{self.location}/{name}"
+
+    def copy(self, name, dest):
+        with self.zip.open(name) as src, open(dest, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+
+    def size(self, name):
+        return self.zip.getinfo(name).file_size
+
+    def stat(self, name):
+        # the central directory's size, CRC and timestamp move with the member, so they key the digest cache
+        info = self.zip.getinfo(name)
+        return info.file_size, "{:08x}@{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}".format(info.CRC, *info.date_time)
+
+    def digest(self, name):
+        # members cannot change under an open archive, so each is hashed at most once
+        digest = self._digests.get(name)
+        if digest is None:
+            h = hashlib.sha256()
+            with self.zip.open(name) as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+            digest = self._digests[name] = "sha256:" + h.hexdigest()
+        return digest
+
+    def portable_source(self):
+        if self.source is None:
+            # File objects cannot cross a process boundary; hand over the archive bytes
+            fp = self.zip.fp
+            fp.seek(0)
+            self.source = fp.read()
+        return self.source
+
+
+def part_name(base_dir, target):
+    """Resolve a relationship target against the part folder it is relative to"""
+    if target.startswith("/"):
+        return posixpath.normpath(target.lstrip("/"))
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+class SlideDeck:
+    """
+    Lazily loads and caches SlideDocuments for a PowerPoint deck.
+    The source may be an unzipped PowerPoint folder, a .pptx path, the .pptx
+    bytes or a binary file object; archives are read in place with zipfile,
+    or with in_memory=True read once into memory so that forked processes
+    do not share a file offset.
+    """
+
+    def __init__(self, source, in_memory=False):
+        if isinstance(source, (str, os.PathLike)) and not zipfile.is_zipfile(source):
+            # Unzipped folder; a missing one behaves like an empty deck so callers can report it
+            self.parts = _DirectoryParts(source)
+        elif in_memory and isinstance(source, (str, os.PathLike)):
+            with open(source, "rb") as f:
+                self.parts = _ZipParts(f.read(), location=str(source))
+        else:
+            self.parts = _ZipParts(source)
+        self.location = self.parts.location
+        self.slides_dir = self.parts.path(SLIDES_DIR)
+        self._cache = {}
+
+    def exists(self):
+        """Whether the source has a ppt/slides folder at all"""
+        return self.parts.has_dir(SLIDES_DIR)
+
+    def slide_numbers(self):
+        """Sorted numbers of every slideN.xml in the deck"""
+        numbers = []
+        for name in self.parts.names(SLIDES_DIR):
+            match = _SLIDE_FILE_RE.match(posixpath.basename(name))
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def part_names(self, folder):
+        """Names of the parts directly inside a package folder such as ppt/media (not subfolders)"""
+        return sorted(name for name in self.parts.names(folder) if self.parts.exists(name))
+
+    def slide_part(self, slide_number):
+        return f"{SLIDES_DIR}/slide{slide_number}.xml"
+
+    def rels_part(self, slide_number):
+        return f"{SLIDES_DIR}/_rels/slide{slide_number}.xml.rels"
+
+    def has_slide(self, slide_number):
+        return self.parts.exists(self.slide_part(slide_number))
+
+    def has_rels(self, slide_number):
+        return self.parts.exists(self.rels_part(slide_number))
+
+    def slide(self, slide_number):
+        """The parsed slide, loaded once per deck"""
+        doc = self._cache.get(slide_number)
+        if doc is None:
+            slide_part = self.slide_part(slide_number)
+            if not self.parts.exists(slide_part):
+                raise FileNotFoundError(self.parts.path(slide_part))
+            rels_part = self.rels_part(slide_number)
+            rels_xml = self.parts.read(rels_part) if self.parts.exists(rels_part) else None
+            doc = SlideDocument.from_bytes(self.parts.read(slide_part), rels_xml,
+                                           number=slide_number, name=self.parts.path(slide_part))
+            self._cache[slide_number] = doc
+        return doc
+
+    def preload(self):
+        """Parse every slide into the cache, e.g. before forking processes that share the deck"""
+        for slide_number in self.slide_numbers():
+            self.slide(slide_number)
+
+    def iter_shapes(self, slide_number, kinds=("sp", "pic", "cxnSp")):
+        """
+        Stream a slide's shapes (see iter_shapes) without building or caching
+        the whole tree; an already loaded slide is iterated in place.
+        """
+        doc = self._cache.get(slide_number)
+        if doc is not None:
+            yield from iter_shapes(doc, kinds)
+            return
+        slide_part = self.slide_part(slide_number)
+        if not self.parts.exists(slide_part):
+            raise FileNotFoundError(self.parts.path(slide_part))
+        with self.parts.open(slide_part) as stream:
+            yield from iter_shapes(stream, kinds)
+
+    def slide_rels(self, slide_number):
+        """A slide's relationships, without parsing the slide XML itself"""
+        doc = self._cache.get(slide_number)
+        if doc is not None:
+            return doc.rels
+        rels_part = self.rels_part(slide_number)
+        return parse_rels(self.parts.read(rels_part)) if self.parts.exists(rels_part) else {}
+
+    def media_part(self, target):
+        """Part name of a slide relationship target such as ../media/image1.png"""
+        return part_name(SLIDES_DIR, target)
+
+    def has_part(self, name):
+        return self.parts.exists(name)
+
+    def read_part(self, name):
+        return self.parts.read(name)
+
+    def open_part(self, name):
+        """Binary stream over a part, without extracting it to disk"""
+        return self.parts.open(name)
+
+    def copy_part(self, name, dest):
+        """Write a part (typically media) to dest"""
+        self.parts.copy(name, dest)
+
+    def path(self, name):
+        """Where a part lives, for messages and metadata"""
+        return self.parts.path(name)
+
+    def part_size(self, name):
+        return self.parts.size(name)
+
+    def part_stat(self, name):
+        """
+        A cheap change key: (size, mtime_ns) for parts on disk, (size,
+        CRC and timestamp) for archive members
+        """
+        return self.parts.stat(name)
+
+    def part_digest(self, name):
+        """sha256 content digest of a part"""
+        return self.parts.digest(name)
+
+    def portable_source(self):
+        """A picklable source (path or archive bytes) that reopens this deck in another process"""
+        if isinstance(self.parts, _ZipParts):
+            return self.parts.portable_source()
+        return self.parts.source
+
+
+def as_slide_document(slide):
+    """Accept either a SlideDocument or a path to a slide XML file"""
+    if isinstance(slide, SlideDocument):
+        return slide
+    return SlideDocument.from_file(slide)
+
+
+def as_slide_deck(deck):
+    """Accept either a SlideDeck or anything SlideDeck can open"""
+    if isinstance(deck, SlideDeck):
+        return deck
+    return SlideDeck(deck)
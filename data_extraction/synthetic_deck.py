@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Synthetic PowerPoint decks for tests and benchmarks.
+Builds an unzipped slide tree (or a .pptx) shaped like the anatomy decks the
+extractors are written for, with every size knob configurable:
+
+    slide 1         the boneset index: 1200-size bold boneset link followed by
+                    one 900-size hyperlinked run per bone (xml_boneset_reader)
+    slides 2..N+1   per bone: the main pictures side by side, colored
+                    custGeom freeforms over them (ColoredRegionsExtractor),
+                    white hyperlinked text labels with white connectors
+                    leading to the regions (extract_text_labels), and the
+                    description text box in the lower right region
+                    (Extract_Bone_Descriptions)
+    slides N+2..    optional sub-bone slides, laid out like the bone slides
+                    but not on the index; the bone slides' labels then link
+                    to them instead of to the sibling bones
+
+Media are real PNGs written with zlib alone, so image sizes resolve without
+Pillow. Output is a function of the spec (and seed) only.
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import zipfile
+import zlib
+from xml.sax.saxutils import escape
+
+try:
+    from .slide_document import SLIDES_DIR
+    from .xml_backend import NS
+except ImportError:
+    from slide_document import SLIDES_DIR
+    from xml_backend import NS
+
+REGION_COLORS = ("C133AD", "2F8E29", "008000", "FF6600", "FF0000", "FF00E6")
+BONE_NAMES = ("Ilium", "Ischium", "Pubis", "Femur", "Tibia", "Fibula", "Patella", "Humerus",
+              "Radius", "Ulna", "Scapula", "Clavicle", "Vertebra", "Skull", "Mandible", "Maxilla")
+LABEL_NAMES = ("Iliac crest", "Obturator foramen", "Pubic tubercle", "Acetabulum", "Ischial spine",
+               "Greater trochanter", "Lesser trochanter", "Medial condyle", "Lateral condyle", "Tuberosity")
+BONESET_NAME = "Synthetic Boneset"
+
+_REL_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+_PKG_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_CONTENT_TYPE = "application/vnd.openxmlformats-{}"
+_SLIDE_CONTENT_TYPE = "officedocument.presentationml.slide+xml"
+# the description box must start right of and below these (Extract_Bone_Descriptions)
+_DESCRIPTION_BOX = (8100000, 3100000, 3900000, 3000000)
+_PICTURE_Y, _PICTURE_W, _PICTURE_H = 700000, 3700000, 3000000
+_PICTURE_XS = (300000, 4200000)
+
+
+class DeckSpec:
+    """Size knobs of a synthetic deck; counts are per content slide"""
+
+    def __init__(self, slides=4, freeforms=3, bezier_points=24, connectors=4, labels=2, media=2,
+                 image_size=(640, 480), seed=1, subbone_slides=0):
+        if slides < 1:
+            raise ValueError("a synthetic deck needs at least one content slide")
+        if min(freeforms, bezier_points, connectors, labels, media, subbone_slides) < 0:
+            raise ValueError("shape counts must not be negative")
+        self.slides = slides
+        self.freeforms = freeforms
+        self.bezier_points = bezier_points
+        self.connectors = connectors
+        self.labels = labels
+        self.media = media
+        self.image_size = tuple(image_size)
+        self.seed = seed
+        self.subbone_slides = subbone_slides
+
+    def to_dict(self):
+        return {"slides": self.slides, "freeforms": self.freeforms, "bezier_points": self.bezier_points,
+                "connectors": self.connectors, "labels": self.labels, "media": self.media,
+                "image_size": list(self.image_size), "seed": self.seed,
+                "subbone_slides": self.subbone_slides}
+
+    def bone_name(self, index):
+        """Name of the bone on content slide index + 2"""
+        name = BONE_NAMES[index % len(BONE_NAMES)]
+        return name if index < len(BONE_NAMES) else f"{name} {index // len(BONE_NAMES) + 1}"
+
+
+def png_bytes(width, height, shade=0):
+    """A valid greyscale PNG of the given size (a horizontal gradient offset by shade)"""
+    row = b"\0" + bytes((shade + x * 255 // max(width - 1, 1)) % 256 for x in range(width))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height, 6))
+            + chunk(b"IEND", b""))
+
+
+def _xfrm(x, y, cx, cy, rot=0):
+    rot_attr = f' rot="{rot}"' if rot else ""
+    return f'<a:xfrm{rot_attr}><a:off x="{x}" y="{y}"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+
+
+def _fill(color):
+    return f'<a:solidFill><a:srgbClr val="{color}"/></a:solidFill>'
+
+
+def _run(text, size, bold=False, white=False, link=None):
+    link_xml = f'<a:hlinkClick r:id="{link}"/>' if link else ""
+    return (f'<a:r><a:rPr lang="en-US" sz="{size}" b="{1 if bold else 0}">{_fill("FFFFFF") if white else ""}'
+            f'{link_xml}</a:rPr><a:t>{escape(text)}</a:t></a:r>')
+
+
+def _text_shape(shape_id, name, box, runs):
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="{escape(name)}"/><p:cNvSpPr txBox="1"/><p:nvPr/>'
+            f'</p:nvSpPr><p:spPr>{_xfrm(*box)}<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr>'
+            f'<p:txBody><a:bodyPr/><a:lstStyle/>{"".join(f"<a:p>{r}</a:p>" for r in runs)}</p:txBody></p:sp>')
+
+
+def _freeform(shape_id, box, color, points, rng):
+    """A closed custGeom path of cubic beziers (points // 3 of them), one line and one quadratic segment"""
+    w, h = rng.randint(20000, 400000), rng.randint(20000, 400000)
+
+    def pt():
+        return f'<a:pt x="{rng.randint(0, w)}" y="{rng.randint(0, h)}"/>'
+
+    commands = [f'<a:moveTo><a:pt x="0" y="{h // 2}"/></a:moveTo>']
+    commands += [f"<a:cubicBezTo>{pt()}{pt()}{pt()}</a:cubicBezTo>" for _ in range(max(points // 3, 1))]
+    commands += [f"<a:lnTo>{pt()}</a:lnTo>", f"<a:quadBezTo>{pt()}{pt()}</a:quadBezTo>", "<a:close/>"]
+    return (f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="Freeform {shape_id}"/><p:cNvSpPr/><p:nvPr/>'
+            f'</p:nvSpPr><p:spPr>{_xfrm(*box)}<a:custGeom><a:avLst/><a:pathLst><a:path w="{w}" h="{h}">'
+            f'{"".join(commands)}</a:path></a:pathLst></a:custGeom>{_fill(color)}</p:spPr></p:sp>')
+
+
+def _connector(shape_id, box, rot=0):
+    return (f'<p:cxnSp><p:nvCxnSpPr><p:cNvPr id="{shape_id}" name="Straight Connector {shape_id}"/>'
+            f'<p:cNvCxnSpPr/><p:nvPr/></p:nvCxnSpPr><p:spPr>{_xfrm(*box, rot)}<a:prstGeom prst="line">'
+            f'<a:avLst/></a:prstGeom><a:ln w="19050">{_fill("FFFFFF")}</a:ln></p:spPr></p:cxnSp>')
+
+
+def _picture(shape_id, rid, box):
+    return (f'<p:pic><p:nvPicPr><p:cNvPr id="{shape_id}" name="Picture {shape_id}"/><p:cNvPicPr/><p:nvPr/>'
+            f'</p:nvPicPr><p:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></p:blipFill>'
+            f'<p:spPr>{_xfrm(*box)}<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr></p:pic>')
+
+
+def slide_xml(body):
+    return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><p:sld xmlns:a="{NS["a"]}" '
+            f'xmlns:p="{NS["p"]}" xmlns:r="{NS["r"]}"><p:cSld><p:spTree><p:nvGrpSpPr><p:cNvPr id="1" name=""/>'
+            f'<p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr><p:grpSpPr/>{body}</p:spTree></p:cSld></p:sld>')
+
+
+def rels_xml(relationships):
+    """relationships: [(rId, type, target)]"""
+    body = "".join(f'<Relationship Id="{rid}" Type="{_REL_TYPE}{kind}" Target="{target}"/>'
+                   for rid, kind, target in relationships)
+    return f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><Relationships xmlns="{_PKG_RELS}">{body}</Relationships>'
+
+
+def content_types(slide_count):
+    overrides = "".join(f'<Override PartName="/{SLIDES_DIR}/slide{n}.xml" '
+                        f'ContentType="{_CONTENT_TYPE.format(_SLIDE_CONTENT_TYPE)}"/>'
+                        for n in range(1, slide_count + 1))
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            f'<Default Extension="rels" ContentType="{_CONTENT_TYPE.format("package.relationships+xml")}"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Default Extension="png" ContentType="image/png"/>'
+            f'{overrides}</Types>')
+
+
+def index_slide(spec):
+    """(slide xml, rels) of the boneset index on slide 1"""
+    runs = [_run(BONESET_NAME, 1200, bold=True, link="rId2")]
+    relationships = [("rId1", "slideLayout", "../slideLayouts/slideLayout1.xml"), ("rId2", "slide", "slide2.xml")]
+    for i in range(spec.slides):
+        rid = f"rId{i + 3}"
+        runs.append(_run(spec.bone_name(i), 900, link=rid))
+        relationships.append((rid, "slide", f"slide{i + 2}.xml"))
+    body = _text_shape(2, "Boneset Index", (300000, 300000, 6000000, 5000000), runs)
+    return slide_xml(body), rels_xml(relationships)
+
+
+def content_slide(spec, number, rng):
+    """(slide xml, rels, {media file name: png bytes}) of content slide `number`"""
+    index = number - 2
+    bone = spec.bone_name(index)
+    relationships = [("rId1", "slideLayout", "../slideLayouts/slideLayout1.xml"),
+                     ("rId2", "slide", "slide1.xml")]
+    media, shapes, next_id = {}, [], 10
+    width, height = spec.image_size
+
+    def add_rel(kind, target):
+        rid = f"rId{len(relationships) + 1}"
+        relationships.append((rid, kind, target))
+        return rid
+
+    # the first two media are the main pictures; the rest are small thumbnails along the top
+    for m in range(spec.media):
+        name = f"image{number}_{m + 1}.png"
+        if m < 2:
+            media[name] = png_bytes(width, height, shade=(number * 7 + m) % 256)
+            box = (_PICTURE_XS[m], _PICTURE_Y, _PICTURE_W, _PICTURE_H)
+        else:
+            media[name] = png_bytes(32, 32, shade=m)
+            box = (300000 + (m - 2) * 250000, 100000, 200000, 200000)
+        shapes.append(_picture(next_id, add_rel("image", f"../media/{name}"), box))
+        next_id += 1
+
+    regions = []
+    for f in range(spec.freeforms):
+        left = _PICTURE_XS[f % 2]
+        box = (left + rng.randint(0, _PICTURE_W - 900000), _PICTURE_Y + rng.randint(0, _PICTURE_H - 700000),
+               rng.randint(200000, 900000), rng.randint(200000, 700000))
+        regions.append(box)
+        shapes.append(_freeform(next_id, box, REGION_COLORS[f % len(REGION_COLORS)], spec.bezier_points, rng))
+        next_id += 1
+
+    # labels sit in a row under the pictures; each connector runs from a label up to a region
+    labels = []
+    for k in range(spec.labels):
+        box = (300000 + (k % 8) * 960000, 4000000 + (k // 8) * 320000, 900000, 240000)
+        labels.append(box)
+        if spec.subbone_slides and index < spec.slides:
+            target = 2 + spec.slides + (index + k) % spec.subbone_slides
+        else:
+            target = 2 + (index + k + 1) % spec.slides
+        shapes.append(_text_shape(next_id, f"Label {next_id}", box,
+                                  [_run(LABEL_NAMES[(index + k) % len(LABEL_NAMES)], 1000, white=True,
+                                        link=add_rel("slide", f"slide{target}.xml"))]))
+        next_id += 1
+    for c in range(spec.connectors):
+        lx, ly, lw, _ = labels[c % len(labels)] if labels else (300000 + c * 100000, 4000000, 900000, 0)
+        rx, ry, rw, rh = regions[c % len(regions)] if regions else (lx, _PICTURE_Y + _PICTURE_H // 2, 0, 0)
+        start = (lx + lw // 2, ly)
+        end = (rx + rw // 2, ry + rh // 2)
+        # every other line is turned half a circle, which keeps the segment but exercises rotated endpoints
+        rot = 60000 * 180 if c % 2 else 0
+        box = (min(start[0], end[0]), min(start[1], end[1]), abs(end[0] - start[0]), abs(end[1] - start[1]))
+        shapes.append(_connector(next_id, box, rot))
+        next_id += 1
+
+    description = [_run(bone, 1400, bold=True),
+                   _run(f"The {bone.lower()} is bone {index + 1} of the synthetic boneset.", 1200),
+                   _run(f"Second fact about the {bone.lower()}.", 1200)]
+    shapes.append(_text_shape(next_id, "Description", _DESCRIPTION_BOX, description))
+    shapes.append(_text_shape(next_id + 1, "Back", (300000, 6300000, 900000, 240000),
+                              [_run("Back", 900, link="rId2")]))
+    return slide_xml("".join(shapes)), rels_xml(relationships), media
+
+
+def deck_parts(spec):
+    """(part name, bytes) of the whole deck in a stable order, generated one slide at a time"""
+    rng = random.Random(spec.seed)
+    yield "[Content_Types].xml", content_types(spec.slides + spec.subbone_slides + 1).encode("utf-8")
+    slide, rels = index_slide(spec)
+    yield f"{SLIDES_DIR}/slide1.xml", slide.encode("utf-8")
+    yield f"{SLIDES_DIR}/_rels/slide1.xml.rels", rels.encode("utf-8")
+    for number in range(2, spec.slides + spec.subbone_slides + 2):
+        slide, rels, media = content_slide(spec, number, rng)
+        yield f"{SLIDES_DIR}/slide{number}.xml", slide.encode("utf-8")
+        yield f"{SLIDES_DIR}/_rels/slide{number}.xml.rels", rels.encode("utf-8")
+        for name, data in media.items():
+            yield f"ppt/media/{name}", data
+
+
+def write_deck(spec, output):
+    """
+    Write the deck to output: a .pptx archive when the path ends in .pptx,
+    otherwise an unzipped slide tree. Returns the total size in bytes.
+    """
+    if str(output).lower().endswith(".pptx"):
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+            for name, data in deck_parts(spec):
+                archive.writestr(name, data)
+        return os.path.getsize(output)
+    total = 0
+    for name, data in deck_parts(spec):
+        path = os.path.join(output, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        total += len(data)
+    return total
+
+
+def add_spec_arguments(parser):
+    """Add the deck size flags to a CLI parser"""
+    defaults = DeckSpec(1)
+    parser.add_argument("--slides", type=int, default=4, help="Content slides after the index slide (default: 4).")
+    parser.add_argument("--freeforms", type=int, default=defaults.freeforms, help="Colored freeform regions per slide.")
+    parser.add_argument("--bezier-points", type=int, default=defaults.bezier_points,
+                        help="Cubic bezier control points per freeform path (three per curve).")
+    parser.add_argument("--connectors", type=int, default=defaults.connectors, help="White connector lines per slide.")
+    parser.add_argument("--labels", type=int, default=defaults.labels, help="White hyperlinked text labels per slide.")
+    parser.add_argument("--media", type=int, default=defaults.media,
+                        help="Pictures per slide; the first two are the main images (default: 2).")
+    parser.add_argument("--image-size", type=int, nargs=2, default=list(defaults.image_size), metavar=("W", "H"),
+                        help="Pixel size of the main images (default: 640 480).")
+    parser.add_argument("--subbone-slides", type=int, default=defaults.subbone_slides,
+                        help="Sub-bone slides after the bone slides, linked from the bone slides' labels.")
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Random seed for the shape geometry.")
+
+
+def spec_from_args(args):
+    return DeckSpec(args.slides, args.freeforms, args.bezier_points, args.connectors, args.labels, args.media,
+                    args.image_size, args.seed, args.subbone_slides)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PowerPoint slide tree for tests and benchmarks.")
+    parser.add_argument("output", help="Folder to write the unzipped deck to, or a path ending in .pptx.")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    spec = spec_from_args(args)
+    size = write_deck(spec, args.output)
+    print(f"✓ Wrote {spec.slides + spec.subbone_slides + 1} slides ({size / 1e6:.2f} MB) to {args.output}")
+    print(json.dumps(spec.to_dict()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Pluggable XML backend for the data_extraction scripts.
+Uses lxml when it is installed (faster parsing, and namespace queries
+compiled once into XPath objects) and falls back to the standard library's
+ElementTree otherwise; both produce identical extractor output. Set
+DATA_EXTRACTION_XML_BACKEND=etree to force the fallback, e.g. to compare.
+"""
+
+import os
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as _lxml
+except ImportError:  # lxml is optional
+    _lxml = None
+
+NS = {
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+
+if _lxml is not None and os.environ.get("DATA_EXTRACTION_XML_BACKEND", "lxml") != "etree":
+    BACKEND = "lxml"
+    # huge_tree: some slides embed custom geometry far beyond libxml2's default node limits
+    _PARSER = _lxml.XMLParser(huge_tree=True, resolve_entities=False, remove_comments=True, remove_pis=True)
+    ParseError = (ET.ParseError, _lxml.XMLSyntaxError)
+else:
+    BACKEND = "etree"
+    ParseError = ET.ParseError
+
+
+def fromstring(data):
+    """Parse XML bytes into a root element with the active backend"""
+    if BACKEND == "lxml":
+        return _lxml.fromstring(data, _PARSER)
+    return ET.fromstring(data)
+
+
+def iterparse(source, events=("end",)):
+    """Incremental parse of a path or binary stream with the active backend"""
+    if BACKEND == "lxml":
+        return _lxml.iterparse(source, events=events, huge_tree=True, resolve_entities=False,
+                               remove_comments=True, remove_pis=True)
+    return ET.iterparse(source, events=events)
+
+
+class Query:
+    """
+    A namespace-aware path such as ".//a:xfrm" or "a:off", compiled once.
+    With lxml it runs as precompiled XPath; otherwise (or on ElementTree
+    elements) as ElementPath with the same namespaces. Paths must be in the
+    subset both understand: child steps, ".//" and "./".
+    """
+
+    __slots__ = ("path", "namespaces", "_all", "_first")
+
+    def __init__(self, path, namespaces=NS):
+        self.path = path
+        self.namespaces = namespaces
+        if _lxml is not None:
+            self._all = _lxml.XPath(path, namespaces=namespaces)
+            self._first = _lxml.XPath(f"({path})[1]", namespaces=namespaces)
+        else:
+            self._all = self._first = None
+
+    def all(self, el):
+        """Every match, in document order"""
+        if self._all is not None and isinstance(el, _lxml._Element):
+            return self._all(el)
+        return el.findall(self.path, self.namespaces)
+
+    def first(self, el):
+        """The first match, or None"""
+        if self._first is not None and isinstance(el, _lxml._Element):
+            found = self._first(el)
+            return found[0] if found else None
+        return el.find(self.path, self.namespaces)
@@ -1,70 +1,250 @@
 import os
-import xml.etree.ElementTree as ET
-import json
 import argparse
+import json
+import zipfile
+from pathlib import Path
+
+try:
+    from . import profiling
+    from .etag_manifest import update_etag_manifest
+    from .manifest import write_json
+    from .navigation_graph import read_links, resolve_link
+    from .profiling import add_profile_arguments, log, profiled
+    from .slide_document import SlideDeck, as_slide_deck, as_slide_document
+    from .xml_backend import ParseError, Query
+except ImportError:
+    import profiling
+    from etag_manifest import update_etag_manifest
+    from manifest import write_json
+    from navigation_graph import read_links, resolve_link
+    from profiling import add_profile_arguments, log, profiled
+    from slide_document import SlideDeck, as_slide_deck, as_slide_document
+    from xml_backend import ParseError, Query
+
+# sibling modules whose code shapes the output, for the build's stage fingerprint
+_HELPER_MODULES = ("navigation_graph.py", "etag_manifest.py")
+_RUNS, _RPR, _T, _HLINK = Query(".//p:txBody//a:r"), Query("a:rPr"), Query("a:t"), Query("a:hlinkClick")
+
+BONESET_INDEX_FILENAME = "boneset_index.json"
+BONESET_INDEX_FORMAT = 1
+NODE_KINDS = ("boneset", "bone", "subbone")
+
+
+def node_id(name):
+    """The id used for a boneset, bone or sub-bone name, as in the boneset JSON"""
+    return name.lower().replace(" ", "_")
+
+
+def name_key(name):
+    """Case- and spacing-insensitive key for name lookups"""
+    return " ".join(name.replace("_", " ").lower().split())
+
+
+def _linked_runs(doc):
+    """(text, size, bold, a:hlinkClick) of each hyperlinked text run of a slide, in document order"""
+    for sp_element in doc.shapes:
+        for r_element in _RUNS.all(sp_element):
+            rPr_element = _RPR.first(r_element)
+            text_element = _T.first(r_element)
+
+            if rPr_element is not None and text_element is not None:
+                hlink = _HLINK.first(rPr_element)
+                if hlink is not None:
+                    yield (text_element.text or "").strip(), rPr_element.get("sz"), rPr_element.get("b") == "1", hlink
+
 
-def extract_bones_from_xml(xml_path):
+def _read_index_slide(doc):
+    """
+    Bonesets and bones of an index slide by font size: the first 1200-size
+    link and every bolded one start a boneset, the other 1200-size links are
+    bones of the first, and 900-size links are bones of the most recent
+    bolded boneset (or loose, before any). Returns (bonesets, loose, links)
+    where links maps each name to the first a:hlinkClick carrying it.
+    """
+    bonesets = {}  # Dictionary to store bonesets
+    bonesetContent = []
+    links = {}
+    total_boneset = None
+    bolded_set = None
+
+    for text, size, is_bold, hlink in _linked_runs(doc):
+        if size == "1200":
+            links.setdefault(text, hlink)
+            if is_bold:
+                bolded_set = text
+                bonesets[bolded_set] = list()
+
+            if total_boneset is None:
+                total_boneset = text
+                bonesets[total_boneset] = list()
+                continue
+            # These are their own bonesets
+            bonesets[total_boneset].append(text.capitalize())
+            links.setdefault(text.capitalize(), hlink)
+        elif size == "900":
+            links.setdefault(text.capitalize(), hlink)
+            if not bolded_set:
+                bonesetContent.append(text.capitalize())
+            else:
+                bonesets[bolded_set].append(text.capitalize())
+
+    return bonesets, bonesetContent, links
+
+
+def _open_index_slide(xml_path, slide_number):
+    if isinstance(xml_path, SlideDeck):
+        return xml_path.slide(slide_number)
+    if isinstance(xml_path, (str, os.PathLike)) and zipfile.is_zipfile(xml_path):
+        return SlideDeck(xml_path).slide(slide_number)
+    return as_slide_document(xml_path)
+
+
+def extract_bones_from_xml(xml_path, slide_number=1):
     """
     Parses the XML file and extracts bonesets and their associated bones.
     Bonesets are determined by hyperlink text with size 1200.
     Bones with size 900 are assigned to the most recent bolded boneset.
+    xml_path may also be a .pptx file or a SlideDeck, in which case slide_number is read from it.
     """
     try:
-        print(f"Parsing XML: {xml_path}")
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-    except ET.ParseError as e:
-        print(f"Error parsing {xml_path}: {e}")
-        return {}
-
-    # Namespace handling for XML
-    ns = {
-        'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
-        'a': 'http://schemas.openxmlformats.org/drawingml/2006/main',
-        'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
-    }
-
-    bonesets = {}  # Dictionary to store bonesets
-    bonesetContent =[]
-    total_boneset = None
-    bolded_set = None
-    boldedList=[]
+        log.info(f"Parsing XML: {xml_path}")
+        doc = _open_index_slide(xml_path, slide_number)
+    except ParseError as e:
+        log.error(f"Error parsing {xml_path}: {e}")
+        return {}, []
 
     # Extract bonesets based on hyperlinks and size attributes
-    for sp_element in root.findall(".//p:sp", ns):
-        for r_element in sp_element.findall(".//p:txBody//a:r", ns):
-            rPr_element = r_element.find("a:rPr", ns)
-            text_element = r_element.find("a:t", ns)
-
-            if rPr_element is not None and text_element is not None:
-                text = text_element.text.strip()
-                size = rPr_element.get("sz")
-                is_bold = rPr_element.get("b") == "1"
-                has_hyperlink = rPr_element.find("a:hlinkClick", ns) is not None
-
-                if has_hyperlink:
-                    if size == "1200":
-                        if is_bold:
-                            bolded_set = text
-                            bonesets[bolded_set] = list()
-
-                        if total_boneset is None:
-                            total_boneset = text
-                            bonesets[total_boneset] = list()
-                            continue
-                        # These are their own bonesets                        
-                        bonesets[total_boneset].append(text.capitalize())
-                    elif size == "900":
-                        if not bolded_set:
-                            bonesetContent.append(text.capitalize())
-                        else:
-                            bonesets[bolded_set].append(text.capitalize())
-    for i in boldedList:
-        bonesets[bolded_set].append(i)
-                        
+    with profiling.stage("shape_scan"):
+        bonesets, bonesetContent, _ = _read_index_slide(doc)
 
     return bonesets, bonesetContent
 
+
+def build_boneset_index(deck, index_slide=1):
+    """
+    Whole-deck hierarchy index: the bonesets and bones of the index slide
+    (as extract_bones_from_xml reads them), each with the slide its link
+    leads to, and as sub-bones of a bone the labelled links on that bone's
+    slide (links to the index, boneset and bone slides excluded). Every
+    slide's links are resolved once (navigation_graph.read_links). Returns
+
+        {"format": 1, "index_slide": 1,
+         "bonesets": {id: {"name", "slide", "bones": [bone ids]}},
+         "bones":    {id: {"name", "slide", "boneset", "subbones": [sub-bone ids]}},
+         "subbones": {id: {"name", "slide", "boneset", "bone"}},
+         "names":    {name_key(name): [{"type", "id"}]},
+         "slides":   {"N": [{"type", "id"}]}}
+
+    so lookups by id, name or slide are single dictionary reads. Bones and
+    sub-bones keep deck order. A node has one parent: a bone listed under
+    two bonesets, or a sub-bone linked from two bone slides, belongs to the
+    first in deck order and is listed only there.
+    """
+    deck = as_slide_deck(deck)
+    doc = deck.slide(index_slide)
+    order = deck.slide_numbers()
+    with profiling.stage("shape_scan"):
+        bonesets, _, links = _read_index_slide(doc)
+    slide_links = read_links(deck)
+
+    def target(name):
+        hlink = links.get(name)
+        return resolve_link(hlink, doc.rels, index_slide, order) if hlink is not None else None
+
+    index = {"format": BONESET_INDEX_FORMAT, "index_slide": index_slide,
+             "bonesets": {}, "bones": {}, "subbones": {}, "names": {}, "slides": {}}
+
+    def add(kind, name, entry):
+        table = index[kind + "s"]
+        nid = node_id(name)
+        if nid in table:
+            return nid
+        table[nid] = dict(entry, name=name)
+        ref = {"type": kind, "id": nid}
+        index["names"].setdefault(name_key(name), []).append(ref)
+        if entry.get("slide") is not None:
+            index["slides"].setdefault(str(entry["slide"]), []).append(ref)
+        return nid
+
+    with profiling.stage("graph_build"):
+        for boneset_name in bonesets:
+            add("boneset", boneset_name, {"slide": target(boneset_name), "bones": []})
+        for boneset_name, bone_names in bonesets.items():
+            boneset_id = node_id(boneset_name)
+            boneset = index["bonesets"][boneset_id]
+            for bone_name in bone_names:
+                bone_id = add("bone", bone_name, {"slide": target(bone_name), "boneset": boneset_id,
+                                                  "subbones": []})
+                if index["bones"][bone_id]["boneset"] == boneset_id and bone_id not in boneset["bones"]:
+                    boneset["bones"].append(bone_id)
+        skip = {index_slide} | {entry["slide"] for kind in ("bonesets", "bones") for entry in index[kind].values()}
+        for bone_id, bone in index["bones"].items():
+            for link in slide_links.get(bone["slide"], ()):
+                if not link["text"] or link["slide"] in skip or link["slide"] == bone["slide"]:
+                    continue
+                sub_id = add("subbone", link["text"], {"slide": link["slide"], "boneset": bone["boneset"],
+                                                       "bone": bone_id})
+                if index["subbones"][sub_id]["bone"] == bone_id and sub_id not in bone["subbones"]:
+                    bone["subbones"].append(sub_id)
+    profiling.count("index_nodes", sum(len(index[kind + "s"]) for kind in NODE_KINDS))
+    return index
+
+
+class BonesetIndex:
+    """O(1) lookups over a build_boneset_index document"""
+
+    def __init__(self, index):
+        self.index = index
+        self.tables = {kind: index[kind + "s"] for kind in NODE_KINDS}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def get(self, kind, nid):
+        """The boneset, bone or sub-bone entry with that id, or None"""
+        return self.tables[kind].get(nid)
+
+    def find(self, name):
+        """[{"type", "id"}] of every node called name, ignoring case and spacing"""
+        return self.index["names"].get(name_key(name), [])
+
+    def at_slide(self, slide_number):
+        """[{"type", "id"}] of the nodes whose link leads to the slide"""
+        return self.index["slides"].get(str(slide_number), [])
+
+    def path(self, kind, nid):
+        """[(type, id)] from the boneset down to the node, or [] when it is unknown"""
+        entry = self.get(kind, nid)
+        if entry is None:
+            return []
+        if kind == "boneset":
+            return [("boneset", nid)]
+        if kind == "bone":
+            return [("boneset", entry["boneset"]), ("bone", nid)]
+        return [("boneset", entry["boneset"]), ("bone", entry["bone"]), ("subbone", nid)]
+
+
+def _deck_of(xml_file, slide_number):
+    """(deck, index slide) for the CLI's xml_file: a .pptx as is, a ppt/slides/slideN.xml by its package folder"""
+    if zipfile.is_zipfile(xml_file):
+        return xml_file, slide_number
+    path = Path(xml_file).resolve()
+    stem = path.stem
+    number = int(stem[len("slide"):]) if stem.startswith("slide") and stem[len("slide"):].isdigit() else slide_number
+    return path.parents[2], number
+
+
+def write_boneset_index(deck, output_path, index_slide=1):
+    """Build the hierarchy index and write it to output_path; returns the index"""
+    index = build_boneset_index(deck, index_slide)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    write_json(output_path, index, indent=2)
+    update_etag_manifest(os.path.dirname(output_path), [os.path.basename(output_path)])
+    log.info(f"Boneset index saved: {output_path}")
+    return index
+
 def generate_json_output(bonesets, output_json_path):
     """
     Converts bonesets dictionary into a structured JSON format and writes it to a file.
@@ -80,21 +260,30 @@ def generate_json_output(bonesets, output_json_path):
 
     # Save to JSON file
     try:
-        with open(output_json_path, 'w') as json_file:
-            json.dump(structured_data, json_file, indent=4)
-            print(f"JSON file saved: {output_json_path}")
+        write_json(output_json_path, structured_data, indent=4)
+        update_etag_manifest(os.path.dirname(output_json_path), [os.path.basename(output_json_path)])
+        log.info(f"JSON file saved: {output_json_path}")
     except IOError as e:
-        print(f"Error writing to {output_json_path}: {e}")
+        log.error(f"Error writing to {output_json_path}: {e}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract bonesets from XML.")
-    parser.add_argument("xml_file", help="Path to the XML file, located in the ppt/slides/ directory of the PowerPoint data folder.")
+    parser.add_argument("xml_file", help="Path to the XML file, located in the ppt/slides/ directory of the PowerPoint data folder, or to the .pptx file itself.")
     parser.add_argument("json_file", help="Path to the output JSON file.")
+    parser.add_argument("--slide-number", type=int, default=1, help="Slide to read when xml_file is a .pptx (default: 1).")
+    parser.add_argument("--index", metavar="PATH",
+                        help="Also write the whole-deck boneset -> bone -> sub-bone -> slide index to PATH.")
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     
-    # Extract bonesets and their bones
-    bonesets, bonesetContent = extract_bones_from_xml(args.xml_file)
+    with profiled(args, "boneset"):
+        # Extract bonesets and their bones
+        bonesets, bonesetContent = extract_bones_from_xml(args.xml_file, args.slide_number)
+
+        # Generate and save JSON output
+        generate_json_output(bonesets, args.json_file)
 
-    # Generate and save JSON output
-    generate_json_output(bonesets, args.json_file)
+        if args.index:
+            deck, index_slide = _deck_of(args.xml_file, args.slide_number)
+            write_boneset_index(deck, args.index, index_slide)
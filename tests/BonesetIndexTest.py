@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction.synthetic_deck import BONESET_NAME, LABEL_NAMES, DeckSpec, write_deck
+from data_extraction.xml_boneset_reader import BonesetIndex, build_boneset_index, node_id
+
+# the labels of neighbouring bone slides share sub-bone slides, so some sub-bones have two candidate parents
+SPEC = DeckSpec(slides=4, freeforms=1, bezier_points=3, connectors=0, labels=3, media=0, subbone_slides=3)
+SIBLINGS = DeckSpec(slides=4, freeforms=1, bezier_points=3, connectors=0, labels=3, media=0)
+
+
+def _index(spec):
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(spec, deck)
+        return build_boneset_index(deck)
+
+
+def test_bones():
+    print("Testing bonesets and bones of the index slide...")
+    print("=" * 50)
+
+    index = _index(SPEC)
+    boneset = index["bonesets"].get(node_id(BONESET_NAME))
+    if boneset is None or boneset["slide"] != 2:
+        print(f"❌ Boneset entry {boneset}")
+        return False
+    expected = [node_id(SPEC.bone_name(i)) for i in range(SPEC.slides)]
+    if boneset["bones"] != expected:
+        print(f"❌ Boneset lists {boneset['bones']}, expected {expected}")
+        return False
+    for i, bone_id in enumerate(expected):
+        bone = index["bones"][bone_id]
+        if bone["slide"] != i + 2 or bone["boneset"] != node_id(BONESET_NAME):
+            print(f"❌ Bone {bone_id}: {bone}")
+            return False
+    print(f"✓ {len(expected)} bones, each linked to its own slide")
+    return True
+
+
+def test_subbones():
+    print("\nTesting sub-bones and their parents...")
+    print("=" * 50)
+
+    index = _index(SPEC)
+    structural = {index["index_slide"]} | {entry["slide"] for kind in ("bonesets", "bones")
+                                           for entry in index[kind].values()}
+    subbones = index["subbones"]
+    if not subbones:
+        print("❌ No sub-bones were found")
+        return False
+    for sub_id, sub in subbones.items():
+        if sub["slide"] in structural:
+            print(f"❌ Sub-bone {sub_id} leads to index, boneset or bone slide {sub['slide']}")
+            return False
+    print(f"✓ {len(subbones)} sub-bones, none on an index, boneset or bone slide")
+
+    listed = {}
+    for bone_id, bone in index["bones"].items():
+        for sub_id in bone["subbones"]:
+            if sub_id in listed:
+                print(f"❌ Sub-bone {sub_id} is listed under {listed[sub_id]} and {bone_id}")
+                return False
+            listed[sub_id] = bone_id
+    if listed != {sub_id: sub["bone"] for sub_id, sub in subbones.items()}:
+        print(f"❌ Bone lists {listed} disagree with the sub-bone owners")
+        return False
+    print("✓ Every sub-bone is listed exactly once, under the bone that owns it")
+
+    # the first bone slide in deck order whose labels name a shared sub-bone owns it
+    first = {}
+    for i in range(SPEC.slides):
+        for k in range(SPEC.labels):
+            first.setdefault(node_id(LABEL_NAMES[(i + k) % len(LABEL_NAMES)]), node_id(SPEC.bone_name(i)))
+    if {sub_id: sub["bone"] for sub_id, sub in subbones.items()} != first:
+        print(f"❌ Sub-bone owners differ from the first bones naming them: {first}")
+        return False
+    print("✓ Shared sub-bones belong to the first bone that links them")
+    return True
+
+
+def test_sibling_links():
+    print("\nTesting links between bone slides...")
+    print("=" * 50)
+
+    # without sub-bone slides every label links to a sibling bone, which is not a sub-bone
+    index = _index(SIBLINGS)
+    if index["subbones"] or any(bone["subbones"] for bone in index["bones"].values()):
+        print(f"❌ Sibling bones were indexed as sub-bones: {sorted(index['subbones'])}")
+        return False
+    print("✓ Links to sibling bones are not sub-bones")
+    return True
+
+
+def test_lookups():
+    print("\nTesting index lookups...")
+    print("=" * 50)
+
+    lookup = BonesetIndex(_index(SPEC))
+    for kind in ("boneset", "bone", "subbone"):
+        for nid, entry in lookup.tables[kind].items():
+            ref = {"type": kind, "id": nid}
+            if ref not in lookup.at_slide(entry["slide"]):
+                print(f"❌ at_slide({entry['slide']}) misses {ref}")
+                return False
+            if ref not in lookup.find(entry["name"].upper().replace(" ", "  ")):
+                print(f"❌ find({entry['name']!r}) misses {ref}")
+                return False
+            path = lookup.path(kind, nid)
+            if path[-1] != (kind, nid) or any(lookup.get(k, i) is None for k, i in path):
+                print(f"❌ path({kind}, {nid}) = {path}")
+                return False
+            if kind == "subbone" and nid not in lookup.get("bone", path[1][1])["subbones"]:
+                print(f"❌ path({kind}, {nid}) goes through a bone that does not list it")
+                return False
+    if lookup.path("bone", "no_such_bone") or lookup.find("No such bone"):
+        print("❌ Unknown names resolved")
+        return False
+    print("✓ at_slide, find and path agree with the tables")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("BONESET INDEX TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Bones", test_bones),
+        ("Sub-bones", test_subbones),
+        ("Sibling Links", test_sibling_links),
+        ("Lookups", test_lookups)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
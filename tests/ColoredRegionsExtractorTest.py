@@ -1,50 +1,68 @@
 #!/usr/bin/env python3
 import json
 import sys
+import tempfile
 from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from data_extraction.ColoredRegionsExtractor import AnatomicalShapeParser
+from data_extraction.synthetic_deck import DeckSpec, write_deck
+
+# A small synthetic deck: slide 1 is the boneset index, slides 2-4 carry the regions
+SPEC = DeckSpec(slides=3, freeforms=4, bezier_points=12, connectors=3, labels=2, media=2)
 
 
 def test_parser_functionality():
     print("Testing Enhanced Anatomical Parser...")
     print("=" * 50)
-    
-    # Test parser initialization
-    xml_folder = Path("../.xml Files")
-    if not xml_folder.exists():
-        print("❌ XML files folder not found")
-        return False
-    
-    parser = AnatomicalShapeParser(xml_folder)
-    print("✓ Parser initialized successfully")
-    
-    # Test parsing a specific slide
-    test_slide = 2  # Acetabulum slide
-    result = parser.parse_slide(test_slide)
-    
-    if not result:
-        print(f"❌ Failed to parse slide {test_slide}")
-        return False
-    
-    print(f"✓ Slide {test_slide} parsed successfully")
-    
-    # Validate output structure
-    required_fields = ['slide_number', 'colored_regions', 'total_regions']
-    for field in required_fields:
-        if field not in result:
-            print(f"❌ Missing required field: {field}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(SPEC, deck)
+
+        # Test parser initialization
+        parser = AnatomicalShapeParser(deck, Path(tmp) / "annotations")
+        print("✓ Parser initialized successfully")
+
+        # Test parsing a specific slide
+        test_slide = 2  # First bone slide
+        result = parser.parse_slide(test_slide)
+
+        if not result:
+            print(f"❌ Failed to parse slide {test_slide}")
             return False
-    
-    print(f"✓ Output structure is valid")
-    
-    # Check if regions have path data
-    if result['colored_regions']:
-        region = result['colored_regions'][0]
-        if 'path_data' not in region:
-            print("❌ Missing path_data in region")
+
+        print(f"✓ Slide {test_slide} parsed successfully")
+
+        # Validate output structure
+        required_fields = ['slide_number', 'image_dimensions', 'colored_regions']
+        for field in required_fields:
+            if field not in result:
+                print(f"❌ Missing required field: {field}")
+                return False
+
+        print(f"✓ Output structure is valid")
+
+        if len(result['colored_regions']) != SPEC.freeforms:
+            print(f"❌ Expected {SPEC.freeforms} regions, found {len(result['colored_regions'])}")
             return False
+
+        print(f"✓ Found all {SPEC.freeforms} colored regions")
+
+        # Check if regions have path data
+        for region in result['colored_regions']:
+            if not region.get('path_data'):
+                print("❌ Missing path_data in region")
+                return False
         print("✓ Path data present in regions")
-    
+
+        # The index slide has no colored shapes
+        if parser.parse_slide(1) is not None:
+            print("❌ Index slide should have no colored regions")
+            return False
+        print("✓ Slides without colored shapes are skipped")
+
     return True
 
 
@@ -52,45 +70,47 @@ def test_annotation_files():
     """Test that annotation files were created and are valid"""
     print("\nTesting Annotation Files...")
     print("=" * 50)
-    
-    annotations_dir = Path("annotations")
-    if not annotations_dir.exists():
-        print("❌ Annotations directory not found")
-        return False
-    
-    json_files = list(annotations_dir.glob("*.json"))
-    if not json_files:
-        print("❌ No annotation files found")
-        return False
-    
-    print(f"✓ Found {len(json_files)} annotation files")
-    
-    # Test a few key files
-    test_files = [
-        "acetabulum_annotations.json",
-        "iliac_crest_annotations.json", 
-        "pubic_tubercle_annotations.json"
-    ]
-    
-    for filename in test_files:
-        file_path = annotations_dir / filename
-        if file_path.exists():
-            try:
-                with open(file_path, 'r') as f:
-                    data = json.load(f)
-                
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        # The unzipped folder and the .pptx archive must give the same annotations
+        for deck in (Path(tmp) / "deck", Path(tmp) / "deck.pptx"):
+            write_deck(SPEC, deck)
+            annotations_dir = Path(tmp) / f"annotations_{deck.name}"
+            AnatomicalShapeParser(deck, annotations_dir).parse_all_slides(force=True)
+
+            json_files = sorted(annotations_dir.glob("slide*_precise_paths.json"))
+            if len(json_files) != SPEC.slides:
+                print(f"❌ Expected {SPEC.slides} annotation files, found {len(json_files)}")
+                return False
+
+            print(f"✓ Found {len(json_files)} annotation files from {deck.name}")
+
+            for file_path in json_files:
+                try:
+                    with open(file_path, 'r') as f:
+                        data = json.load(f)
+                except json.JSONDecodeError:
+                    print(f"❌ {file_path.name} has invalid JSON")
+                    return False
+
                 # Check basic structure
-                if 'slide_number' in data and 'colored_regions' in data:
-                    print(f"✓ {filename} is valid")
-                else:
-                    print(f"⚠ {filename} missing required fields")
-                    
-            except json.JSONDecodeError:
-                print(f"❌ {filename} has invalid JSON")
+                if 'slide_number' not in data or 'colored_regions' not in data:
+                    print(f"❌ {file_path.name} missing required fields")
+                    return False
+                outputs.setdefault(file_path.name, []).append(data)
+
+            summary_file = annotations_dir / "extraction_summary.json"
+            if not summary_file.exists():
+                print("❌ extraction_summary.json not found")
                 return False
-        else:
-            print(f"⚠ {filename} not found")
-    
+
+        for name, (from_folder, from_archive) in outputs.items():
+            if from_folder != from_archive:
+                print(f"❌ {name} differs between folder and .pptx input")
+                return False
+        print("✓ Folder and .pptx input give identical annotations")
+
     return True
 
 
@@ -98,12 +118,12 @@ def run_tests():
     """Run all tests"""
     print("ENHANCED ANATOMICAL PARSER TEST SUITE")
     print("=" * 60)
-    
+
     tests = [
         ("Parser Functionality", test_parser_functionality),
         ("Annotation Files", test_annotation_files)
     ]
-    
+
     passed = 0
     for test_name, test_func in tests:
         print(f"\n--- {test_name} ---")
@@ -112,10 +132,10 @@ def run_tests():
             print(f"✅ {test_name} PASSED")
         else:
             print(f"❌ {test_name} FAILED")
-    
+
     print("\n" + "=" * 60)
     print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
-    
+
     if passed == len(tests):
         print("🎉 All tests passed! Parser is working correctly.")
         return True
@@ -126,4 +146,4 @@ def run_tests():
 
 if __name__ == "__main__":
     success = run_tests()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    sys.exit(0 if success else 1)
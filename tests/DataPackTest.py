@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction import extract_text_labels
+from data_extraction.ColoredRegionsExtractor import AnatomicalShapeParser
+from data_extraction.Extract_Bone_Descriptions import extract_descriptions_from_slide
+from data_extraction.data_pack import DataPack, PackFormatError, build_pack, collect_entries
+from data_extraction.manifest import write_json
+from data_extraction.search_index import FUZZY_THRESHOLD, SearchIndex, build_index, load_entries, ngrams, \
+    normalize
+from data_extraction.slide_document import as_slide_deck
+from data_extraction.synthetic_deck import DeckSpec, write_deck
+from data_extraction.xml_boneset_reader import build_boneset_index
+
+SPEC = DeckSpec(slides=4, freeforms=2, bezier_points=6, connectors=2, labels=2, media=1, subbone_slides=3)
+QUERIES = ("il", "ili", "Ischium", "crest", "bercl", "synthetic", "fact", "ischum", "pubik tubercle",
+           "ACETAB", "  obturator   FORAMEN ", "zz", "trochanter", "bone 3")
+
+
+def _data_tree(root):
+    """A data tree laid out like the data branch, extracted from a synthetic deck"""
+    write_deck(SPEC, root / "deck")
+    deck = as_slide_deck(root / "deck")
+    data = root / "data"
+    for folder in ("boneset", "bones", "descriptions", "annotations/text_label_annotations",
+                   "annotations/ColoredRegions"):
+        (data / folder).mkdir(parents=True)
+
+    index = build_boneset_index(deck)
+    regions = AnatomicalShapeParser(deck, root / "regions")
+    for boneset_id, boneset in index["bonesets"].items():
+        write_json(data / "boneset" / f"{boneset_id}.json",
+                   {"id": boneset_id, "name": boneset["name"], "bones": boneset["bones"]})
+    for bone_id, bone in index["bones"].items():
+        slide = bone["slide"]
+        write_json(data / "bones" / f"{bone_id}.json",
+                   {"id": bone_id, "name": bone["name"], "subBones": bone["subbones"]})
+        write_json(data / "descriptions" / f"{bone_id}_description.json",
+                   extract_descriptions_from_slide(deck.iter_shapes(slide, kinds=("sp",))))
+        labels = extract_text_labels.process_slide(deck, slide, root / "labels")
+        os.replace(labels, data / "annotations/text_label_annotations" / f"{bone_id}_text_annotations.json")
+        write_json(data / "annotations/ColoredRegions" / f"{bone_id}_colored_regions.json",
+                   regions.parse_slide(slide))
+    return data
+
+
+def test_offsets():
+    print("Testing pack layout and offsets...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = _data_tree(Path(tmp))
+        pack_file = Path(tmp) / "data.pack"
+        index = build_pack(data, pack_file)
+        raw = pack_file.read_bytes()
+
+        spans = []
+        for section, entries in index["entries"].items():
+            for key, entry in entries.items():
+                start, end = entry["offset"], entry["offset"] + entry["length"]
+                if start % 8 or end > len(raw):
+                    print(f"❌ {section}/{key} at {start}..{end} is unaligned or past the end of the file")
+                    return False
+                if hashlib.sha256(raw[start:end]).hexdigest() != entry["sha256"]:
+                    print(f"❌ {section}/{key} bytes do not match their digest")
+                    return False
+                spans.append((start, end))
+        spans.sort()
+        if any(end > next_start for (_, end), (next_start, _) in zip(spans, spans[1:])):
+            print("❌ Entries overlap")
+            return False
+        print(f"✓ {len(spans)} entries, 8-byte aligned, disjoint and matching their digests")
+
+        counts = {section: len(entries) for section, entries in index["entries"].items()}
+        expected = {"boneset": 1, "bone": SPEC.slides, "description": SPEC.slides, "annotation": SPEC.slides,
+                    "colored_regions": SPEC.slides, "combined": 1}
+        if counts != expected:
+            print(f"❌ Sections {counts}, expected {expected}")
+            return False
+        print(f"✓ Sections {counts}")
+    return True
+
+
+def test_reads():
+    print("\nTesting mmap and in-memory reads...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = _data_tree(Path(tmp))
+        pack_file = Path(tmp) / "data.pack"
+        build_pack(data, pack_file)
+        entries = collect_entries(data)
+        with DataPack(pack_file) as mapped:
+            in_memory = DataPack(pack_file.read_bytes())
+            for section in entries:
+                for key, obj in entries[section].items():
+                    if mapped.get(section, key) != obj or in_memory.get(section, key) != obj:
+                        print(f"❌ {section}/{key} reads back differently")
+                        return False
+            if mapped.get("bone", "no_such_bone", "missing") != "missing" or mapped.raw("nope", "x") is not None:
+                print("❌ Missing entries did not fall back to the default")
+                return False
+        print("✓ Every entry reads back unchanged through mmap and from bytes")
+
+        combined = in_memory.get("combined", "all")
+        if [b["id"] for b in combined["bones"]] != [SPEC.bone_name(i).lower() for i in range(SPEC.slides)] \
+                or not combined["subbones"]:
+            print(f"❌ Combined data {combined}")
+            return False
+        print(f"✓ Combined data lists {len(combined['bones'])} bones and {len(combined['subbones'])} sub-bones")
+
+        try:
+            DataPack(b"NOPE" + bytes(16))
+        except PackFormatError:
+            print("✓ Data without the pack magic is rejected")
+        else:
+            print("❌ A bad magic was accepted")
+            return False
+    return True
+
+
+def test_version():
+    print("\nTesting the pack version...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = _data_tree(Path(tmp))
+        pack_file = Path(tmp) / "data.pack"
+        first = build_pack(data, pack_file)["version"]
+        stamp = pack_file.stat().st_mtime_ns
+        if build_pack(data, pack_file)["version"] != first or pack_file.stat().st_mtime_ns != stamp:
+            print("❌ Rebuilding unchanged data changed the pack")
+            return False
+        print("✓ Unchanged data gives the same version and leaves the file alone")
+
+        path = data / "descriptions" / "ilium_description.json"
+        description = json.loads(path.read_text(encoding="utf-8"))
+        description["description"].append("A third fact.")
+        write_json(path, description)
+        if build_pack(data, pack_file)["version"] == first:
+            print("❌ Editing a description kept the version")
+            return False
+        print("✓ Editing one entry changes the version")
+    return True
+
+
+def _reference(index, query, limit):
+    """(priority, name) of the ranked results by scoring every record directly"""
+    q = normalize(query)
+    if not q:
+        return []
+    query_grams = ngrams(q, 3)
+    scored = []
+    for doc, name in enumerate(index["names"]):
+        words = [name[m.start():] for m in re.finditer(r"(?<= )\S", name)]
+        dice = 2.0 * len(query_grams & ngrams(name, 3)) / (len(query_grams) + len(ngrams(name, 3)))
+        if name.startswith(q):
+            scored.append((1, 0, name))
+        elif any(word.startswith(q) for word in words):
+            scored.append((2, 0, name))
+        elif q in name:
+            scored.append((3, 0, name))
+        elif len(q) >= 3 and q in index["texts"][doc]:
+            scored.append((4, 0, name))
+        elif len(q) >= 3 and dice >= FUZZY_THRESHOLD:
+            scored.append((5, -dice, name))
+    return [(tier, name) for tier, _, name in sorted(scored)[:limit]]
+
+
+def test_search_ranking():
+    print("\nTesting search ranking...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data = _data_tree(Path(tmp))
+        pack_file = Path(tmp) / "data.pack"
+        build_pack(data, pack_file)
+        index = build_index(load_entries(pack_file))
+        if index != build_index(load_entries(data)):
+            print("❌ The pack and the data tree give different indexes")
+            return False
+        print(f"✓ The pack and the data tree give the same index ({len(index['docs'])} records)")
+
+        search = SearchIndex(index)
+        for query in QUERIES:
+            for limit in (1, 3, 100):
+                found = [(r["priority"], normalize(r["name"])) for r in search.search(query, limit)]
+                expected = _reference(index, query, limit)
+                if found != expected:
+                    print(f"❌ {query!r} (limit {limit}): {found}, expected {expected}")
+                    return False
+        print(f"✓ {len(QUERIES)} queries rank like a full scan at limits 1, 3 and 100")
+
+        top = {query: search.search(query, 1)[0] for query in ("il", "crest", "ischum", "fact")}
+        if top["il"]["id"] != "iliac_crest" or top["crest"]["priority"] != 2 \
+                or top["ischum"]["id"] != "ischium" or top["fact"]["priority"] != 4:
+            print(f"❌ Top results {top}")
+            return False
+        print("✓ Prefixes, word prefixes, descriptions and typos find the expected records")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("DATA PACK AND SEARCH INDEX TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Offsets", test_offsets),
+        ("Reads", test_reads),
+        ("Version", test_version),
+        ("Search Ranking", test_search_ranking)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
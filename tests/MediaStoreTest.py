@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction import extract_bone_images, media_store
+from data_extraction.media_store import MEDIA_STORE_DIR, MediaStore
+from data_extraction.slide_document import as_slide_deck
+from data_extraction.synthetic_deck import DeckSpec, png_bytes, write_deck
+
+SPEC = DeckSpec(slides=2, freeforms=1, bezier_points=3, connectors=0, labels=0, media=2, image_size=(64, 48))
+PICTURE, OTHER = "ppt/media/image2_1.png", "ppt/media/image3_1.png"
+
+
+def _blobs(out):
+    return sorted(p for p in (Path(out) / MEDIA_STORE_DIR).iterdir() if not p.name.startswith("."))
+
+
+def _place(out, deck, pairs, mode="link"):
+    with MediaStore(out, mode, threads=4) as store:
+        futures = [store.place(deck, part, Path(out) / name) for part, name in pairs]
+    return [f.result() for f in futures]
+
+
+def test_dedupe():
+    print("Testing content deduplication...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "deck"
+        write_deck(SPEC, folder)
+        # give slide 3 the same picture as slide 2 under another name
+        (folder / OTHER).write_bytes((folder / PICTURE).read_bytes())
+        expected = hashlib.sha256((folder / PICTURE).read_bytes()).hexdigest() + ".png"
+
+        for deck in (folder, Path(tmp) / "deck.pptx"):
+            if deck.suffix == ".pptx":
+                # the archive holds the same parts as the edited folder
+                with zipfile.ZipFile(deck, "w") as archive:
+                    for path in folder.rglob("*"):
+                        if path.is_file():
+                            archive.write(path, path.relative_to(folder).as_posix())
+            out = Path(tmp) / f"out_{deck.name}"
+            changed = _place(out, as_slide_deck(deck), [(PICTURE, "slide2_a.png"), (PICTURE, "slide2_b.png"),
+                                                        (OTHER, "slide3_a.png")])
+            if changed != [True, True, True]:
+                print(f"❌ {deck.name}: first placement reported {changed}")
+                return False
+            blobs = _blobs(out)
+            if [b.name for b in blobs] != [expected]:
+                print(f"❌ {deck.name}: store holds {[b.name for b in blobs]}, expected one blob {expected}")
+                return False
+            inodes = {os.stat(out / name).st_ino for name in ("slide2_a.png", "slide2_b.png", "slide3_a.png")}
+            if inodes != {os.stat(blobs[0]).st_ino} or os.stat(blobs[0]).st_nlink != 4:
+                print(f"❌ {deck.name}: the three files are not hardlinks of the blob")
+                return False
+            print(f"✓ {deck.name}: three names, one blob named by its sha256, shared by hardlinks")
+    return True
+
+
+def test_concurrent_stores():
+    print("\nTesting stores racing on the same bytes...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "deck"
+        write_deck(SPEC, folder)
+        (folder / OTHER).write_bytes((folder / PICTURE).read_bytes())
+        deck = as_slide_deck(folder)
+        for attempt in range(10):
+            out = Path(tmp) / f"out{attempt}"
+            # two stores stand in for two --jobs workers; neither sees the other's locks
+            first, second = MediaStore(out, threads=4), MediaStore(out, threads=4)
+            for k in range(8):
+                for n, store in enumerate((first, second)):
+                    store.place(deck, (PICTURE, OTHER)[k % 2], out / f"s{n}_{k}.png")
+            first.close()
+            second.close()
+            blobs = _blobs(out)
+            inodes = {os.stat(p).st_ino for p in out.glob("s*.png")}
+            if len(blobs) != 1 or inodes != {os.stat(blobs[0]).st_ino}:
+                print(f"❌ Attempt {attempt}: {len(blobs)} blobs, {len(inodes)} distinct inodes among the files")
+                return False
+        print("✓ Every file shares the one blob's inode across 10 racing runs")
+    return True
+
+
+def test_unchanged_and_copy():
+    print("\nTesting repeat placements and copy mode...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck_dir = Path(tmp) / "deck"
+        write_deck(SPEC, deck_dir)
+        deck, out = as_slide_deck(deck_dir), Path(tmp) / "out"
+        pairs = [(PICTURE, "slide2.png"), (OTHER, "slide3.png")]
+        _place(out, deck, pairs)
+        if _place(out, deck, pairs) != [False, False]:
+            print("❌ Placing the same parts again reported changes")
+            return False
+        if len(_blobs(out)) != 2:
+            print(f"❌ Two different pictures gave {len(_blobs(out))} blobs")
+            return False
+        print("✓ Repeat placements change nothing")
+
+        # copy mode must give each file its own inode, never writing through into the blob
+        _place(out, deck, [(OTHER, "slide2.png")], mode="copy")
+        if os.stat(out / "slide2.png").st_nlink != 1:
+            print("❌ A copied file still shares its inode")
+            return False
+        if (out / "slide2.png").read_bytes() != (deck_dir / OTHER).read_bytes():
+            print("❌ The copied file has the wrong content")
+            return False
+        for b in _blobs(out):
+            if hashlib.sha256(b.read_bytes()).hexdigest() + ".png" != b.name:
+                print(f"❌ Copying over a linked file changed blob {b.name}")
+                return False
+        print("✓ Copy mode writes separate files and leaves the store intact")
+    return True
+
+
+def _extract(deck, out):
+    extract_bone_images.run(extract_bone_images.build_parser().parse_args([str(deck), str(out)]))
+
+
+def test_prune():
+    print("\nTesting that unused blobs are pruned...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+        write_deck(SPEC, deck)
+        _extract(deck, out)
+        before = {b.name for b in _blobs(out)}
+        old = hashlib.sha256((deck / PICTURE).read_bytes()).hexdigest() + ".png"
+        if len(before) != 2 * SPEC.slides or old not in before:
+            print(f"❌ The first run stored {sorted(before)}")
+            return False
+
+        # replace slide 2's picture and drop slide 3 from the deck
+        (deck / PICTURE).write_bytes(png_bytes(50, 40, shade=99))
+        new = hashlib.sha256((deck / PICTURE).read_bytes()).hexdigest() + ".png"
+        os.remove(deck / "ppt" / "slides" / "slide3.xml")
+        os.remove(deck / "ppt" / "slides" / "_rels" / "slide3.xml.rels")
+        (out / MEDIA_STORE_DIR / ".tmp-interrupted").write_bytes(b"partial")
+        _extract(deck, out)
+
+        after = {b.name for b in _blobs(out)}
+        if old in after or new not in after or len(after) != 2:
+            print(f"❌ The store holds {sorted(after)} after the edit")
+            return False
+        if any(p.name.startswith(".tmp-") for p in (out / MEDIA_STORE_DIR).iterdir()):
+            print("❌ A leftover temp file survived")
+            return False
+        if any(os.stat(b).st_nlink < 2 for b in _blobs(out)):
+            print("❌ A remaining blob has no per-slide link")
+            return False
+        print("✓ The replaced picture's and the removed slide's blobs are gone; linked blobs stay")
+    return True
+
+
+def test_without_hardlinks():
+    print("\nTesting filesystems without hardlinks...")
+    print("=" * 50)
+
+    supports_hardlinks = media_store._supports_hardlinks
+    media_store._supports_hardlinks = lambda directory: False
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+            write_deck(SPEC, deck)
+            _extract(deck, out)
+            images = sorted(out.glob("slide*.png"))
+            stamps = {p.name: p.stat().st_mtime_ns for p in images}
+            if len(images) != 2 * SPEC.slides or _blobs(out):
+                print(f"❌ Wrote {[p.name for p in images]} and {len(_blobs(out))} blobs")
+                return False
+            print("✓ Images are written separately and no store is kept")
+            _extract(deck, out)
+            if {p.name: p.stat().st_mtime_ns for p in out.glob("slide*.png")} != stamps or _blobs(out):
+                print("❌ A second run rewrote the images or the store")
+                return False
+            print("✓ A second run writes nothing")
+    finally:
+        media_store._supports_hardlinks = supports_hardlinks
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("MEDIA STORE TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Dedupe", test_dedupe),
+        ("Concurrent Stores", test_concurrent_stores),
+        ("Unchanged and Copy", test_unchanged_and_copy),
+        ("Prune", test_prune),
+        ("Without Hardlinks", test_without_hardlinks)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
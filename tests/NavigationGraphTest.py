@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction.navigation_graph import JUMP_ACTION, build_navigation, read_links, resolve_link, \
+    write_navigation
+from data_extraction.slide_document import as_slide_deck
+from data_extraction.synthetic_deck import BONESET_NAME, LABEL_NAMES, DeckSpec, write_deck
+
+# bone slides 2-5 link to sub-bone slides 6-8, which are two clicks from the index
+SPEC = DeckSpec(slides=4, freeforms=1, bezier_points=3, connectors=0, labels=2, media=0, subbone_slides=3)
+ALL_SLIDES = list(range(1, SPEC.slides + SPEC.subbone_slides + 2))
+
+
+def _distances(links, root):
+    """Click distance of every slide the root reaches, by a plain breadth-first search"""
+    distance, queue = {root: 0}, deque([root])
+    while queue:
+        slide = queue.popleft()
+        for link in links[slide]:
+            if link["slide"] not in distance:
+                distance[link["slide"]] = distance[slide] + 1
+                queue.append(link["slide"])
+    return distance
+
+
+def test_breadcrumbs():
+    print("Testing breadcrumbs...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(SPEC, deck)
+        links = read_links(as_slide_deck(deck))
+        navigation = write_navigation(deck, Path(tmp) / "navigation")
+
+    distance = _distances(links, 1)
+    for slide in ALL_SLIDES:
+        crumbs = navigation["slides"][str(slide)]["breadcrumbs"]
+        if [c["slide"] for c in crumbs[:1]] != [1] or crumbs[-1]["slide"] != slide:
+            print(f"❌ Slide {slide}: breadcrumbs {crumbs} do not run from the root to the slide")
+            return False
+        if len(crumbs) != distance[slide] + 1:
+            print(f"❌ Slide {slide}: {len(crumbs) - 1} clicks, the shortest path has {distance[slide]}")
+            return False
+        for step, parent in zip(crumbs[1:], crumbs):
+            if {"slide": step["slide"], "text": step["text"]} not in \
+                    [{"slide": l["slide"], "text": l["text"]} for l in links[parent["slide"]]]:
+                print(f"❌ Slide {slide}: no link {parent['slide']} -> {step} to follow")
+                return False
+    print(f"✓ All {len(ALL_SLIDES)} slides have shortest click paths made of real links")
+
+    expected = {
+        2: [None, BONESET_NAME],
+        3: [None, SPEC.bone_name(1)],
+        # sub-bone slides are reached through the lowest-numbered bone slide that links them
+        6: [None, BONESET_NAME, LABEL_NAMES[0]],
+        8: [None, SPEC.bone_name(1), LABEL_NAMES[2]],
+    }
+    for slide, texts in expected.items():
+        found = [c["text"] for c in navigation["slides"][str(slide)]["breadcrumbs"]]
+        if found != texts:
+            print(f"❌ Slide {slide}: breadcrumb texts {found}, expected {texts}")
+            return False
+    print("✓ Steps are named by the link text and ties go to lower-numbered slides")
+    return True
+
+
+def test_inbound_and_prefetch():
+    print("\nTesting inbound links and prefetch lists...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(SPEC, deck)
+        assets = Path(tmp) / "build"
+        for slide in ALL_SLIDES:
+            (assets / "colored_regions").mkdir(parents=True, exist_ok=True)
+            (assets / "colored_regions" / f"slide{slide}_precise_paths.json").write_text("{}")
+        navigation = write_navigation(deck, assets / "navigation", assets_dir=assets)
+        links = read_links(as_slide_deck(deck))
+
+    for slide in ALL_SLIDES:
+        entry = navigation["slides"][str(slide)]
+        inbound = sorted(s for s in ALL_SLIDES if s != slide and any(l["slide"] == slide for l in links[s]))
+        if entry["inbound"] != inbound:
+            print(f"❌ Slide {slide}: inbound {entry['inbound']}, expected {inbound}")
+            return False
+        neighbours = entry["prefetch"]["slides"]
+        parent = entry["breadcrumbs"][-2]["slide"] if len(entry["breadcrumbs"]) > 1 else None
+        targets = {l["slide"] for l in links[slide]} - {slide}
+        if set(neighbours) != targets | ({parent} if parent else set()) or len(neighbours) != len(set(neighbours)):
+            print(f"❌ Slide {slide}: prefetch slides {neighbours}")
+            return False
+        wanted = [f"colored_regions/slide{n}_precise_paths.json" for n in neighbours]
+        if entry["prefetch"]["assets"] != wanted:
+            print(f"❌ Slide {slide}: prefetch assets {entry['prefetch']['assets']}")
+            return False
+    print("✓ Inbound lists, prefetch slides and their assets match the links")
+    return True
+
+
+def test_unreachable_and_jumps():
+    print("\nTesting unreachable slides and show-jump links...")
+    print("=" * 50)
+
+    links = {1: [{"slide": 2, "shape_id": "2", "text": "Two"}], 2: [],
+             3: [{"slide": 1, "shape_id": "4", "text": None}]}
+    navigation = build_navigation(links)
+    if navigation["slides"]["3"]["breadcrumbs"] != [] or navigation["slides"]["1"]["inbound"] != [3]:
+        print(f"❌ Unreachable slide 3: {navigation['slides']['3']}")
+        return False
+    print("✓ Slides the root cannot reach have empty breadcrumbs")
+
+    order = [1, 2, 3]
+    jumps = {"nextslide": 3, "previousslide": 1, "firstslide": 1, "lastslide": 3}
+    for jump, target in jumps.items():
+        found = resolve_link({"action": f"{JUMP_ACTION}?jump={jump}"}, {}, 2, order)
+        if found != target:
+            print(f"❌ {jump} from slide 2 leads to {found}, expected {target}")
+            return False
+    if resolve_link({"action": f"{JUMP_ACTION}?jump=nextslide"}, {}, 3, order) is not None:
+        print("❌ nextslide from the last slide should lead nowhere")
+        return False
+    print("✓ Show-jump actions resolve against the slide order")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("NAVIGATION GRAPH TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Breadcrumbs", test_breadcrumbs),
+        ("Inbound and Prefetch", test_inbound_and_prefetch),
+        ("Unreachable and Jumps", test_unreachable_and_jumps)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
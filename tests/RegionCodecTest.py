@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction.ColoredRegionsExtractor import AnatomicalShapeParser
+from data_extraction.region_codec import INT32_MAX, INT32_MIN, RegionFormatError, encode_regions, read_regions
+from data_extraction.synthetic_deck import DeckSpec, write_deck
+
+SPEC = DeckSpec(slides=2, freeforms=3, bezier_points=12, connectors=2, labels=2, media=1)
+
+
+def _region(points):
+    """A one-path slide dict whose path visits the given (x, y) points"""
+    commands = [{"type": "moveTo", "x": points[0][0], "y": points[0][1]}]
+    commands += [{"type": "lineTo", "x": x, "y": y} for x, y in points[1:]]
+    commands.append({"type": "close"})
+    return {"slide_number": 2, "colored_regions": [
+        {"anatomical_name": "Ischium", "color": "C133AD", "color_name": "pink", "shape_id": "5",
+         "path_data": [{"path_width": INT32_MAX, "path_height": 1, "commands": commands}]}]}
+
+
+def _round_trip(data, quantum=1):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "regions.bin"
+        path.write_bytes(encode_regions(data, quantum))
+        return read_regions(path)
+
+
+def test_deck_round_trip():
+    print("Testing binary round trip of extracted slides...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(SPEC, deck)
+        parser = AnatomicalShapeParser(deck, Path(tmp) / "annotations")
+        for slide_number in (2, 3):
+            data = parser.parse_slide(slide_number)
+            if _round_trip(data) != data:
+                print(f"❌ Slide {slide_number} changed in a JSON -> binary -> JSON round trip")
+                return False
+            print(f"✓ Slide {slide_number} round-trips exactly")
+    return True
+
+
+def test_int32_boundaries():
+    print("\nTesting int32 boundary coordinates...")
+    print("=" * 50)
+
+    # the extreme absolute values, then differences of exactly INT32_MAX and INT32_MIN
+    data = _region([(INT32_MIN, INT32_MAX), (-1, -1), (INT32_MAX - 1, -1), (INT32_MAX, INT32_MIN + 1)])
+    if _round_trip(data) != data:
+        print("❌ Boundary coordinates changed in a round trip")
+        return False
+    print("✓ Boundary coordinates round-trip exactly")
+
+    for points, what in (([(INT32_MIN, 0), (INT32_MAX, 0)], "a difference beyond int32"),
+                         ([(INT32_MAX + 1, 0)], "a coordinate beyond int32")):
+        try:
+            encode_regions(_region(points))
+        except RegionFormatError:
+            print(f"✓ {what.capitalize()} raises RegionFormatError")
+        else:
+            print(f"❌ {what.capitalize()} was encoded")
+            return False
+
+    # a coarser quantum brings the same path back into range
+    decoded = _round_trip(_region([(0, 0), (INT32_MAX + 1, 0)]), quantum=2)
+    xs = [cmd["x"] for cmd in decoded["colored_regions"][0]["path_data"][0]["commands"] if "x" in cmd]
+    if xs != [0, INT32_MAX + 1]:
+        print(f"❌ Quantum 2 decoded {xs}")
+        return False
+    print("✓ A larger quantum encodes out-of-range paths")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("REGION CODEC TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Deck Round Trip", test_deck_round_trip),
+        ("Int32 Boundaries", test_int32_boundaries)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+import json
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction.ColoredRegionsExtractor import AnatomicalShapeParser
+from data_extraction.path_geometry import PathGeometry
+from data_extraction.region_index import DEFAULT_TOLERANCE, HitIndex, build_hit_indexes, hit_index_dict, \
+    load_hit_indexes
+from data_extraction.synthetic_deck import DeckSpec, write_deck
+
+# enough freeforms over the two pictures that some of them overlap
+SPEC = DeckSpec(slides=2, freeforms=8, bezier_points=24, connectors=2, labels=2, media=1)
+SAMPLES = 1000
+
+
+def _slides():
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(SPEC, deck)
+        parser = AnatomicalShapeParser(deck, Path(tmp) / "annotations")
+        return [parser.parse_slide(n) for n in (2, 3)]
+
+
+def _edges(region):
+    """The region's flattened edges, rounded and closed as HitIndex.build does"""
+    edges = []
+    for path in region["path_data"]:
+        for points, _ in PathGeometry.from_dict(path).flatten(DEFAULT_TOLERANCE):
+            pts = [round(v) for v in points]
+            n = len(pts) // 2
+            for k in range(n):
+                j = (k + 1) % n
+                edges.append((pts[2 * k], pts[2 * k + 1], pts[2 * j], pts[2 * j + 1]))
+    return edges
+
+
+def _winding(edges, x, y):
+    """Nonzero-rule winding number of (x, y) by casting a ray to the right"""
+    winding = 0
+    for ax, ay, bx, by in edges:
+        cross = (bx - ax) * (y - ay) - (by - ay) * (x - ax)
+        if ay <= y < by and cross > 0:
+            winding += 1
+        elif by <= y < ay and cross < 0:
+            winding -= 1
+    return winding
+
+
+def _brute_force(polygons, x, y):
+    """Indexes of every region containing (x, y), bottom to top"""
+    return [number for number, edges in enumerate(polygons) if _winding(edges, x, y)]
+
+
+def _compare(index, polygons, rng):
+    """(points where the index disagrees with the brute force, points inside some region)"""
+    # sample around one region at a time, so most points land near some boundary
+    boxes = []
+    for edges in polygons:
+        xs = [v for e in edges for v in (e[0], e[2])]
+        ys = [v for e in edges for v in (e[1], e[3])]
+        mx, my = (max(xs) - min(xs)) / 10, (max(ys) - min(ys)) / 10
+        boxes.append((min(xs) - mx, min(ys) - my, max(xs) + mx, max(ys) + my))
+    mismatches = inside = 0
+    for _ in range(SAMPLES):
+        x0, y0, x1, y1 = rng.choice(boxes)
+        x, y = rng.uniform(x0, x1), rng.uniform(y0, y1)
+        expected = _brute_force(polygons, x, y)
+        inside += bool(expected)
+        found = [region["index"] for region in index.locate_all(x, y)]
+        top = index.locate(x, y)
+        if found != expected or (top["index"] if top else None) != (expected[-1] if expected else None):
+            mismatches += 1
+    return mismatches, inside
+
+
+def test_locate_matches_brute_force():
+    print("Testing locate against brute-force point-in-polygon...")
+    print("=" * 50)
+
+    rng = random.Random(19)
+    for data in _slides():
+        regions = data["colored_regions"]
+        polygons = [_edges(region) for region in regions]
+        index = build_hit_indexes(data)[0]
+        mismatches, inside = _compare(index, polygons, rng)
+        if not inside:
+            print(f"❌ Slide {data['slide_number']}: no sampled point fell inside a region")
+            return False
+        if mismatches:
+            print(f"❌ Slide {data['slide_number']}: {mismatches}/{SAMPLES} points disagree")
+            return False
+        print(f"✓ Slide {data['slide_number']}: {SAMPLES} random points ({inside} inside) agree "
+              f"over {len(regions)} regions")
+    return True
+
+
+def test_overlaps():
+    print("\nTesting overlapping regions...")
+    print("=" * 50)
+
+    square = [(0, 0), (1000, 0), (1000, 1000), (0, 1000)]
+    inner = [(250, 250), (750, 250), (750, 750), (250, 750)]
+
+    def region(name, points):
+        commands = [{"type": "moveTo", "x": points[0][0], "y": points[0][1]}]
+        commands += [{"type": "lineTo", "x": x, "y": y} for x, y in points[1:]]
+        commands.append({"type": "close"})
+        return {"anatomical_name": name, "path_data": [{"path_width": 1000, "path_height": 1000,
+                                                        "commands": commands}]}
+
+    index = HitIndex.build([region("Outer", square), region("Inner", inner)])
+    checks = (((500, 500), ["Outer", "Inner"]), ((100, 100), ["Outer"]), ((1500, 500), []))
+    for (x, y), expected in checks:
+        found = [r["anatomical_name"] for r in index.locate_all(x, y)]
+        if found != expected:
+            print(f"❌ ({x}, {y}) is in {found}, expected {expected}")
+            return False
+    if index.locate(500, 500)["anatomical_name"] != "Inner":
+        print("❌ The region drawn last should win where regions overlap")
+        return False
+    print("✓ Nested regions are listed bottom to top and the last drawn wins")
+    return True
+
+
+def test_saved_index():
+    print("\nTesting a saved index...")
+    print("=" * 50)
+
+    data = _slides()[0]
+    indexes = build_hit_indexes(data)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "slide2_hit_index.json"
+        path.write_text(json.dumps(hit_index_dict(indexes)), encoding="utf-8")
+        loaded = load_hit_indexes(path)
+    rng = random.Random(5)
+    polygons = [_edges(region) for region in data["colored_regions"]]
+    if _compare(loaded[0], polygons, rng)[0]:
+        print("❌ The reloaded index answers differently")
+        return False
+    print("✓ A saved and reloaded index gives the same answers")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("REGION INDEX TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Brute Force", test_locate_matches_brute_force),
+        ("Overlaps", test_overlaps),
+        ("Saved Index", test_saved_index)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+import math
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction.ColoredRegionsExtractor import AnatomicalShapeParser
+from data_extraction.path_geometry import PathGeometry
+from data_extraction.region_lod import DEFAULT_REFERENCE_WIDTH, DEFAULT_TOLERANCES, build_levels, \
+    parse_tolerances
+from data_extraction.synthetic_deck import DeckSpec, write_deck
+
+SPEC = DeckSpec(slides=1, freeforms=6, bezier_points=60, connectors=2, labels=2, media=1)
+
+
+def _slide():
+    with tempfile.TemporaryDirectory() as tmp:
+        deck = Path(tmp) / "deck"
+        write_deck(SPEC, deck)
+        return AnatomicalShapeParser(deck, Path(tmp) / "annotations").parse_slide(2)
+
+
+def _points(commands):
+    return [(cmd["x"], cmd["y"]) for cmd in commands if "x" in cmd]
+
+
+def _distance_to_ring(x, y, ring):
+    """Distance from (x, y) to the closed polyline through ring's points"""
+    best = math.inf
+    for k, (ax, ay) in enumerate(ring):
+        bx, by = ring[(k + 1) % len(ring)]
+        dx, dy = bx - ax, by - ay
+        t = ((x - ax) * dx + (y - ay) * dy) / (dx * dx + dy * dy) if dx or dy else 0.0
+        t = min(1.0, max(0.0, t))
+        best = min(best, math.hypot(x - ax - t * dx, y - ay - t * dy))
+    return best
+
+
+def test_levels():
+    print("Testing level layout...")
+    print("=" * 50)
+
+    data = _slide()
+    levels = build_levels(data)
+    if [level["lod"]["tolerance_px"] for level in levels] != list(DEFAULT_TOLERANCES):
+        print(f"❌ Levels {[level['lod'] for level in levels]}")
+        return False
+    if any(level["lod"]["level"] != k or level["lod"]["levels"] != len(DEFAULT_TOLERANCES)
+           for k, level in enumerate(levels)):
+        print("❌ Level numbers are not 0..n-1, coarsest first")
+        return False
+    print(f"✓ {len(levels)} levels, coarsest first")
+
+    counts = [sum(len(_points(path["commands"])) for region in level["colored_regions"]
+                  for path in region["path_data"]) for level in levels]
+    if counts != sorted(counts) or counts[0] >= counts[-1]:
+        print(f"❌ Point counts per level {counts} do not grow with detail")
+        return False
+    print(f"✓ Point counts grow with detail: {counts}")
+
+    if parse_tolerances("0.5, 8,2,2") != (8.0, 2.0, 0.5):
+        print("❌ parse_tolerances does not sort and dedupe")
+        return False
+    try:
+        parse_tolerances("2,0")
+    except ValueError:
+        print("✓ parse_tolerances orders tolerances and rejects non-positive ones")
+    else:
+        print("❌ parse_tolerances accepted a zero tolerance")
+        return False
+    return True
+
+
+def test_tolerances():
+    print("\nTesting that every level stays within its tolerance...")
+    print("=" * 50)
+
+    data = _slide()
+    emu_per_px = data["image_dimensions"]["width"] / DEFAULT_REFERENCE_WIDTH
+    # the precise curves, sampled well below the finest tolerance
+    precise = {}
+    for region in data["colored_regions"]:
+        subpaths = []
+        for path in region["path_data"]:
+            for points, _ in PathGeometry.from_dict(path).flatten(0.05 * emu_per_px):
+                subpaths.append(list(zip(points[0::2], points[1::2])))
+        precise[region["shape_id"]] = subpaths
+
+    for level in build_levels(data):
+        tol = level["lod"]["tolerance_emu"]
+        worst = 0.0
+        for region in level["colored_regions"]:
+            bx0, by0, bx1, by1 = region["bbox"]
+            for path in region["path_data"]:
+                ring = _points(path["commands"])
+                if any(not (bx0 <= x <= bx1 and by0 <= y <= by1) for x, y in ring):
+                    print(f"❌ Level {level['lod']['level']}: region {region['shape_id']} leaves its bbox")
+                    return False
+                # the simplified ring starts where its source subpath does
+                curve = min(precise[region["shape_id"]],
+                            key=lambda sub: math.hypot(sub[0][0] - ring[0][0], sub[0][1] - ring[0][1]))
+                # one EMU of slack for the integer rounding of the level's commands
+                worst = max(worst, max(_distance_to_ring(x, y, ring) for x, y in curve))
+        if worst > tol + 1:
+            print(f"❌ Level {level['lod']['level']}: the curve is {worst:.0f} EMU from its outline "
+                  f"(tolerance {tol:.0f})")
+            return False
+        print(f"✓ Level {level['lod']['level']}: within {worst:.0f} of {tol:.0f} EMU "
+              f"({level['lod']['tolerance_px']} px)")
+    return True
+
+
+def test_culling():
+    print("\nTesting that slivers are dropped...")
+    print("=" * 50)
+
+    data = _slide()
+    sliver = {"anatomical_name": "Sliver", "shape_id": "999", "path_data": [{
+        "path_width": 0, "path_height": 0,
+        "commands": [{"type": "moveTo", "x": 0, "y": 0}, {"type": "lineTo", "x": 1000000, "y": 0},
+                     {"type": "lineTo", "x": 1000000, "y": 10}, {"type": "close"}]}]}
+    data = dict(data, colored_regions=data["colored_regions"] + [sliver])
+    for level in build_levels(data):
+        if any(region["shape_id"] == "999" for region in level["colored_regions"]):
+            print(f"❌ Level {level['lod']['level']} kept a 10 EMU sliver")
+            return False
+    print("✓ A region thinner than every tolerance is culled from all levels")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("REGION LOD TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Levels", test_levels),
+        ("Tolerances", test_tolerances),
+        ("Culling", test_culling)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)
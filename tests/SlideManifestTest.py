@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_extraction import etag_manifest
+from data_extraction.ColoredRegionsExtractor import AnatomicalShapeParser
+from data_extraction.etag_manifest import load_etag_manifest
+from data_extraction.manifest import MANIFEST_FILENAME
+from data_extraction.synthetic_deck import REGION_COLORS, DeckSpec, png_bytes, write_deck
+
+SPEC = DeckSpec(slides=3, freeforms=2, bezier_points=6, connectors=2, labels=2, media=2)
+ALL_SLIDES = list(range(1, SPEC.slides + 2))
+
+
+class RecordingParser(AnatomicalShapeParser):
+    """Notes which slides were actually parsed rather than taken from the manifest"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.parsed = []
+
+    def parse_slide(self, slide_number):
+        self.parsed.append(slide_number)
+        return super().parse_slide(slide_number)
+
+
+def _run(deck, out, **options):
+    force = options.pop("force", False)
+    parser = RecordingParser(deck, out, **options)
+    results = parser.parse_all_slides(force=force)
+    return parser.parsed, results
+
+
+def _stamps(out):
+    return {p.name: p.stat().st_mtime_ns for p in Path(out).glob("slide*_precise_paths.*")}
+
+
+def _check(step, parsed, expected):
+    if parsed != expected:
+        print(f"❌ {step}: parsed slides {parsed}, expected {expected}")
+        return False
+    print(f"✓ {step}: parsed {expected or 'no slides'}")
+    return True
+
+
+def test_skip_unchanged():
+    print("Testing that unchanged slides are skipped...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+        write_deck(SPEC, deck)
+        parsed, first = _run(deck, out)
+        if not _check("First run", parsed, ALL_SLIDES) or not (out / MANIFEST_FILENAME).exists():
+            return False
+        stamps = _stamps(out)
+        parsed, second = _run(deck, out)
+        if not _check("Second run", parsed, []):
+            return False
+        if second != first:
+            print("❌ Skipped slides did not return their previous results")
+            return False
+        if _stamps(out) != stamps:
+            print("❌ Outputs of skipped slides were rewritten")
+            return False
+        print("✓ Skipped slides keep their outputs and results")
+    return True
+
+
+def test_reextract_changed():
+    print("\nTesting that changed slides are re-extracted...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+        write_deck(SPEC, deck)
+        _run(deck, out)
+
+        slide = deck / "ppt" / "slides" / "slide3.xml"
+        slide.write_text(slide.read_text(encoding="utf-8").replace('val="C133AD"', 'val="FF0000"'),
+                         encoding="utf-8")
+        parsed, results = _run(deck, out)
+        if not _check("Edited slide XML", parsed, [3]):
+            return False
+        if "C133AD" in {r["color"] for r in results[3]["colored_regions"]}:
+            print("❌ The edited slide kept its old colors")
+            return False
+
+        (deck / "ppt" / "media" / "image2_1.png").write_bytes(png_bytes(32, 24))
+        parsed, _ = _run(deck, out)
+        if not _check("Replaced picture", parsed, [2]):
+            return False
+
+        os.remove(out / "slide4_precise_paths.json")
+        parsed, _ = _run(deck, out)
+        if not _check("Deleted output", parsed, [4]) or not (out / "slide4_precise_paths.json").exists():
+            return False
+    return True
+
+
+def _zip(folder, archive):
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as z:
+        for path in sorted(folder.rglob("*")):
+            if path.is_file():
+                z.write(path, path.relative_to(folder).as_posix())
+
+
+def test_archive_digests():
+    print("\nTesting .pptx member digests...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder, deck, out = Path(tmp) / "deck", Path(tmp) / "deck.pptx", Path(tmp) / "out"
+        write_deck(SPEC, folder)
+        _zip(folder, deck)
+        parsed, _ = _run(deck, out)
+        if not _check("First run", parsed, ALL_SLIDES):
+            return False
+        slide = folder / "ppt" / "slides" / "slide3.xml"
+        recorded = json.loads((out / MANIFEST_FILENAME).read_text(encoding="utf-8"))["slides"]["3"]["inputs"]
+        if recorded["slide"] != "sha256:" + hashlib.sha256(slide.read_bytes()).hexdigest():
+            print(f"❌ The manifest records {recorded['slide']} for an archive member")
+            return False
+        print("✓ Archive members are fingerprinted by the sha256 of their bytes")
+
+        # a same-size edit; only the rewritten member's bytes tell the runs apart
+        size = slide.stat().st_size
+        slide.write_text(slide.read_text(encoding="utf-8").replace('val="C133AD"', 'val="FF0000"'),
+                         encoding="utf-8")
+        _zip(folder, deck)
+        parsed, _ = _run(deck, out)
+        if slide.stat().st_size != size or not _check("Same-size member edit", parsed, [3]):
+            return False
+        parsed, _ = _run(deck, out)
+        if not _check("Unchanged archive", parsed, []):
+            return False
+    return True
+
+
+def test_options_and_force():
+    print("\nTesting options and --force...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+        write_deck(SPEC, deck)
+        _run(deck, out)
+        parsed, _ = _run(deck, out, force=True)
+        if not _check("Forced run", parsed, ALL_SLIDES):
+            return False
+        parsed, _ = _run(deck, out, quantum=2)
+        if not _check("Changed quantum", parsed, ALL_SLIDES):
+            return False
+        parsed, _ = _run(deck, out, quantum=2)
+        if not _check("Same options again", parsed, []):
+            return False
+    return True
+
+
+def test_stale_outputs():
+    print("\nTesting that outputs of vanished slides are removed...")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+        write_deck(SPEC, deck)
+        _run(deck, out)
+
+        # slide 3 loses every colored region, slide 4 leaves the deck
+        slide = deck / "ppt" / "slides" / "slide3.xml"
+        text = slide.read_text(encoding="utf-8")
+        for color in REGION_COLORS:
+            text = text.replace(f'val="{color}"', 'val="123456"')
+        slide.write_text(text, encoding="utf-8")
+        os.remove(deck / "ppt" / "slides" / "slide4.xml")
+        os.remove(deck / "ppt" / "slides" / "_rels" / "slide4.xml.rels")
+        _, results = _run(deck, out)
+
+        gone = ("slide3_precise_paths.json", "slide4_precise_paths.json")
+        if sorted(results) != [2] or any((out / name).exists() for name in gone):
+            print(f"❌ Stale outputs remain: {sorted(p.name for p in out.glob('slide*'))}")
+            return False
+        print("✓ Outputs of a slide without regions and of a removed slide are deleted")
+        etags = load_etag_manifest(out)
+        if any(name in etags for name in gone) or "slide2_precise_paths.json" not in etags:
+            print(f"❌ etags.json lists {sorted(etags)}")
+            return False
+        print("✓ Their etags.json entries are pruned")
+    return True
+
+
+def test_etag_reuse():
+    print("\nTesting that unchanged outputs are not re-hashed...")
+    print("=" * 50)
+
+    hashed = []
+    file_sha256 = etag_manifest.file_sha256
+
+    def counting(path):
+        hashed.append(os.path.basename(path))
+        return file_sha256(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        deck, out = Path(tmp) / "deck", Path(tmp) / "out"
+        write_deck(SPEC, deck)
+        _run(deck, out)
+        before = load_etag_manifest(out)
+        etag_manifest.file_sha256 = counting
+        try:
+            _run(deck, out)
+        finally:
+            etag_manifest.file_sha256 = file_sha256
+        if hashed != ["extraction_summary.json"]:
+            print(f"❌ A run with every slide unchanged hashed {hashed}")
+            return False
+        if load_etag_manifest(out) != before:
+            print("❌ The reused digests differ from the recorded ones")
+            return False
+        print("✓ Skipped slides keep their recorded digests; only the summary is re-hashed")
+    return True
+
+
+def run_tests():
+    """Run all tests"""
+    print("SLIDE MANIFEST TEST SUITE")
+    print("=" * 60)
+
+    tests = [
+        ("Skip Unchanged", test_skip_unchanged),
+        ("Re-extract Changed", test_reextract_changed),
+        ("Archive Digests", test_archive_digests),
+        ("Options and Force", test_options_and_force),
+        ("Stale Outputs", test_stale_outputs),
+        ("ETag Reuse", test_etag_reuse)
+    ]
+
+    passed = 0
+    for test_name, test_func in tests:
+        print(f"\n--- {test_name} ---")
+        if test_func():
+            passed += 1
+            print(f"✅ {test_name} PASSED")
+        else:
+            print(f"❌ {test_name} FAILED")
+
+    print("\n" + "=" * 60)
+    print(f"TEST RESULTS: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = run_tests()
+    sys.exit(0 if success else 1)